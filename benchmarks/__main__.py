@@ -0,0 +1,128 @@
+"""
+Runs the benchmark suites for wuzei's hot paths, optionally saving the
+timings as JSON and comparing them with a previous run.
+
+    python -m benchmarks [--only blur,dispenser] [--quick]
+                         [--save results.json]
+                         [--compare baseline.json] [--threshold 0.25]
+
+Exits with 1 if any timing is more than `threshold` slower than the
+baseline, so a run on a PR against one on the base commit gates CI.
+Timings are only comparable between runs on the same machine.
+"""
+import argparse
+import datetime
+import json
+import platform
+import subprocess
+import sys
+import typing
+from pathlib import Path
+
+from benchmarks import blur, dispenser, encode, finder, startup, switching
+
+# suite: (run, fields that tell its results apart)
+SUITES = {
+    'blur': (blur.run, ('source', 'format', 'radius', 'engine')),
+    'encode': (encode.run, ('variant', 'setting')),
+    'finder': (finder.run, ('files', 'finder')),
+    'dispenser': (dispenser.run, ('items', 'order', 'operation')),
+    'switching': (switching.run, ('images', 'state')),
+    'startup': (startup.run, ('images', 'state')),
+}
+# smaller inputs for a run that takes seconds instead of minutes
+QUICK = {
+    'blur': dict(sources=[(1920, 1080), (4000, 3000)]),
+    'encode': dict(repeat=1),
+    'finder': dict(sizes=[1_000, 10_000]),
+    'dispenser': dict(sizes=[1_000, 100_000]),
+    'switching': dict(sizes=[100, 1_000]),
+    'startup': dict(sizes=[100, 1_000]),
+}
+
+
+def flatten(suite: str, fields: typing.Sequence[str], results: typing.List[dict]) -> typing.Dict[str, float]:
+    """Names every timing like `dispenser/items=1000/order=sorted/operation=next`"""
+    timings = {}
+    for r in results:
+        name = '/'.join([suite] + [f'{field}={r[field]}' for field in fields])
+        for key, value in r.items():
+            if key.endswith('seconds') and value is not None:
+                timings[name if key == 'seconds' else f'{name}:{key}'] = value
+    return timings
+
+
+def run(suites: typing.Iterable[str] = None, quick: bool = False) -> typing.Dict[str, float]:
+    timings = {}
+    for suite in suites or SUITES:
+        run_suite, fields = SUITES[suite]
+        print(f'running {suite}', file=sys.stderr)
+        results = run_suite(**(QUICK[suite] if quick else {}))
+        timings.update(flatten(suite, fields, results))
+    return timings
+
+
+def _commit() -> typing.Optional[str]:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'],
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(baseline: typing.Dict[str, float],
+            timings: typing.Dict[str, float],
+            threshold: float) -> typing.List[str]:
+    """Prints how each timing changed and returns the ones slower than `threshold` allows"""
+    regressions = []
+    print(f'{"benchmark":<70} {"base ms":>10} {"ms":>10} {"change":>8}')
+    for name, seconds in timings.items():
+        if name not in baseline or not baseline[name]:
+            continue
+        change = seconds / baseline[name] - 1
+        flag = ''
+        if change > threshold:
+            regressions.append(name)
+            flag = ' REGRESSED'
+        print(f'{name:<70} {baseline[name] * 1000:>10.3f} {seconds * 1000:>10.3f} {change:>+8.1%}{flag}')
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(prog='python -m benchmarks')
+    parser.add_argument('--only', help=f'comma separated suites, out of: {", ".join(SUITES)}')
+    parser.add_argument('--quick', action='store_true', help='run on smaller inputs')
+    parser.add_argument('--save', help='write the timings to this JSON file')
+    parser.add_argument('--compare', help='JSON file of an earlier run to compare against')
+    parser.add_argument('--threshold', type=float, default=0.25,
+                        help='relative slowdown that counts as a regression, 0.25 by default')
+    args = parser.parse_args()
+
+    suites = [s.strip() for s in args.only.split(',')] if args.only else list(SUITES)
+    unknown = [s for s in suites if s not in SUITES]
+    if unknown:
+        parser.error(f'Unknown suites: {", ".join(unknown)}')
+
+    timings = run(suites, quick=args.quick)
+    if args.save:
+        Path(args.save).write_text(json.dumps(dict(commit=_commit(),
+                                                   python=platform.python_version(),
+                                                   platform=platform.platform(),
+                                                   created=datetime.datetime.now().isoformat(timespec='seconds'),
+                                                   quick=args.quick,
+                                                   timings=timings),
+                                              indent=2))
+    if not args.compare:
+        for name, seconds in timings.items():
+            print(f'{name:<70} {seconds * 1000:>10.3f} ms')
+        return
+
+    baseline = json.loads(Path(args.compare).read_text())['timings']
+    regressions = compare(baseline, timings, args.threshold)
+    if regressions:
+        print(f'{len(regressions)} benchmarks regressed by more than {args.threshold:.0%}')
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
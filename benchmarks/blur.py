@@ -0,0 +1,60 @@
+"""
+Times `wuzei.core.blur.blur` end to end, decoding, blurring and encoding,
+across source resolutions, formats, radii and engines.
+
+    python -m benchmarks.blur
+"""
+import tempfile
+import typing
+from pathlib import Path
+
+from benchmarks.blur_engines import make_image, timed
+from wuzei.core.blur import ENGINES, blur
+
+SCREEN = (1920, 1080)
+SOURCES = [
+    (1920, 1080),
+    (4000, 3000),
+    (8000, 6000),
+]
+FORMATS = ['jpg', 'png']
+# fractions of the screen's long side, wuzei uses 1/10
+RADII = [20, 10]
+
+
+def run(sources=None, screen=SCREEN, repeat: int = 3) -> typing.List[dict]:
+    long_side = max(screen)
+    results = []
+    with tempfile.TemporaryDirectory(prefix='wuzei') as temp:
+        temp = Path(temp)
+        for size in sources or SOURCES:
+            img = make_image(size)
+            for fmt in FORMATS:
+                source = temp / f'{size[0]}x{size[1]}.{fmt}'
+                img.save(source)
+                for fraction in RADII:
+                    radius = long_side // fraction
+                    for engine in ENGINES:
+                        destination = temp / f'{source.stem}.{fmt}.{radius}.{engine}.jpg'
+                        elapsed, _ = timed(lambda: blur(str(source), destination,
+                                                        radius=radius,
+                                                        size=(long_side, long_side),
+                                                        engine=engine),
+                                           repeat)
+                        results.append(dict(source=f'{size[0]}x{size[1]}',
+                                            format=fmt,
+                                            radius=radius,
+                                            engine=engine,
+                                            seconds=elapsed))
+    return results
+
+
+def main():
+    print(f'{"source":>10} {"format":>6} {"radius":>6} {"engine":>6} {"ms":>8}')
+    for r in run():
+        print(f'{r["source"]:>10} {r["format"]:>6} {r["radius"]:>6} {r["engine"]:>6} '
+              f'{r["seconds"] * 1000:>8.1f}')
+
+
+if __name__ == '__main__':
+    main()
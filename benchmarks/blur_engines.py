@@ -0,0 +1,108 @@
+"""
+Compares the blur engines in `wuzei.core.blur`.
+
+For each screen resolution, blurs a synthetic image with every engine and
+reports the time it took, speedup over the exact engine, and how close
+the result is to the exact render (PSNR in dB, SSIM in [0, 1]).
+
+    python -m benchmarks.blur_engines
+"""
+import math
+import time
+import typing
+
+from PIL import Image, ImageChops, ImageStat
+
+from wuzei.core.blur import ENGINES
+
+RESOLUTIONS = [
+    (1366, 768),
+    (1920, 1080),
+    (2560, 1440),
+    (3840, 2160),
+    (5120, 2880),
+]
+
+
+def make_image(size: typing.Tuple[int, int]) -> Image.Image:
+    """Busy RGB test image with both large shapes and fine detail"""
+    width, height = size
+    detail = Image.effect_mandelbrot((width // 4, height // 4), (-2.0, -1.2, 1.0, 1.2), 100)
+    detail = detail.resize(size, resample=Image.BICUBIC)
+    gradient = Image.linear_gradient('L').resize(size)
+    noise = Image.effect_noise(size, 64)
+    return Image.merge('RGB', (detail, gradient, noise))
+
+
+def psnr(a: Image.Image, b: Image.Image) -> float:
+    rms = ImageStat.Stat(ImageChops.difference(a, b)).rms
+    mse = sum(r ** 2 for r in rms) / len(rms)
+    if mse == 0:
+        return math.inf
+    return 10 * math.log10(255 ** 2 / mse)
+
+
+def _ssim(x: Image.Image, y: Image.Image) -> float:
+    c1, c2 = (0.01 * 255) ** 2, (0.03 * 255) ** 2
+    sx, sy = ImageStat.Stat(x), ImageStat.Stat(y)
+    mx, my = sx.mean[0], sy.mean[0]
+    vx, vy = sx.var[0], sy.var[0]
+    # var((x + y) / 2) = (vx + vy + 2 cov) / 4
+    v_avg = ImageStat.Stat(ImageChops.add(x, y, scale=2.0)).var[0]
+    cov = 2 * v_avg - (vx + vy) / 2
+    return (((2 * mx * my + c1) * (2 * cov + c2))
+            / ((mx ** 2 + my ** 2 + c1) * (vx + vy + c2)))
+
+
+def ssim(a: Image.Image, b: Image.Image, tile: int = 64) -> float:
+    """Mean SSIM of the luminance over `tile` sized windows"""
+    a, b = a.convert('L'), b.convert('L')
+    width, height = a.size
+    scores = []
+    for top in range(0, height - tile + 1, tile):
+        for left in range(0, width - tile + 1, tile):
+            box = (left, top, left + tile, top + tile)
+            scores.append(_ssim(a.crop(box), b.crop(box)))
+    return sum(scores) / len(scores)
+
+
+def timed(fn: typing.Callable, repeat: int) -> typing.Tuple[float, typing.Any]:
+    best, result = math.inf, None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def run(resolutions=None, repeat: int = 3) -> typing.List[dict]:
+    results = []
+    for size in resolutions or RESOLUTIONS:
+        img = make_image(size)
+        radius = max(size) // 10
+        exact_time, exact = timed(lambda: ENGINES['exact'](img, radius, size), repeat)
+        for name, engine in ENGINES.items():
+            if name == 'exact':
+                elapsed, blurred = exact_time, exact
+            else:
+                elapsed, blurred = timed(lambda: engine(img, radius, size), repeat)
+            results.append(dict(resolution=f'{size[0]}x{size[1]}',
+                                engine=name,
+                                radius=radius,
+                                seconds=elapsed,
+                                speedup=exact_time / elapsed,
+                                psnr=psnr(exact, blurred),
+                                ssim=ssim(exact, blurred)))
+    return results
+
+
+def main():
+    print(f'{"resolution":>10} {"engine":>6} {"radius":>6} {"ms":>8} {"speedup":>8} {"psnr":>7} {"ssim":>6}')
+    for r in run():
+        print(f'{r["resolution"]:>10} {r["engine"]:>6} {r["radius"]:>6} '
+              f'{r["seconds"] * 1000:>8.1f} {r["speedup"]:>7.1f}x '
+              f'{r["psnr"]:>7.2f} {r["ssim"]:>6.4f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+"""
+Compares decoding a camera-sized JPEG in full and shrinking it afterwards,
+with decoding it at a reduced scale through `load_scaled`.
+
+Reports the time to get a screen-sized image and the size of the buffer
+the decoder produced, which is what dominates peak memory.
+
+    python -m benchmarks.decode
+"""
+import tempfile
+import typing
+from pathlib import Path
+
+from PIL import Image
+
+from benchmarks.blur_engines import make_image, timed
+from wuzei.core.render import fit_within, load_scaled
+
+SOURCE_SIZE = (8000, 6000)
+TARGETS = [
+    (1920, 1080),
+    (2560, 1440),
+    (3840, 2160),
+]
+
+
+def decode_full(path: Path, size: typing.Tuple[int, int]) -> typing.Tuple[Image.Image, int]:
+    with Image.open(path) as img:
+        img.load()
+        decoded = img.width * img.height * len(img.getbands())
+        img = img.resize(fit_within(img.size, size), resample=Image.NEAREST)
+        return img, decoded
+
+
+def decode_scaled(path: Path, size: typing.Tuple[int, int]) -> typing.Tuple[Image.Image, int]:
+    with Image.open(path) as img:
+        img.draft(img.mode, fit_within(img.size, size))
+        decoded = img.width * img.height * len(img.getbands())
+        return load_scaled(img, fit_within(img.size, size)), decoded
+
+
+def run(repeat: int = 3) -> typing.List[dict]:
+    results = []
+    with tempfile.TemporaryDirectory(prefix='wuzei') as temp:
+        source = Path(temp) / 'source.jpg'
+        make_image(SOURCE_SIZE).save(source, 'JPEG', quality=90)
+        for size in TARGETS:
+            for name, decode in [('full', decode_full), ('scaled', decode_scaled)]:
+                elapsed, (_, decoded) = timed(lambda: decode(source, size), repeat)
+                results.append(dict(target=f'{size[0]}x{size[1]}',
+                                    mode=name,
+                                    seconds=elapsed,
+                                    decoded_mb=decoded / 2 ** 20))
+    return results
+
+
+def main():
+    print(f'{"target":>10} {"mode":>6} {"ms":>8} {"decoded MB":>10}')
+    for r in run():
+        print(f'{r["target"]:>10} {r["mode"]:>6} {r["seconds"] * 1000:>8.1f} {r["decoded_mb"]:>10.1f}')
+
+
+if __name__ == '__main__':
+    main()
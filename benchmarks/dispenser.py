@@ -0,0 +1,78 @@
+"""
+Times `Dispenser` operations on sorted and shuffled playlists of up to
+a million items.
+
+Stepping is reported per step, the rest per call on the whole playlist.
+The lazy order is a `PermutedDispenser`, shuffled by a seeded permutation.
+
+    python -m benchmarks.dispenser
+"""
+import math
+import time
+import typing
+
+from benchmarks.blur_engines import timed
+from wuzei.core.dispenser import Dispenser, PermutedDispenser
+
+SIZES = [1_000, 10_000, 100_000, 1_000_000]
+STEPS = 10_000
+
+
+def make_paths(count: int) -> typing.List[str]:
+    return [f'D:\\wallpapers\\album{i % 100:03}\\IMG_{i:07}.jpg' for i in range(count)]
+
+
+def _per_step(dispenser: Dispenser, step: typing.Callable[[Dispenser], typing.Any]) -> float:
+    start = time.perf_counter()
+    for _ in range(STEPS):
+        step(dispenser)
+    return (time.perf_counter() - start) / STEPS
+
+
+def _after(prepare: typing.Callable, fn: typing.Callable, repeat: int) -> float:
+    """Best time of `fn`, calling `prepare` untimed before each run"""
+    best = math.inf
+    for _ in range(repeat):
+        prepare()
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def run(sizes=None, repeat: int = 3) -> typing.List[dict]:
+    results = []
+    for count in sizes or SIZES:
+        paths = make_paths(count)
+        for order in ('sorted', 'shuffled', 'lazy'):
+            shuffled = order != 'sorted'
+            if order == 'lazy':
+                dispenser = PermutedDispenser(paths, shuffled=True)
+            else:
+                dispenser = Dispenser(paths, shuffled=shuffled)
+            restore = dispenser.shuffle if shuffled else dispenser.unshuffle
+            operations = [
+                ('next', lambda: min(_per_step(dispenser, lambda d: d + 1) for _ in range(repeat))),
+                ('prev', lambda: min(_per_step(dispenser, lambda d: d - 1) for _ in range(repeat))),
+                # unshuffling a sorted list would only measure a no-op sort
+                ('shuffle', lambda: _after(dispenser.unshuffle, dispenser.shuffle, repeat)),
+                ('unshuffle', lambda: _after(dispenser.shuffle, dispenser.unshuffle, repeat)),
+                ('things', lambda: timed(lambda: setattr(dispenser, 'things', paths), repeat)[0]),
+            ]
+            for operation, measure in operations:
+                results.append(dict(items=count,
+                                    order=order,
+                                    operation=operation,
+                                    seconds=measure()))
+                restore()
+    return results
+
+
+def main():
+    print(f'{"items":>9} {"order":>9} {"operation":>10} {"us":>12}')
+    for r in run():
+        print(f'{r["items"]:>9} {r["order"]:>9} {r["operation"]:>10} {r["seconds"] * 1e6:>12.2f}')
+
+
+if __name__ == '__main__':
+    main()
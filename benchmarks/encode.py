@@ -0,0 +1,73 @@
+"""
+Compares encoder settings for rendered wallpapers.
+
+Encodes a blurred and a sharp (fitted) screen-sized render with each
+setting and reports encode time, file size, and on Windows, how long
+setting the file as the wallpaper takes.
+
+    python -m benchmarks.encode
+"""
+import tempfile
+import typing
+from pathlib import Path
+
+from benchmarks.blur_engines import make_image, timed
+from benchmarks.fit import _set_latency
+from wuzei.core.blur import ENGINES
+from wuzei.core.render import Encoding, save_image
+
+SCREEN = (2560, 1440)
+SETTINGS = [
+    Encoding(quality=75, optimize=False),
+    Encoding(quality=75),
+    Encoding(quality=85, optimize=False),
+    Encoding(quality=85),
+    Encoding(quality=85, progressive=True),
+    Encoding(quality=85, subsampling='4:4:4'),
+    Encoding(quality=95),
+    Encoding(quality=95, subsampling='4:4:4'),
+    Encoding(format='png', optimize=False),
+    Encoding(format='bmp'),
+]
+
+
+def describe(encoding: Encoding) -> str:
+    if encoding.format != 'jpeg':
+        return encoding.format
+    flags = [f'q{encoding.quality}', encoding.subsampling]
+    if encoding.optimize:
+        flags.append('opt')
+    if encoding.progressive:
+        flags.append('prog')
+    return ' '.join(flags)
+
+
+def run(screen=SCREEN, settings=None, repeat: int = 3) -> typing.List[dict]:
+    set_wallpaper = _set_latency()
+    sharp = make_image(screen)
+    renders = [('blurred', ENGINES['fast'](sharp, max(screen) // 10, screen)),
+               ('sharp', sharp)]
+    results = []
+    with tempfile.TemporaryDirectory(prefix='wuzei') as temp:
+        for variant, img in renders:
+            for i, encoding in enumerate(settings or SETTINGS):
+                destination = Path(temp) / f'{variant}.{i}{encoding.extension}'
+                elapsed, _ = timed(lambda: save_image(img, destination, encoding), repeat)
+                results.append(dict(variant=variant,
+                                    setting=describe(encoding),
+                                    seconds=elapsed,
+                                    bytes=destination.stat().st_size,
+                                    set_seconds=set_wallpaper(destination) if set_wallpaper else None))
+    return results
+
+
+def main():
+    print(f'{"variant":>8} {"setting":>20} {"encode ms":>10} {"size KB":>9} {"set ms":>8}')
+    for r in run():
+        set_ms = f'{r["set_seconds"] * 1000:.1f}' if r['set_seconds'] is not None else 'n/a'
+        print(f'{r["variant"]:>8} {r["setting"]:>20} {r["seconds"] * 1000:>10.1f} '
+              f'{r["bytes"] / 1024:>9.0f} {set_ms:>8}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+"""
+Compares the scandir based finder with the previous `Path.iterdir` one
+on synthetic flat directories.
+
+Reports the time to the first image, which is what delays the first
+wallpaper, and the time to list everything.
+
+    python -m benchmarks.finder
+"""
+import pathlib
+import tempfile
+import time
+import typing
+from pathlib import Path
+
+from wuzei.utils.finder import iter_images
+
+SIZES = [1_000, 10_000, 100_000]
+EXTENSIONS = ['.jpg', '.JPG', '.jpeg', '.png', '.txt', '.xmp']
+
+
+def legacy_find_images(directory: str,
+                       extensions: list = None) -> typing.List[str]:
+    """`find_images` as it was before the scandir rewrite"""
+    if not extensions:
+        extensions = ['.jpg', '.jpeg', '.png']
+    source_dir = pathlib.Path(directory)
+    return list(str(im)
+                for im in source_dir.iterdir()
+                if any(im.suffix == ext for ext in extensions))
+
+
+def make_tree(root: Path, count: int):
+    for i in range(count):
+        (root / f'IMG_{i:06}{EXTENSIONS[i % len(EXTENSIONS)]}').touch()
+
+
+def measure(images: typing.Callable[[], typing.Iterable[str]]) -> typing.Tuple[float, float, int]:
+    start = time.perf_counter()
+    first = None
+    found = 0
+    for _ in images():
+        if first is None:
+            first = time.perf_counter() - start
+        found += 1
+    return first, time.perf_counter() - start, found
+
+
+def run(sizes=None) -> typing.List[dict]:
+    results = []
+    for count in sizes or SIZES:
+        with tempfile.TemporaryDirectory(prefix='wuzei') as temp:
+            make_tree(Path(temp), count)
+            for name, images in [('iterdir', lambda: legacy_find_images(temp)),
+                                 ('scandir', lambda: iter_images(temp))]:
+                first, total, found = measure(images)
+                results.append(dict(files=count,
+                                    finder=name,
+                                    first_seconds=first,
+                                    seconds=total,
+                                    found=found))
+    return results
+
+
+def main():
+    print(f'{"files":>7} {"finder":>8} {"first ms":>9} {"total ms":>9} {"found":>7}')
+    for r in run():
+        print(f'{r["files"]:>7} {r["finder"]:>8} {r["first_seconds"] * 1000:>9.2f} '
+              f'{r["seconds"] * 1000:>9.1f} {r["found"]:>7}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+"""
+Compares handing original files to the desktop with handing it renders
+fitted to the screen.
+
+Reports the file size of each, the time it takes to render the fitted
+variant, and on Windows, how long setting each as the wallpaper takes.
+
+    python -m benchmarks.fit
+"""
+import tempfile
+import time
+import typing
+from pathlib import Path
+
+from benchmarks.blur_engines import make_image, timed
+from wuzei.core.render import FIT_MODES, fit
+
+SCREEN = (2560, 1440)
+SOURCES = [
+    ('camera.jpg', (8000, 6000)),
+    ('panorama.jpg', (16000, 4000)),
+    ('screenshot.png', (5120, 2880)),
+]
+
+
+def _set_latency() -> typing.Optional[typing.Callable[[Path], float]]:
+    try:
+        from wuzei.utils import windesktop
+    except ImportError:
+        return None
+
+    def measure(path: Path) -> float:
+        start = time.perf_counter()
+        windesktop.change_wallpaper(str(path), True)
+        return time.perf_counter() - start
+
+    return measure
+
+
+def run(screen=SCREEN, repeat: int = 3) -> typing.List[dict]:
+    set_wallpaper = _set_latency()
+    results = []
+    with tempfile.TemporaryDirectory(prefix='wuzei') as temp:
+        temp = Path(temp)
+        for name, size in SOURCES:
+            source = temp / name
+            make_image(size).save(source)
+            variants = [('original', 0.0, source)]
+            for mode in FIT_MODES:
+                destination = temp / f'{source.stem}.{mode}.jpg'
+                elapsed, _ = timed(lambda: fit(str(source), destination, screen, mode), repeat)
+                variants.append((mode, elapsed, destination))
+            for variant, render_time, path in variants:
+                results.append(dict(source=name,
+                                    variant=variant,
+                                    render_seconds=render_time,
+                                    bytes=path.stat().st_size,
+                                    set_seconds=set_wallpaper(path) if set_wallpaper else None))
+    return results
+
+
+def main():
+    print(f'{"source":>15} {"variant":>9} {"render ms":>10} {"size KB":>9} {"set ms":>8}')
+    for r in run():
+        set_ms = f'{r["set_seconds"] * 1000:.1f}' if r['set_seconds'] is not None else 'n/a'
+        print(f'{r["source"]:>15} {r["variant"]:>9} {r["render_seconds"] * 1000:>10.1f} '
+              f'{r["bytes"] / 1024:>9.0f} {set_ms:>8}')
+
+
+if __name__ == '__main__':
+    main()
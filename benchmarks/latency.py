@@ -0,0 +1,178 @@
+"""
+Measures how long it takes from an event to the wallpaper changing.
+
+Runs the whole app headless on the fake backend against a folder of
+synthetic images, replays a trace of timer ticks, hotkeys and session
+events, and reports p50/p99 latency per event. Events that don't change
+the wallpaper, like unlocking, are replayed but not reported.
+
+A trace has one event per line, optionally repeated, `#` starts a comment:
+
+    next 20
+    toggle_blur 4
+    lock
+    unlock
+    sleep 0.5
+
+Events are `timer`, `lock`, `unlock`, `sleep <seconds>` and the hotkey names
+from config.ini. With `--max-p99` the exit code is 1 if any event is slower,
+so it can gate CI.
+
+    python -m benchmarks.latency [--trace trace.txt] [--images 50] [--max-p99 0.5]
+"""
+import argparse
+import statistics
+import sys
+import tempfile
+import time
+import typing
+from pathlib import Path
+
+from benchmarks.blur_engines import make_image
+from wuzei.app import Wuzei
+from wuzei.app.config import WuzeiConfig
+from wuzei.backends.fake import FakeBackend
+
+HOTKEYS = dict(prev='ctrl+alt+left',
+               next='ctrl+alt+right',
+               prev_source='ctrl+alt+up',
+               next_source='ctrl+alt+down',
+               toggle_blur='ctrl+alt+b',
+               toggle_shuffle='ctrl+alt+s')
+
+DEFAULT_TRACE = """
+next 20
+prev 10
+toggle_blur 6
+lock
+unlock
+timer 10
+next_source
+next 5
+prev_source
+lock
+unlock
+"""
+
+
+def parse_trace(text: str) -> typing.List[typing.Tuple[str, str]]:
+    """Expands a trace into a list of (event, argument)"""
+    events = []
+    for line in text.splitlines():
+        line = line.split('#', 1)[0].split()
+        if not line:
+            continue
+        name, *rest = line
+        if name == 'sleep':
+            events.append((name, rest[0]))
+            continue
+        if name not in HOTKEYS and name not in ('timer', 'lock', 'unlock'):
+            raise ValueError(f'Unknown event in trace: {name}')
+        events += [(name, None)] * (int(rest[0]) if rest else 1)
+    return events
+
+
+def _write_config(root: Path, sources: int, images: int, size: typing.Tuple[int, int]) -> Path:
+    lines = ['[sources]']
+    for s in range(sources):
+        source = root / f'source{s}'
+        source.mkdir()
+        for i in range(images):
+            make_image(size).save(source / f'{i:04d}.jpg')
+        lines.append(f'source{s} = {source}')
+    cache = root / 'cache'
+    cache.mkdir()
+    lines += ['[config]',
+              f'cache_dir = {cache}',
+              'blurred = no',
+              'shuffled = no',
+              'blur_engine = fast',
+              'hook_mouse = no',
+              '[hotkeys]']
+    lines += [f'{name} = {hotkey}' for name, hotkey in HOTKEYS.items()]
+    config_path = root / 'config.ini'
+    config_path.write_text('\n'.join(lines))
+    return config_path
+
+
+def replay(app: Wuzei,
+           backend: FakeBackend,
+           events: typing.List[typing.Tuple[str, str]],
+           gap: float = 0.05,
+           timeout: float = 10.0) -> typing.Dict[str, typing.List[float]]:
+    """Fires every event and returns the latencies of the ones that changed the wallpaper"""
+    latencies: typing.Dict[str, typing.List[float]] = {}
+    for name, arg in events:
+        if name == 'sleep':
+            time.sleep(float(arg))
+            continue
+        count = len(backend.wallpapers)
+        start = time.monotonic()
+        if name == 'timer':
+            app.ee.emit('timer')
+        elif name == 'lock':
+            backend.lock()
+        elif name == 'unlock':
+            backend.unlock()
+        else:
+            backend.press(HOTKEYS[name])
+        if name != 'unlock' and backend.wait_for_change(count + 1, timeout):
+            changed_at = backend.wallpapers[count][0]
+            latencies.setdefault(name, []).append(changed_at - start)
+        time.sleep(gap)
+    return latencies
+
+
+def percentile(values: typing.List[float], p: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+
+def run(trace: str = DEFAULT_TRACE,
+        sources: int = 2,
+        images: int = 30,
+        size: typing.Tuple[int, int] = (3000, 2000),
+        screen: typing.Tuple[int, int] = (1920, 1080),
+        gap: float = 0.05) -> typing.List[dict]:
+    events = parse_trace(trace)
+    with tempfile.TemporaryDirectory(prefix='wuzei') as temp:
+        backend = FakeBackend(screen_size=screen)
+        config = WuzeiConfig(_write_config(Path(temp), sources, images, size), backend=backend)
+        app = Wuzei(config, backend=backend, logger=lambda *args: None)
+        app.start()
+        try:
+            latencies = replay(app, backend, events, gap=gap)
+        finally:
+            app.stop()
+    return [dict(event=name,
+                 count=len(values),
+                 p50=statistics.median(values),
+                 p99=percentile(values, 99),
+                 max=max(values))
+            for name, values in latencies.items()]
+
+
+def main():
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.latency')
+    parser.add_argument('--trace', help='file with the events to replay')
+    parser.add_argument('--images', type=int, default=30, help='images per source')
+    parser.add_argument('--gap', type=float, default=0.05, help='seconds between events')
+    parser.add_argument('--max-p99', type=float, help='fail if any event\'s p99 is slower, in seconds')
+    args = parser.parse_args()
+
+    trace = Path(args.trace).read_text() if args.trace else DEFAULT_TRACE
+    results = run(trace, images=args.images, gap=args.gap)
+    print(f'{"event":>15} {"count":>6} {"p50 ms":>8} {"p99 ms":>8} {"max ms":>8}')
+    for r in results:
+        print(f'{r["event"]:>15} {r["count"]:>6} {r["p50"] * 1000:>8.1f} '
+              f'{r["p99"] * 1000:>8.1f} {r["max"] * 1000:>8.1f}')
+
+    if args.max_p99 is not None:
+        slow = [r['event'] for r in results if r['p99'] > args.max_p99]
+        if slow:
+            print(f'p99 over {args.max_p99 * 1000:.0f} ms: {", ".join(slow)}')
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+"""
+Measures how much memory a shuffled playlist holds on to, for a list of
+`str` paths (`Dispenser`), packed paths with the order in arrays
+(`CompactDispenser`) and packed paths in a seeded permutation
+(`PermutedDispenser`), and how long building each takes.
+
+    python -m benchmarks.memory
+"""
+import gc
+import time
+import tracemalloc
+import typing
+
+from benchmarks.dispenser import make_paths
+from wuzei.core.dispenser import CompactDispenser, Dispenser, PermutedDispenser
+
+SIZES = [10_000, 100_000, 1_000_000]
+STORAGES = {
+    'list': Dispenser,
+    'compact': CompactDispenser,
+    'permuted': PermutedDispenser,
+}
+
+
+def retained(build: typing.Callable[[], typing.Any]) -> typing.Tuple[int, int, float]:
+    """Bytes still allocated after `build` returns, at most during it, and seconds it took"""
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    kept = build()
+    seconds = time.perf_counter() - start
+    gc.collect()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del kept
+    return current, peak, seconds
+
+
+def run(sizes=None) -> typing.List[dict]:
+    results = []
+    for count in sizes or SIZES:
+        for storage, dispenser in STORAGES.items():
+            # the paths are made inside, so the ones a list keeps are counted
+            current, peak, seconds = retained(lambda: dispenser(make_paths(count), shuffled=True))
+            results.append(dict(items=count,
+                                storage=storage,
+                                bytes=current,
+                                peak_bytes=peak,
+                                seconds=seconds))
+    return results
+
+
+def main():
+    print(f'{"items":>9} {"storage":>9} {"MB":>9} {"peak MB":>9} {"B/item":>8} {"build ms":>9}')
+    for r in run():
+        print(f'{r["items"]:>9} {r["storage"]:>9} {r["bytes"] / 2 ** 20:>9.1f} '
+              f'{r["peak_bytes"] / 2 ** 20:>9.1f} {r["bytes"] / r["items"]:>8.1f} '
+              f'{r["seconds"] * 1000:>9.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+"""
+Times starting wuzei on the fake backend, until the first wallpaper is
+set and until hotkeys are hooked up and handled.
+
+Reports a first start (nothing cached), a restart without a saved
+session (sources are in the index) and one that resumes the session.
+
+    python -m benchmarks.startup
+"""
+import tempfile
+import time
+import typing
+from pathlib import Path
+
+from benchmarks.blur_engines import make_image
+from wuzei.app import Wuzei
+from wuzei.app.config import WuzeiConfig
+from wuzei.backends.fake import FakeBackend
+from wuzei.core.state import PLAYLIST_FILE, SESSION_FILE
+
+SIZES = [100, 1_000, 10_000]
+
+
+def _write_config(root: Path, count: int, size: typing.Tuple[int, int]) -> Path:
+    sample = root / 'sample.jpg'
+    make_image(size).save(sample)
+    data = sample.read_bytes()
+    source = root / 'source'
+    source.mkdir()
+    for i in range(count):
+        (source / f'IMG_{i:06}.jpg').write_bytes(data)
+    cache = root / 'cache'
+    cache.mkdir()
+    config_path = root / 'config.ini'
+    config_path.write_text('\n'.join(['[sources]',
+                                      f'source = {source}',
+                                      '[config]',
+                                      f'cache_dir = {cache}',
+                                      'blurred = yes',
+                                      'shuffled = yes',
+                                      'blur_engine = fast',
+                                      'hook_mouse = no',
+                                      'monitor_dirs = no',
+                                      '[hotkeys]',
+                                      'next = ctrl+alt+right']))
+    return config_path
+
+
+def _start(config_path: Path) -> typing.Tuple[float, float]:
+    """Seconds until the first wallpaper is set, and until the app is started"""
+    backend = FakeBackend()
+    start = time.monotonic()
+    app = Wuzei(WuzeiConfig(config_path, backend=backend), backend=backend, logger=lambda *args: None)
+    app.start()
+    ready = time.monotonic() - start
+    try:
+        backend.wait_for_change(1, timeout=60)
+        first = backend.wallpapers[0][0] - start
+        # let the background scan and renders finish before the next start
+        backend.press('ctrl+alt+right')
+        backend.wait_for_change(2, timeout=60)
+        time.sleep(0.5)
+    finally:
+        app.stop()
+    return first, ready
+
+
+def run(sizes=None, size: typing.Tuple[int, int] = (3000, 2000)) -> typing.List[dict]:
+    results = []
+    for count in sizes or SIZES:
+        with tempfile.TemporaryDirectory(prefix='wuzei') as temp:
+            config_path = _write_config(Path(temp), count, size)
+            cache = Path(temp) / 'cache'
+            timings = [('cold', _start(config_path))]
+            for name in (SESSION_FILE, PLAYLIST_FILE):
+                (cache / name).unlink()
+            timings.append(('indexed', _start(config_path)))
+            timings.append(('resumed', _start(config_path)))
+            for state, (first, ready) in timings:
+                results.append(dict(images=count,
+                                    state=state,
+                                    first_wallpaper_seconds=first,
+                                    ready_seconds=ready))
+    return results
+
+
+def main():
+    print(f'{"images":>7} {"state":>8} {"first ms":>9} {"ready ms":>9}')
+    for r in run():
+        print(f'{r["images"]:>7} {r["state"]:>8} '
+              f'{r["first_wallpaper_seconds"] * 1000:>9.1f} {r["ready_seconds"] * 1000:>9.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+"""
+Times switching sources in `WallpaperManager` on the fake backend.
+
+Reports a switch to a source that was never seen (walked from scratch),
+one that's only in the index (after a restart), and one with a playlist
+already in memory.
+
+    python -m benchmarks.switching
+"""
+import tempfile
+import time
+import typing
+from pathlib import Path
+
+from benchmarks.blur_engines import make_image
+from wuzei.backends.fake import FakeBackend
+from wuzei.core.manager import WallpaperManager
+
+SOURCES = 4
+SIZES = [100, 1_000, 10_000]
+
+
+def make_sources(root: Path, sources: int, count: int) -> typing.List[str]:
+    sample = root / 'sample.jpg'
+    make_image((64, 64)).save(sample)
+    data = sample.read_bytes()
+    paths = []
+    for s in range(sources):
+        source = root / f'source{s}'
+        source.mkdir()
+        for i in range(count):
+            (source / f'IMG_{i:06}.jpg').write_bytes(data)
+        paths.append(str(source))
+    return paths
+
+
+def _manager(paths: typing.List[str], cache_dir: Path) -> WallpaperManager:
+    return WallpaperManager(paths, str(cache_dir),
+                            blurred=False,
+                            shuffled=True,
+                            prefetch=0,
+                            backend=FakeBackend(),
+                            logger=lambda *args: None)
+
+
+def _switch_all(manager: WallpaperManager, sources: int) -> float:
+    """Average time of one switch, going through every source once"""
+    start = time.perf_counter()
+    for _ in range(sources):
+        manager.next_source()
+    return (time.perf_counter() - start) / sources
+
+
+def _wait_indexed(manager: WallpaperManager, paths: typing.List[str], timeout: float = 300):
+    deadline = time.monotonic() + timeout
+    while not all(manager._index.is_indexed(path) for path in paths):
+        if time.monotonic() > deadline:
+            raise TimeoutError('Sources were not indexed in time')
+        time.sleep(0.05)
+
+
+def run(sizes=None, sources: int = SOURCES, repeat: int = 10) -> typing.List[dict]:
+    results = []
+    for count in sizes or SIZES:
+        with tempfile.TemporaryDirectory(prefix='wuzei') as temp:
+            temp = Path(temp)
+            paths = make_sources(temp, sources, count)
+            cache_dir = temp / 'cache'
+            cache_dir.mkdir()
+
+            manager = _manager(paths, cache_dir)
+            timings = [('cold', _switch_all(manager, sources - 1))]
+            _wait_indexed(manager, paths)
+            # the first round created the playlists, these resume them
+            timings.append(('resumed', min(_switch_all(manager, sources) for _ in range(repeat))))
+            # a restart finds everything in the index but no playlists
+            manager = _manager(paths, cache_dir)
+            timings.append(('indexed', _switch_all(manager, sources - 1)))
+            for state, seconds in timings:
+                results.append(dict(images=count,
+                                    state=state,
+                                    seconds=seconds))
+    return results
+
+
+def main():
+    print(f'{"images":>7} {"state":>8} {"ms":>8}')
+    for r in run():
+        print(f'{r["images"]:>7} {r["state"]:>8} {r["seconds"] * 1000:>8.2f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,3 +1,9 @@
-from wuzei.__main__ import wuzei_singleton
+import multiprocessing
+import sys
 
-wuzei_singleton()
+from wuzei.__main__ import run
+
+# worker processes of the feature and render pools import this module again, they mustn't start wuzei
+if __name__ == '__main__':
+    multiprocessing.freeze_support()
+    run(sys.argv[1:])
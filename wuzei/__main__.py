@@ -1,44 +1,116 @@
+import multiprocessing
+import os
 import sys
 import tempfile
+import typing
 from argparse import ArgumentParser
+from functools import partial
 from pathlib import Path
 
 from wuzei.app import Wuzei
 from wuzei.app.config import WuzeiConfig
+from wuzei.backends import BACKENDS, get_backend
+from wuzei.core.warm import CacheWarmer
 from wuzei.utils.singleton import run_as_singleton
 
+CONFIG_PATHS = ['wuzei.ini', 'config.ini']
+# first argument that runs a command instead of wuzei
+WARM_CACHE = 'warm-cache'
+
 
 def get_parser() -> ArgumentParser:
     parser = ArgumentParser(prog='Wuzei',
-                            description='Wallpaper manager for Windows')
+                            description='Wallpaper manager for Windows',
+                            epilog=f'`{WARM_CACHE} --help` shows how to render the cache ahead of time')
     parser.add_argument('config_file',
                         action='store',
                         help='path to config.ini file',
                         nargs='?')
+    parser.add_argument('--backend',
+                        choices=BACKENDS,
+                        help='desktop to run on, the native one by default. '
+                             'fake runs headless and only logs wallpaper changes')
     return parser
 
 
-def main():
-    config_paths = ['wuzei.ini', 'config.ini']
-    parser = get_parser()
-    args = parser.parse_args()
-    if not args.config_file:
-        for cp in config_paths:
+def get_warm_parser() -> ArgumentParser:
+    parser = ArgumentParser(prog=f'Wuzei {WARM_CACHE}',
+                            description='Renders every wallpaper of every source for the current screen '
+                                        'that is not cached yet. Stop it any time, the next run resumes.')
+    parser.add_argument('config_file',
+                        action='store',
+                        help='path to config.ini file',
+                        nargs='?')
+    parser.add_argument('--jobs', '-j',
+                        type=int,
+                        default=os.cpu_count() or 1,
+                        help='processes rendering at once, the number of cores by default')
+    parser.add_argument('--backend',
+                        choices=BACKENDS,
+                        help='desktop to take the screen geometry from, the native one by default')
+    return parser
+
+
+def load_config(parser: ArgumentParser, config_file: str, backend) -> WuzeiConfig:
+    if not config_file:
+        for cp in CONFIG_PATHS:
             if Path(cp).exists():
-                args.config_file = cp
+                config_file = cp
                 break
         else:
-            sys.stderr.write(f'Cannot access config file: {config_path.absolute()}\n')
+            sys.stderr.write(f'Cannot find a config file: {", ".join(CONFIG_PATHS)}\n')
             parser.print_help()
             exit(1)
 
-    config_path = Path(args.config_file)
+    config_path = Path(config_file)
     try:
-        config = WuzeiConfig(config_path)
+        return WuzeiConfig(config_path, backend=backend)
     except (ValueError, KeyError):
         sys.stderr.write(f'Cannot parse config file: {config_path.absolute()}\n')
         raise
 
+
+def warm_cache(argv: typing.List[str]):
+    parser = get_warm_parser()
+    args = parser.parse_args(argv)
+    backend = get_backend(args.backend)
+    config = load_config(parser, args.config_file, backend)
+    if not config.cache_dir:
+        sys.stderr.write('Set cache_dir in the config file to keep renders around\n')
+        exit(1)
+    Path(config.cache_dir).mkdir(exist_ok=True)
+
+    warmer = CacheWarmer(paths=list(config.sources.values()),
+                         cache_dir=config.cache_dir,
+                         blur_engine=config.blur_engine,
+                         fit_mode=None if config.fit == 'none' else config.fit,
+                         compose_mode=None if config.monitors == 'primary' else config.monitors,
+                         encoding=config.encoding,
+                         cache_size=config.cache_size * 2 ** 20,
+                         recursive=config.recursive,
+                         max_depth=config.max_depth,
+                         exclude=config.exclude,
+                         jobs=max(1, args.jobs),
+                         backend=backend,
+                         logger=partial(print, sep='\t'))
+    try:
+        # redraw the line on a terminal, one line per report elsewhere
+        end = '' if sys.stderr.isatty() else '\n'
+        progress = warmer.run(report=lambda p: print(f'\r{p}', end=end, file=sys.stderr, flush=True))
+    except KeyboardInterrupt:
+        sys.stderr.write('\nStopped, run it again to render the rest\n')
+        exit(130)
+    sys.stderr.write('\n')
+    if progress.failed:
+        exit(1)
+
+
+def main():
+    parser = get_parser()
+    args = parser.parse_args()
+    backend = get_backend(args.backend)
+    config = load_config(parser, args.config_file, backend)
+
     print('Parsed Config:')
     print('==============')
     print(str(config))
@@ -47,12 +119,12 @@ def main():
     if not config.cache_dir:
         with tempfile.TemporaryDirectory(prefix='wuzei') as temp:
             config.cache_dir = temp.name
-            w = Wuzei(config)
+            w = Wuzei(config, backend=backend)
             w.run()
     else:
         cache_path = Path(config.cache_dir)
         cache_path.mkdir(exist_ok=True)
-        w = Wuzei(config)
+        w = Wuzei(config, backend=backend)
         w.run()
 
 
@@ -61,5 +133,16 @@ def wuzei_singleton():
                      instance_name='wuzei')
 
 
+def run(argv: typing.List[str]):
+    """Runs wuzei, or the command `argv` starts with"""
+    # warming the cache isn't another instance, it runs next to wuzei
+    if argv[:1] == [WARM_CACHE]:
+        warm_cache(argv[1:])
+    else:
+        wuzei_singleton()
+
+
 if __name__ == '__main__':
-    wuzei_singleton()
+    # feature and render pools spawn processes, which frozen builds have to let through
+    multiprocessing.freeze_support()
+    run(sys.argv[1:])
@@ -1,55 +1,63 @@
+import datetime
 import os
-import threading
 import time
-from enum import Enum, auto
+import typing
 from functools import partial
 
-import keyboard
-import mouse
 from pymitter import EventEmitter
 
 from wuzei.app.config import WuzeiConfig
+from wuzei.app.dispatcher import Action, Dispatcher
+from wuzei.backends import DESKTOP, TASKBAR, Backend, get_backend
+from wuzei.core.changes import ChangeCollector
 from wuzei.core.manager import WallpaperManager
-from wuzei.utils.session import SessionEvent, SessionMonitor
+from wuzei.utils.log import QueueLogger
+from wuzei.utils.metrics import metrics, triggered_by
+from wuzei.utils.scheduler import Job, Scheduler
 from wuzei.utils.singleton import InterruptibleEvent
-from wuzei.utils.throttle import throttle
-from wuzei.utils.windesktop import WindowSpy
-from wuzei.utils.winfs import DirectoryWatcher
 
-
-class Action(Enum):
-    PREV_WALLPAPER = auto()
-    NEXT_WALLPAPER = auto()
-    PREV_SOURCE = auto()
-    NEXT_SOURCE = auto()
-
-    BLUR = auto()
-    UNBLUR = auto()
-    TOGGLE_BLUR = auto()
-
-    SHUFFLE = auto()
-    UNSHUFFLE = auto()
-    TOGGLE_SHUFFLE = auto()
-
-    EXIT = auto()
-    PAUSE = auto()
-    VIEW = auto()
+HOTKEY_ACTIONS = dict(
+        prev=Action.PREV_WALLPAPER,
+        next=Action.NEXT_WALLPAPER,
+        prev_source=Action.PREV_SOURCE,
+        next_source=Action.NEXT_SOURCE,
+        toggle_shuffle=Action.TOGGLE_SHUFFLE,
+        toggle_blur=Action.TOGGLE_BLUR,
+        blur=Action.BLUR,
+        exit=Action.EXIT,
+        pause=Action.PAUSE,
+        view=Action.VIEW,
+        stats=Action.STATS,
+)
+# settings a changed config file applies right away, the rest need a restart
+RELOADABLE = {'sources', 'hotkeys', 'interval', 'paused', 'filter', 'filter_hours'}
+# seconds between checks whether the config file changed
+CONFIG_POLL_INTERVAL = 2
 
 
 class Wuzei:
     def __init__(self,
                  config: WuzeiConfig,
+                 backend: Backend = None,
                  logger=None):
         if not logger:
-            logger = partial(print, sep='\t')
+            logger = QueueLogger(partial(print, sep='\t'))
         self.logger = logger
+        self.backend = backend or get_backend()
         self.ee = EventEmitter()
         self.ee.on('lock', self._on_lock)
         self.ee.on('unlock', self._on_unlock)
         self.ee.on('hotkey', self._on_hotkey)
         self.ee.on('timer', self._on_timer)
         self.threads = []
+        # source path: (its directory watcher, the collector of its changes)
+        self.watchers: typing.Dict[str, typing.Tuple[typing.Any, ChangeCollector]] = {}
+        # combination: action, as registered with the backend
+        self._hotkeys: typing.Dict[str, Action] = {}
+        self._config_stamp: typing.Optional[typing.Tuple[int, int]] = None
         self.running_event = InterruptibleEvent()
+        self.scheduler = Scheduler(logger=self.logger)
+        self._timer: Job = None
         self._update_time()
 
         self.config = config
@@ -57,155 +65,313 @@ class Wuzei:
         self.interval = config.interval
 
         self._sources = [path for key, path in config.sources.items()]
-        self.manager = WallpaperManager(paths=self._sources,
-                                        cache_dir=config.cache_dir,
-                                        blurred=config.blurred,
-                                        shuffled=config.shuffled,
-                                        logger=self.logger)
-
-    def _monitor_hotkeys(self):
-        actions = dict(
-                prev=Action.PREV_WALLPAPER,
-                next=Action.NEXT_WALLPAPER,
-                prev_source=Action.PREV_SOURCE,
-                next_source=Action.NEXT_SOURCE,
-                toggle_shuffle=Action.TOGGLE_SHUFFLE,
-                toggle_blur=Action.TOGGLE_BLUR,
-                blur=Action.BLUR,
-                exit=Action.EXIT,
-                pause=Action.PAUSE,
-                view=Action.VIEW,
-        )
-        hotkeys = {hotkey: actions[name] for name, hotkey in self.config.hotkeys.items()}
+        # input only queues actions, they run one at a time on the dispatcher's thread,
+        # and so do changes the manager finds in the background
+        self.dispatcher = Dispatcher(handle=self.handle_action,
+                                     batch=lambda: self.manager.deferred(),
+                                     logger=self.logger)
+        with triggered_by('startup'):
+            self.manager = WallpaperManager(paths=self._sources,
+                                            cache_dir=config.cache_dir,
+                                            blurred=config.blurred,
+                                            shuffled=config.shuffled,
+                                            shuffle_mode=config.shuffle_mode,
+                                            resume=config.resume,
+                                            all_sources=None if config.all_sources == 'no' else config.all_sources,
+                                            prefetch=config.prefetch,
+                                            blur_engine=config.blur_engine,
+                                            cache_size=config.cache_size * 2 ** 20,
+                                            recursive=config.recursive,
+                                            max_depth=config.max_depth,
+                                            exclude=config.exclude,
+                                            fit_mode=None if config.fit == 'none' else config.fit,
+                                            compose_mode=None if config.monitors == 'primary' else config.monitors,
+                                            encoding=config.encoding,
+                                            filters=self._active_filters(),
+                                            feature_workers=config.feature_workers,
+                                            render_workers=config.render_workers,
+                                            backend=self.backend,
+                                            call=self.dispatcher.call,
+                                            logger=self.logger)
+
+    def _monitor_hotkeys(self, hotkeys: typing.Dict[str, str] = None):
+        """Hooks the `hotkeys` of the config, or the current one's"""
+        if hotkeys is None:
+            hotkeys = self.config.hotkeys
+        hotkeys = {hotkey: HOTKEY_ACTIONS[name] for name, hotkey in hotkeys.items()}
+        # only what changed is unhooked and hooked again
+        for combination, action in list(self._hotkeys.items()):
+            if hotkeys.get(combination) != action:
+                self.backend.remove_hotkey(combination)
+                del self._hotkeys[combination]
         for combination, action in hotkeys.items():
-            keyboard.add_hotkey(combination,
-                                callback=self.ee.emit,
-                                args=['hotkey', action])
+            if combination in self._hotkeys:
+                continue
+            self.backend.add_hotkey(combination,
+                                    callback=self.ee.emit,
+                                    args=['hotkey', action])
+            self._hotkeys[combination] = action
 
     def _monitor_session(self):
-        sm = SessionMonitor()
-        sm.subscribe(SessionEvent.SESSION_LOCK, self.ee.emit, 'lock')
-        sm.subscribe(SessionEvent.SESSION_UNLOCK, self.ee.emit, 'unlock')
-        sm.listen()
+        session = self.backend.monitor_session(on_lock=partial(self.ee.emit, 'lock'),
+                                               on_unlock=partial(self.ee.emit, 'unlock'))
+        if session:
+            self.threads.append(session)
 
     def _monitor_dirs(self):
-        cooldown = self.config.dir_monitor_cooldown
-
-        def make_callback(path: str):
-            @throttle(cooldown=cooldown + 5)
-            def cb(*args):
-                self.logger('SOURCE CHANGED', path)
-                time.sleep(cooldown)
-                self.manager.sync(path)
-
-            return cb
-
         for path in self._sources:
-            callback = make_callback(path)
-            watcher = DirectoryWatcher(path=path,
-                                       on_deleted=callback,
-                                       on_created=callback,
-                                       on_renamed=callback)
-
-        while True:
-            time.sleep(10)
+            self._monitor_dir(path)
+
+    def _monitor_dir(self, path: str):
+        changes = ChangeCollector(apply=lambda c: self.dispatcher.call(partial(self.manager.apply_changes, path, c),
+                                                                       'watcher'),
+                                  scheduler=self.scheduler,
+                                  delay=self.config.dir_monitor_cooldown)
+        watcher = self.backend.watch_directory(path=path,
+                                               on_deleted=changes.deleted,
+                                               on_created=changes.created,
+                                               on_renamed=changes.renamed,
+                                               include_subdirectories=self.config.recursive)
+        self.watchers[path] = watcher, changes
+
+    def _unmonitor_dir(self, path: str):
+        if path not in self.watchers:
+            return
+        watcher, changes = self.watchers.pop(path)
+        self.backend.unwatch_directory(watcher)
+        changes.stop()
+
+    def _watch_config(self):
+        self._config_stamp = self._stamp_config()
+        self.scheduler.call_every(CONFIG_POLL_INTERVAL, self._check_config)
+
+    def _stamp_config(self) -> typing.Optional[typing.Tuple[int, int]]:
+        try:
+            stat = self.config.path.stat()
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def _check_config(self):
+        stamp = self._stamp_config()
+        if stamp and stamp != self._config_stamp:
+            self._config_stamp = stamp
+            self.reload_config()
+
+    def reload_config(self):
+        """Rereads the config file and applies what changed, unless it has errors"""
+        config = WuzeiConfig(self.config.path, backend=self.backend, exit_on_error=False)
+        if config.errors:
+            for error in config.errors:
+                self.logger('CONFIG NOT RELOADED', error)
+            return
+        if not config.cache_dir:
+            # a temporary one was made up at startup
+            config.cache_dir = self.config.cache_dir
+        self.dispatcher.call(partial(self._apply_config, config), 'reload')
+
+    def _apply_config(self, config: WuzeiConfig):
+        changed = self.config.diff(config)
+        if not changed:
+            return
+        # filter and filter_hours make one setting
+        settings = {'filter' if name == 'filter_hours' else name for name in changed if name in RELOADABLE}
+        # a setting only goes into the config once it's applied, so the next reload retries what failed
+        for name in sorted(settings):
+            try:
+                self._apply_setting(name, config)
+            except Exception as e:
+                self.logger('CONFIG NOT APPLIED', name, repr(e))
+        self.logger('CONFIG RELOADED', ', '.join(changed))
+        # the rest keeps its value until a restart, it's what everything was set up with
+        later = [name for name in changed if name not in RELOADABLE]
+        if later:
+            self.logger('RESTART TO APPLY', ', '.join(later))
+
+    def _apply_setting(self, name: str, config: WuzeiConfig):
+        if name == 'sources':
+            # applied source by source, it keeps track itself
+            self._apply_sources(config.sources)
+            return
+        if name == 'hotkeys':
+            self._monitor_hotkeys(config.hotkeys)
+        elif name == 'interval':
+            if self._timer:
+                self._timer.cancel()
+            self.interval = config.interval
+            self._setup_timer()
+        elif name == 'paused':
+            self.paused = config.paused
+        elif name == 'filter':
+            self.manager.filters = self._active_filters(config)
+            self.config.filter_hours = config.filter_hours
+        setattr(self.config, name, getattr(config, name))
+
+    def _apply_sources(self, sources: typing.Dict[str, str]):
+        """Adds and removes sources until they're `sources`, the ones that fail are left as they were"""
+        previous = list(self.config.sources.values())
+        applied = {}
+        for name, path in sources.items():
+            if path not in previous:
+                try:
+                    self.manager.add_source(path)
+                except Exception as e:
+                    self.logger('SOURCE NOT ADDED', path, repr(e))
+                    continue
+                if self.config.monitor_dirs:
+                    self._monitor_dir(path)
+            applied[name] = path
+        for name, path in self.config.sources.items():
+            if path in applied.values():
+                continue
+            try:
+                self.manager.remove_source(path)
+            except ValueError as e:
+                self.logger('SOURCE NOT REMOVED', path, e)
+                applied.setdefault(name, path)
+                continue
+            self._unmonitor_dir(path)
+        self.config.sources = applied
+        self._sources = list(applied.values())
 
     def _setup_timer(self):
-        while True and self.interval > 0:
-            time.sleep(1)
-            elapsed = time.time() - self.last_change
-            if elapsed < self.interval:
-                continue
-            if not self.paused:
-                self.ee.emit('timer')
+        if self.interval > 0:
+            self._timer = self.scheduler.call_every(self.interval, self._tick)
+
+    def _tick(self):
+        if not self.paused:
+            self.ee.emit('timer')
+
+    def _active_filters(self, config: WuzeiConfig = None) -> typing.List[str]:
+        """Filters of the config, or the current one's, that apply at this hour"""
+        config = config or self.config
+        window = config.filter_window
+        if not window:
+            return config.filter
+        start, end = window
+        hour = datetime.datetime.now().hour
+        within = start <= hour < end if start <= end else hour >= start or hour < end
+        return config.filter if within else []
 
     def _on_timer(self):
         self.logger('TIMER')
-        self.manager.next_wallpaper()
-        self._update_time()
+        self.dispatcher.call(self._refilter, 'timer')
+        self.dispatcher.dispatch(Action.NEXT_WALLPAPER, 'timer')
+
+    def _refilter(self):
+        self.manager.filters = self._active_filters()
 
     def _on_lock(self):
         self.logger('LOCKED')
-        self.manager.blur()
+        self.dispatcher.dispatch(Action.BLUR, 'lock')
 
     def _on_unlock(self):
         self.logger('UNLOCKED')
-        keyboard.stash_state()
+        self.backend.refresh_hooks()
 
-    def _on_mouse(self, desktop: WindowSpy, taskbar: WindowSpy):
-        if desktop.is_under_mouse:
+    def _on_mouse(self, target: typing.Optional[str]):
+        if target:
+            self._on_double_click(target)
+
+    def _on_double_click(self, target: str):
+        triggered = f'{target}_double_click'
+        if target == DESKTOP:
             self.logger('DESKTOP CLICKED')
-            self.manager.toggle_blur()
-        if taskbar.is_under_mouse:
+            self.dispatcher.dispatch(Action.TOGGLE_BLUR, triggered)
+        if target == TASKBAR:
             self.logger('TASKBAR CLICKED')
-            if keyboard.is_pressed('alt'):
-                self.manager.blur()
+            if self.backend.is_pressed('alt'):
+                self.dispatcher.dispatch(Action.BLUR, triggered)
             else:
-                self.manager.toggle_blur()
+                self.dispatcher.dispatch(Action.TOGGLE_BLUR, triggered)
 
-    def _rehook(self):
-        while True:
-            time.sleep(self.config.hook_refresh_interval)
-            keyboard.stash_state()
+    def _setup_rehook(self):
+        self.scheduler.call_every(self.config.hook_refresh_interval, self.backend.refresh_hooks)
 
     def _hook_mouse(self):
-        desktop = WindowSpy.desktop()
-        taskbar = WindowSpy.taskbar()
-        mouse.on_double_click(self._on_mouse, args=(desktop, taskbar))
+        self.backend.hook_double_click(self._on_mouse)
 
     def _on_hotkey(self, action: Action):
         self.logger('HOTKEY', action)
-        self.handle_action(action)
+        self.dispatcher.dispatch(action)
 
-    def handle_action(self, action: Action):
+    def handle_action(self, action: Action, count: int = 1):
+        """Runs `action`, moves go `count` steps, backwards if negative"""
         try:
             handlers = {
-                Action.PREV_WALLPAPER: self.manager.prev_wallpaper,
-                Action.NEXT_WALLPAPER: self.manager.next_wallpaper,
-                Action.PREV_SOURCE: self.manager.prev_source,
-                Action.NEXT_SOURCE: self.manager.next_source,
+                Action.PREV_WALLPAPER: partial(self.manager.move, -count),
+                Action.NEXT_WALLPAPER: partial(self.manager.move, count),
+                Action.PREV_SOURCE: partial(self.manager.switch, -count),
+                Action.NEXT_SOURCE: partial(self.manager.switch, count),
                 Action.TOGGLE_SHUFFLE: self.manager.toggle_shuffle,
                 Action.TOGGLE_BLUR: self.manager.toggle_blur,
                 Action.BLUR: self.manager.blur,
+                Action.UNBLUR: self.manager.unblur,
                 Action.PAUSE: self.pause,
                 Action.VIEW: self.view_current,
+                Action.STATS: self.stats,
                 Action.EXIT: self.exit,
             }
             handlers[action]()
-            self._update_time()
+            if action != Action.STATS:
+                self._update_time()
         except KeyError:
             self.logger('Unhandled action', action)
             raise NotImplementedError
 
     def _update_time(self):
         self.last_change = time.time()
+        # count the interval from the last change
+        if self._timer:
+            self._timer.reschedule()
 
     def pause(self):
         self.paused = not self.paused
         self.logger('PAUSED' if self.paused else 'RUNNING')
 
     def view_current(self):
-        os.startfile(self.manager.wallpaper)
+        self.backend.open_file(self.manager.wallpaper)
+
+    def stats(self):
+        for line in metrics.summary():
+            self.logger('STATS', line)
+
+    def _setup_metrics(self):
+        if self.config.metrics_file:
+            self.scheduler.call_every(self.config.metrics_interval, metrics.write, self.config.metrics_file)
 
     def exit(self):
         self.running_event.set()
         self.logger('Bye')
+        self.manager.close()
+        if isinstance(self.logger, QueueLogger):
+            self.logger.close()
         os._exit(0)
 
-    def run(self):
-        threads = dict(
-                keyboard=threading.Thread(target=self._monitor_hotkeys),
-                timer=threading.Thread(target=self._setup_timer),
-                rehook=threading.Thread(target=self._rehook),
-        )
-        if self.config.blur_on_lock:
-            threads['session'] = threading.Thread(target=self._monitor_session)
+    def start(self):
+        """Hooks everything up and returns, events are handled in the background"""
+        self.scheduler.start()
+        self.dispatcher.start()
+        self._setup_timer()
+        self._setup_rehook()
+        self._setup_metrics()
+        # the backend's hooks and watchers run their own listeners
+        self._monitor_hotkeys()
         if self.config.monitor_dirs:
-            threads['directory'] = threading.Thread(target=self._monitor_dirs)
+            self._monitor_dirs()
         if self.config.hook_mouse:
-            threads['mouse'] = threading.Thread(target=self._hook_mouse)
+            self._hook_mouse()
+        if self.config.blur_on_lock:
+            self._monitor_session()
+        if self.config.watch_config:
+            self._watch_config()
+
+    def stop(self):
+        self.scheduler.stop()
+        self.dispatcher.stop()
+        self.manager.close()
+        self.running_event.set()
 
-        self.threads = threads
-        for name, th in threads.items():
-            th.start()
+    def run(self):
+        self.start()
         self.running_event.wait()
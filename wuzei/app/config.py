@@ -3,11 +3,20 @@ from configparser import ConfigParser
 from pathlib import Path
 from pprint import pformat
 
-import keyboard
+from wuzei.backends import Backend, get_backend
+from wuzei.core.blur import ENGINES
+from wuzei.core.compose import COMPOSE_MODES
+from wuzei.core.dispenser import INTERLEAVE_MODES, SHUFFLE_MODES
+from wuzei.core.features import FILTERS
+from wuzei.core.render import FIT_MODES, OUTPUT_FORMATS, SUBSAMPLING, Encoding
 
 
 class WuzeiConfig:
-    def __init__(self, config_path: str):
+    def __init__(self, config_path: str, backend: Backend = None, exit_on_error: bool = True):
+        """Prints what's wrong and exits, or with `exit_on_error` off, leaves it in `errors`"""
+        # hotkeys are validated by whichever backend will register them
+        self._backend = backend or get_backend()
+        self._path = Path(config_path)
         self._parser = ConfigParser()
         self._parser.read(config_path)
 
@@ -16,25 +25,91 @@ class WuzeiConfig:
         errors = []
         errors += self._validate_hotkeys()
         errors += self._validate_paths()
+        errors += self._validate_blur_engine()
+        errors += self._validate_fit()
+        errors += self._validate_monitors()
+        errors += self._validate_encoding()
+        errors += self._validate_filter()
+        errors += self._validate_all_sources()
+        errors += self._validate_shuffle_mode()
+        self._errors = errors
 
-        if errors:
+        if errors and exit_on_error:
             for e in errors:
                 print(e)
             exit(1)
 
+    @property
+    def path(self) -> Path:
+        return self._path
+
+    @property
+    def errors(self) -> typing.List[str]:
+        return self._errors
+
+    def diff(self, other: 'WuzeiConfig') -> typing.List[str]:
+        """Names of the settings that differ in `other`"""
+        return [k for k, v in self.__dict__.items()
+                if not k.startswith('_') and getattr(other, k, None) != v]
+
     def _parse(self):
         self.sources: typing.Dict[str, str] = dict(self._parser['sources'])
         self.cache_dir: str = self._parser['config'].get('cache_dir', '')
         self.blurred: bool = self._parser['config'].getboolean('blurred', True)
         self.shuffled: bool = self._parser['config'].getboolean('shuffled', True)
         self.paused: bool = self._parser['config'].getboolean('paused', False)
+        # lazy shuffles huge sources in constant time and memory, but reorders them when they change
+        self.shuffle_mode: str = self._parser['config'].get('shuffle_mode', 'eager').strip().lower()
+        # pick up the last session's wallpaper, playlist and blur at startup
+        self.resume: bool = self._parser['config'].getboolean('resume', True)
+        # also play every source at once, taking turns round_robin or weighted by size, 'no' leaves it out
+        self.all_sources: str = self._parser['config'].get('all_sources', 'no').strip().lower()
+        # reread this file when it changes, applying what can be without a restart
+        self.watch_config: bool = self._parser['config'].getboolean('watch_config', True)
         # Dont allow intervals shorter than 20 seconds
         self.interval: int = max(20, self._parser['config'].getint('interval', 60 * 10))
         self.blur_on_lock: bool = self._parser['config'].getboolean('blur_on_lock', True)
         self.monitor_dirs: bool = self._parser['config'].getboolean('monitor_dirs', True)
         self.hook_mouse: bool = self._parser['config'].getboolean('hook_mouse', True)
         self.hook_refresh_interval: int = self._parser['config'].getint('hook_refresh_interval', 60)
+        self.prefetch: int = max(0, self._parser['config'].getint('prefetch', 2))
+        self.blur_engine: str = self._parser['config'].get('blur_engine', 'exact')
+        # in megabytes, 0 means unbounded
+        self.cache_size: int = max(0, self._parser['config'].getint('cache_size', 0))
+        self.recursive: bool = self._parser['config'].getboolean('recursive', True)
+        # empty means unlimited
+        max_depth = self._parser['config'].get('max_depth', '').strip()
+        self.max_depth: typing.Optional[int] = int(max_depth) if max_depth else None
+        self.exclude: typing.List[str] = [pattern.strip()
+                                          for pattern in self._parser['config'].get('exclude', '').split(',')
+                                          if pattern.strip()]
+        # how unblurred wallpapers are rendered to the screen size, 'none' hands over originals
+        self.fit: str = self._parser['config'].get('fit', 'none')
+        # 'primary' renders for the primary monitor only
+        self.monitors: str = self._parser['config'].get('monitors', 'primary')
         self.dir_monitor_cooldown: int = self._parser['config'].getint('dir_monitor_cooldown', 20)
+        # processes that render, 0 renders on the thread that asked
+        self.render_workers: int = max(0, self._parser['config'].getint('render_workers', 2))
+        # only show images passing all of these, see wuzei.core.features.FILTERS
+        self.filter: typing.List[str] = [name.strip()
+                                         for name in self._parser['config'].get('filter', '').split(',')
+                                         if name.strip()]
+        # apply the filter from one hour until another, like 20-7, empty means all day
+        self.filter_hours: str = self._parser['config'].get('filter_hours', '').strip()
+        # processes that compute the image features the filter needs
+        self.feature_workers: int = max(1, self._parser['config'].getint('feature_workers', 2))
+        # Prometheus text file rewritten every metrics_interval seconds, empty disables it
+        self.metrics_file: str = self._parser['config'].get('metrics_file', '')
+        self.metrics_interval: int = max(1, self._parser['config'].getint('metrics_interval', 15))
+
+        # how renders are written, see wuzei.core.render.Encoding
+        default = Encoding()
+        self.encoding = Encoding(format=self._parser.get('render', 'format', fallback=default.format).lower(),
+                                 quality=self._parser.getint('render', 'quality', fallback=default.quality),
+                                 subsampling=self._parser.get('render', 'subsampling', fallback=default.subsampling),
+                                 optimize=self._parser.getboolean('render', 'optimize', fallback=default.optimize),
+                                 progressive=self._parser.getboolean('render', 'progressive',
+                                                                     fallback=default.progressive))
 
         self.hotkeys = {}
         if 'hotkeys' in self._parser:
@@ -49,11 +124,76 @@ class WuzeiConfig:
                 errors.append(f'"{source_path}" does not exist')
         return errors
 
+    def _validate_blur_engine(self):
+        if self.blur_engine not in ENGINES:
+            return [f'Unknown blur engine "{self.blur_engine}". '
+                    f'Choose one of: {", ".join(ENGINES)}']
+        return []
+
+    def _validate_fit(self):
+        if self.fit != 'none' and self.fit not in FIT_MODES:
+            return [f'Unknown fit mode "{self.fit}". '
+                    f'Choose one of: none, {", ".join(FIT_MODES)}']
+        return []
+
+    def _validate_monitors(self):
+        if self.monitors != 'primary' and self.monitors not in COMPOSE_MODES:
+            return [f'Unknown monitors mode "{self.monitors}". '
+                    f'Choose one of: primary, {", ".join(COMPOSE_MODES)}']
+        return []
+
+    def _validate_encoding(self):
+        errors = []
+        if self.encoding.format not in OUTPUT_FORMATS:
+            errors.append(f'Unknown render format "{self.encoding.format}". '
+                          f'Choose one of: {", ".join(OUTPUT_FORMATS)}')
+        if not 1 <= self.encoding.quality <= 95:
+            errors.append(f'Render quality must be between 1 and 95, not {self.encoding.quality}')
+        if self.encoding.subsampling not in SUBSAMPLING:
+            errors.append(f'Unknown chroma subsampling "{self.encoding.subsampling}". '
+                          f'Choose one of: {", ".join(SUBSAMPLING)}')
+        return errors
+
+    def _validate_filter(self):
+        errors = []
+        unknown = [name for name in self.filter if name not in FILTERS]
+        if unknown:
+            errors.append(f'Unknown filters "{", ".join(unknown)}". '
+                          f'Choose from: {", ".join(FILTERS)}')
+        if self.filter_hours:
+            try:
+                self.filter_window
+            except ValueError:
+                errors.append(f'Cannot parse filter_hours "{self.filter_hours}", use something like 20-7')
+        return errors
+
+    def _validate_shuffle_mode(self):
+        if self.shuffle_mode not in SHUFFLE_MODES:
+            return [f'Unknown shuffle mode "{self.shuffle_mode}". '
+                    f'Choose one of: {", ".join(SHUFFLE_MODES)}']
+        return []
+
+    def _validate_all_sources(self):
+        if self.all_sources != 'no' and self.all_sources not in INTERLEAVE_MODES:
+            return [f'Unknown all_sources mode "{self.all_sources}". '
+                    f'Choose one of: no, {", ".join(INTERLEAVE_MODES)}']
+        return []
+
+    @property
+    def filter_window(self) -> typing.Optional[typing.Tuple[int, int]]:
+        """(from, until) hours of filter_hours"""
+        if not self.filter_hours:
+            return None
+        start, end = (int(hour) for hour in self.filter_hours.split('-'))
+        if not (0 <= start < 24 and 0 <= end < 24):
+            raise ValueError(f'Hours out of range: {self.filter_hours}')
+        return start, end
+
     def _validate_hotkeys(self):
         errors = []
         for name, hotkey in self.hotkeys.items():
             try:
-                keyboard.parse_hotkey(hotkey)
+                self._backend.parse_hotkey(hotkey)
             except ValueError:
                 errors.append(f'Invalid hotkey for "{name}". Cannot parse "{hotkey}"')
         return errors
@@ -0,0 +1,213 @@
+import collections
+import contextlib
+import threading
+import time
+import typing
+from enum import Enum, auto
+
+from wuzei.utils.metrics import metrics, span, triggered_by
+
+
+class Action(Enum):
+    PREV_WALLPAPER = auto()
+    NEXT_WALLPAPER = auto()
+    PREV_SOURCE = auto()
+    NEXT_SOURCE = auto()
+
+    BLUR = auto()
+    UNBLUR = auto()
+    TOGGLE_BLUR = auto()
+
+    SHUFFLE = auto()
+    UNSHUFFLE = auto()
+    TOGGLE_SHUFFLE = auto()
+
+    EXIT = auto()
+    PAUSE = auto()
+    VIEW = auto()
+    STATS = auto()
+
+
+# steps are folded into a net count of NEXT_*, negative goes back
+MOVES = {
+    Action.NEXT_WALLPAPER: (Action.NEXT_WALLPAPER, 1),
+    Action.PREV_WALLPAPER: (Action.NEXT_WALLPAPER, -1),
+    Action.NEXT_SOURCE: (Action.NEXT_SOURCE, 1),
+    Action.PREV_SOURCE: (Action.NEXT_SOURCE, -1),
+}
+BLURS = {Action.BLUR, Action.UNBLUR, Action.TOGGLE_BLUR}
+# blurring and moving within a source don't depend on each other's order
+COMMUTING = {Action.NEXT_WALLPAPER} | BLURS
+
+# queue depths seen by an action, in actions
+DEPTH_BUCKETS = (0, 1, 2, 4, 8, 16, 32, 64, 128)
+
+
+def _find(steps: typing.List[list], wanted: typing.Set[Action]) -> typing.Optional[int]:
+    """Index of the last step in `wanted`, looking back only past steps that commute"""
+    for i in range(len(steps) - 1, -1, -1):
+        action = steps[i][0]
+        if action in wanted:
+            return i
+        if action not in COMMUTING:
+            return None
+    return None
+
+
+def coalesce(actions: typing.Iterable[Action]) -> typing.List[typing.Tuple[Action, int]]:
+    """
+    Folds `actions` into the fewest steps with the same outcome, as
+    (action, count) pairs. Moves become a net NEXT_WALLPAPER or NEXT_SOURCE
+    count, so 10 nexts and 3 prevs are 7 nexts, and blur toggles cancel out.
+    """
+    steps: typing.List[list] = []
+    for action in actions:
+        if action in MOVES:
+            action, delta = MOVES[action]
+            if action in COMMUTING:
+                i = _find(steps, {action})
+            else:
+                # moving between sources changes what moving within one means
+                i = len(steps) - 1 if steps and steps[-1][0] == action else None
+            if i is None:
+                steps.append([action, delta])
+            else:
+                steps[i][1] += delta
+        elif action in BLURS:
+            i = _find(steps, BLURS)
+            if i is not None and action == Action.TOGGLE_BLUR:
+                previous = steps.pop(i)[0]
+                if previous == Action.TOGGLE_BLUR:
+                    continue
+                action = Action.UNBLUR if previous == Action.BLUR else Action.BLUR
+            elif i is not None:
+                # blurring outright makes whatever came before moot
+                steps.pop(i)
+            steps.append([action, 1])
+        elif action == Action.TOGGLE_SHUFFLE and steps and steps[-1][0] == action:
+            steps.pop()
+        else:
+            steps.append([action, 1])
+    return [(action, count) for action, count in steps if count]
+
+
+class _Item(typing.NamedTuple):
+    action: typing.Optional[Action]
+    # runs in order with the actions, instead of an action
+    call: typing.Optional[typing.Callable]
+    triggered: str
+    enqueued: float
+
+
+class Dispatcher:
+    """
+    Runs actions one at a time on a single thread, so input handlers
+    return right away and never race each other over the wallpaper.
+
+    What piles up while an action runs is coalesced before it's run,
+    holding down a hotkey costs one render instead of one per repeat.
+    At most `max_pending` actions wait, beyond that new ones are dropped.
+    """
+
+    def __init__(self,
+                 handle: typing.Callable[[Action, int], typing.Any],
+                 batch: typing.Callable[[], typing.ContextManager] = None,
+                 max_pending: int = 64,
+                 logger=None):
+        """
+        `handle(action, count)` runs a step, a block under `batch()`
+        runs all steps taken off the queue at once.
+        """
+        if not logger:
+            logger = print
+        self.logger = logger
+        self._handle = handle
+        self._batch = batch or contextlib.nullcontext
+        self._max_pending = max_pending
+        self._queue: typing.Deque[_Item] = collections.deque()
+        self._ready = threading.Condition()
+        self._stopped = False
+        self._thread: threading.Thread = None
+
+    def dispatch(self, action: Action, triggered: str = None) -> bool:
+        """Queues `action`, returns False if it was dropped because too many are waiting"""
+        return self._put(_Item(action, None, triggered or action.name, time.perf_counter()))
+
+    def call(self, fn: typing.Callable, triggered: str = 'call') -> bool:
+        """Queues `fn()` to run on the dispatcher's thread, after what's queued already"""
+        return self._put(_Item(None, fn, triggered, time.perf_counter()))
+
+    def _put(self, item: _Item) -> bool:
+        with self._ready:
+            depth = len(self._queue)
+            # calls carry changes that can't be taken again, only input is dropped
+            if item.action is not None and depth >= self._max_pending:
+                metrics.increment('dispatch_dropped', trigger=item.triggered)
+                self.logger('DROPPED', item.triggered)
+                return False
+            self._queue.append(item)
+            self._ready.notify()
+        metrics.observe('dispatch_queue_depth', depth, buckets=DEPTH_BUCKETS)
+        return True
+
+    def start(self):
+        self._stopped = False
+        self._thread = threading.Thread(target=self._consume, name='dispatcher', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = None):
+        """Stops after what's queued has run"""
+        with self._ready:
+            self._stopped = True
+            self._ready.notify()
+        if self._thread and self._thread is not threading.current_thread():
+            self._thread.join(timeout)
+
+    def _consume(self):
+        while True:
+            with self._ready:
+                while not self._queue and not self._stopped:
+                    self._ready.wait()
+                if not self._queue:
+                    return
+                items = list(self._queue)
+                self._queue.clear()
+            taken = time.perf_counter()
+            for item in items:
+                metrics.observe('dispatch_delay_seconds', taken - item.enqueued, trigger=item.triggered)
+            # calls split the batch, actions on either side of one aren't folded together
+            run: typing.List[_Item] = []
+            for item in items:
+                if item.call:
+                    self._run(run)
+                    run = []
+                    self._call(item)
+                else:
+                    run.append(item)
+            self._run(run)
+
+    def _run(self, items: typing.List[_Item]):
+        if not items:
+            return
+        steps = coalesce(item.action for item in items)
+        if len(steps) < len(items):
+            metrics.increment('dispatch_coalesced', len(items) - len(steps))
+        # the last one is what the user is waiting on
+        with triggered_by(items[-1].triggered), span('total'):
+            try:
+                with self._batch():
+                    for action, count in steps:
+                        try:
+                            self._handle(action, count)
+                        except Exception as e:
+                            self.logger('ACTION FAILED', action, repr(e))
+            except Exception as e:
+                # raised while the batch wrapped up, by the render it held off
+                self.logger('ACTION FAILED', steps[-1][0] if steps else None, repr(e))
+
+    def _call(self, item: _Item):
+        with triggered_by(item.triggered):
+            try:
+                item.call()
+            except Exception as e:
+                self.logger('CALL FAILED', item.triggered, repr(e))
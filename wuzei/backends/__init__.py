@@ -0,0 +1,91 @@
+import sys
+import typing
+
+# where a double click landed, see Backend.hook_double_click
+DESKTOP = 'desktop'
+TASKBAR = 'taskbar'
+
+
+class Backend:
+    """
+    Everything wuzei needs from the desktop it runs on:
+    setting wallpapers, screen geometry, session events,
+    directory watching and input hooks.
+    """
+    name: str = None
+
+    def change_wallpaper(self, image_path: str, style: str = None):
+        """Shows `image_path`, with `style` if set or the desktop's own otherwise"""
+        raise NotImplementedError
+
+    def wallpaper_style(self) -> typing.Optional[str]:
+        """The style wallpapers are shown with, None if it can't be told"""
+        raise NotImplementedError
+
+    def screen_size(self) -> typing.Tuple[int, int]:
+        """Size of the primary monitor"""
+        raise NotImplementedError
+
+    def monitors(self) -> typing.List[typing.Tuple[int, int, int, int]]:
+        """(left, top, width, height) of every monitor on the virtual desktop"""
+        raise NotImplementedError
+
+    def monitor_session(self, on_lock: typing.Callable, on_unlock: typing.Callable):
+        """Calls `on_lock` and `on_unlock` when the session is locked and unlocked"""
+        raise NotImplementedError
+
+    def watch_directory(self,
+                        path: str,
+                        on_created: typing.Callable[[str], typing.Any],
+                        on_deleted: typing.Callable[[str], typing.Any],
+                        on_renamed: typing.Callable[[str, str], typing.Any],
+                        include_subdirectories: bool = False):
+        """Returns a watcher that calls the callbacks until it's garbage collected"""
+        raise NotImplementedError
+
+    def unwatch_directory(self, watcher):
+        """Stops a watcher `watch_directory` returned"""
+        raise NotImplementedError
+
+    def parse_hotkey(self, hotkey: str):
+        """Raises ValueError if `hotkey` can't be registered"""
+        raise NotImplementedError
+
+    def add_hotkey(self, hotkey: str, callback: typing.Callable, args: typing.Sequence = ()):
+        raise NotImplementedError
+
+    def remove_hotkey(self, hotkey: str):
+        raise NotImplementedError
+
+    def refresh_hooks(self):
+        """Forgets keys the hooks think are pressed, they get stuck after a lock"""
+        raise NotImplementedError
+
+    def is_pressed(self, key: str) -> bool:
+        raise NotImplementedError
+
+    def hook_double_click(self, callback: typing.Callable[[typing.Optional[str]], typing.Any]):
+        """Calls `callback` with DESKTOP, TASKBAR or None on every double click"""
+        raise NotImplementedError
+
+    def open_file(self, path: str):
+        raise NotImplementedError
+
+
+BACKENDS = ('win32', 'fake')
+
+
+def get_backend(name: str = None) -> Backend:
+    """
+    Creates the backend called `name`, the native one for this platform by default.
+    Platform modules are imported here, so nothing else needs them to be importable.
+    """
+    if not name:
+        name = 'win32' if sys.platform == 'win32' else 'fake'
+    if name == 'win32':
+        from .win32 import Win32Backend
+        return Win32Backend()
+    if name == 'fake':
+        from .fake import FakeBackend
+        return FakeBackend()
+    raise ValueError(f'Unknown backend: {name}')
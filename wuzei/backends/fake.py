@@ -0,0 +1,128 @@
+import threading
+import time
+import typing
+
+from . import Backend
+
+
+class FakeBackend(Backend):
+    """
+    In-process backend for running wuzei headless, e.g. on Linux in CI.
+    Wallpaper changes are recorded instead of applied, and events are
+    triggered by calling `lock`, `press`, `created` and the like.
+    """
+    name = 'fake'
+
+    def __init__(self,
+                 screen_size: typing.Tuple[int, int] = (1920, 1080),
+                 monitors: typing.List[typing.Tuple[int, int, int, int]] = None):
+        self._screen_size = screen_size
+        self._monitors = monitors or [(0, 0, *screen_size)]
+        # (time.monotonic(), path, style) of every change, oldest first
+        self.wallpapers: typing.List[typing.Tuple[float, str, str]] = []
+        self.wallpaper_changed = threading.Condition()
+        # what the desktop shows wallpapers with, kept until a change sets another
+        self.style = 'fill'
+        self.opened: typing.List[str] = []
+        self.pressed: typing.Set[str] = set()
+        self._hotkeys: typing.Dict[str, typing.Tuple[typing.Callable, typing.Sequence]] = {}
+        self._session: typing.List[typing.Tuple[typing.Callable, typing.Callable]] = []
+        self._watchers: typing.List[tuple] = []
+        self._double_click: typing.List[typing.Callable] = []
+
+    @property
+    def wallpaper(self) -> typing.Optional[str]:
+        return self.wallpapers[-1][1] if self.wallpapers else None
+
+    def change_wallpaper(self, image_path: str, style: str = None):
+        with self.wallpaper_changed:
+            self.wallpapers.append((time.monotonic(), image_path, style))
+            self.style = style or self.style
+            self.wallpaper_changed.notify_all()
+
+    def wallpaper_style(self) -> typing.Optional[str]:
+        return self.style
+
+    def wait_for_change(self, count: int, timeout: float = None) -> bool:
+        """Blocks until at least `count` wallpapers were set"""
+        with self.wallpaper_changed:
+            return self.wallpaper_changed.wait_for(lambda: len(self.wallpapers) >= count, timeout)
+
+    def screen_size(self) -> typing.Tuple[int, int]:
+        return self._screen_size
+
+    def monitors(self) -> typing.List[typing.Tuple[int, int, int, int]]:
+        return list(self._monitors)
+
+    def set_monitors(self, monitors: typing.List[typing.Tuple[int, int, int, int]]):
+        self._monitors = monitors
+
+    def monitor_session(self, on_lock: typing.Callable, on_unlock: typing.Callable):
+        self._session.append((on_lock, on_unlock))
+
+    def lock(self):
+        for on_lock, _ in self._session:
+            on_lock()
+
+    def unlock(self):
+        for _, on_unlock in self._session:
+            on_unlock()
+
+    def watch_directory(self,
+                        path: str,
+                        on_created: typing.Callable[[str], typing.Any],
+                        on_deleted: typing.Callable[[str], typing.Any],
+                        on_renamed: typing.Callable[[str, str], typing.Any],
+                        include_subdirectories: bool = False):
+        watcher = (path, on_created, on_deleted, on_renamed)
+        self._watchers.append(watcher)
+        return watcher
+
+    def unwatch_directory(self, watcher: tuple):
+        self._watchers.remove(watcher)
+
+    def _watching(self, path: str):
+        return [w for w in self._watchers if path.startswith(w[0])]
+
+    def created(self, path: str):
+        for _, on_created, _, _ in self._watching(path):
+            on_created(path)
+
+    def deleted(self, path: str):
+        for _, _, on_deleted, _ in self._watching(path):
+            on_deleted(path)
+
+    def renamed(self, old: str, new: str):
+        for _, _, _, on_renamed in self._watching(old):
+            on_renamed(old, new)
+
+    def parse_hotkey(self, hotkey: str):
+        if not hotkey or any(not key.strip() for key in hotkey.split('+')):
+            raise ValueError(f'Cannot parse hotkey: {hotkey}')
+
+    def add_hotkey(self, hotkey: str, callback: typing.Callable, args: typing.Sequence = ()):
+        self.parse_hotkey(hotkey)
+        self._hotkeys[hotkey] = (callback, args)
+
+    def remove_hotkey(self, hotkey: str):
+        del self._hotkeys[hotkey]
+
+    def press(self, hotkey: str):
+        callback, args = self._hotkeys[hotkey]
+        callback(*args)
+
+    def refresh_hooks(self):
+        self.pressed.clear()
+
+    def is_pressed(self, key: str) -> bool:
+        return key in self.pressed
+
+    def hook_double_click(self, callback: typing.Callable[[typing.Optional[str]], typing.Any]):
+        self._double_click.append(callback)
+
+    def double_click(self, target: typing.Optional[str]):
+        for callback in self._double_click:
+            callback(target)
+
+    def open_file(self, path: str):
+        self.opened.append(path)
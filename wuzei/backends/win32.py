@@ -0,0 +1,87 @@
+import os
+import threading
+import typing
+
+import keyboard
+import mouse
+
+from wuzei.utils import windesktop
+from wuzei.utils.session import SessionEvent, SessionMonitor
+from wuzei.utils.windesktop import WindowSpy
+from wuzei.utils.winfs import DirectoryWatcher
+from . import DESKTOP, TASKBAR, Backend
+
+
+class Win32Backend(Backend):
+    name = 'win32'
+
+    def change_wallpaper(self, image_path: str, style: str = None):
+        windesktop.change_wallpaper(image_path, True, style=style)
+
+    def wallpaper_style(self) -> typing.Optional[str]:
+        return windesktop.get_wallpaper_style()
+
+    def screen_size(self) -> typing.Tuple[int, int]:
+        return windesktop.get_screen_size()
+
+    def monitors(self) -> typing.List[typing.Tuple[int, int, int, int]]:
+        return windesktop.get_monitors()
+
+    def monitor_session(self, on_lock: typing.Callable, on_unlock: typing.Callable):
+        def listen():
+            # the window has to be created on the thread that pumps its messages
+            sm = SessionMonitor()
+            sm.subscribe(SessionEvent.SESSION_LOCK, on_lock)
+            sm.subscribe(SessionEvent.SESSION_UNLOCK, on_unlock)
+            sm.listen()
+
+        thread = threading.Thread(target=listen, name='session')
+        thread.start()
+        return thread
+
+    def watch_directory(self,
+                        path: str,
+                        on_created: typing.Callable[[str], typing.Any],
+                        on_deleted: typing.Callable[[str], typing.Any],
+                        on_renamed: typing.Callable[[str, str], typing.Any],
+                        include_subdirectories: bool = False):
+        return DirectoryWatcher(path=path,
+                                on_created=on_created,
+                                on_deleted=on_deleted,
+                                on_renamed=on_renamed,
+                                include_subdirectories=include_subdirectories)
+
+    def unwatch_directory(self, watcher: DirectoryWatcher):
+        watcher.stop()
+
+    def parse_hotkey(self, hotkey: str):
+        keyboard.parse_hotkey(hotkey)
+
+    def add_hotkey(self, hotkey: str, callback: typing.Callable, args: typing.Sequence = ()):
+        keyboard.add_hotkey(hotkey, callback=callback, args=args)
+
+    def remove_hotkey(self, hotkey: str):
+        keyboard.remove_hotkey(hotkey)
+
+    def refresh_hooks(self):
+        keyboard.stash_state()
+
+    def is_pressed(self, key: str) -> bool:
+        return keyboard.is_pressed(key)
+
+    def hook_double_click(self, callback: typing.Callable[[typing.Optional[str]], typing.Any]):
+        desktop = WindowSpy.desktop()
+        taskbar = WindowSpy.taskbar()
+
+        def on_double_click():
+            if desktop.is_under_mouse:
+                callback(DESKTOP)
+            elif taskbar.is_under_mouse:
+                callback(TASKBAR)
+            else:
+                callback(None)
+
+        mouse.on_double_click(on_double_click)
+
+    def open_file(self, path: str):
+        os.startfile(path)
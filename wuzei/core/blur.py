@@ -1,33 +1,56 @@
+import typing
 from pathlib import Path
 
 from PIL import Image
 from PIL.ImageFilter import GaussianBlur
 
+from wuzei.utils.metrics import span
+from .render import Encoding, fit_within, load_scaled, save_image
+
+# radius the fast engine blurs with after downscaling,
+# the image is shrunk by `radius / FAST_RADIUS` to get there
+FAST_RADIUS = 6
+
+
+def exact_blur(img: Image.Image, radius: float, size: typing.Tuple[int, int]) -> Image.Image:
+    img = load_scaled(img, size)
+    with span('blur'):
+        return img.filter(GaussianBlur(radius=radius))
+
+
+def fast_blur(img: Image.Image, radius: float, size: typing.Tuple[int, int]) -> Image.Image:
+    """
+    Approximates a large gaussian blur by blurring a downscaled copy
+    with a proportionally smaller radius, and upscaling it back.
+    A blur that heavy leaves no detail that the round trip could lose.
+    """
+    factor = radius / FAST_RADIUS
+    if factor <= 1:
+        return exact_blur(img, radius, size)
+    width, height = size
+    small_size = (max(1, round(width / factor)),
+                  max(1, round(height / factor)))
+    small = load_scaled(img, small_size)
+    with span('blur'):
+        small = small.filter(GaussianBlur(radius=radius / factor))
+        return small.resize(size, resample=Image.BILINEAR)
+
+
+ENGINES: typing.Dict[str, typing.Callable[[Image.Image, float, tuple], Image.Image]] = {
+    'exact': exact_blur,
+    'fast': fast_blur,
+}
+
 
 def blur(image_path: str,
+         save_path: str,
          radius=200,
          size: tuple = None,
-         save_dir: str = None,
-         use_cache=True) -> Path:
-    img_path = Path(image_path)
-    # skip PNGs
-    if img_path.suffix == '.png':
-        return img_path
-
-    modified = int(img_path.stat().st_mtime)
-    save_path = img_path.with_suffix(f'.v{modified}.blurred.jpg')
-
-    if save_dir:
-        save_path = Path(save_dir) / save_path.name
-
-    if use_cache and save_path.exists():
-        return save_path
-
-    with Image.open(img_path) as img, \
-            open(save_path, mode='w') as destination:
-        if not size:
-            size = max(img.size)
-        img.thumbnail(size, resample=Image.NEAREST)
-        blurred = img.filter(GaussianBlur(radius=radius))
-        blurred.save(destination, 'JPEG')
-        return save_path
+         engine: str = 'exact',
+         encoding: Encoding = None) -> Path:
+    if engine not in ENGINES:
+        raise ValueError(f'Unknown blur engine: {engine}')
+    with Image.open(image_path) as img:
+        size = fit_within(img.size, size or img.size)
+        blurred = ENGINES[engine](img, radius, size)
+        return save_image(blurred, save_path, encoding)
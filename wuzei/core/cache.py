@@ -0,0 +1,279 @@
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+import typing
+from collections import OrderedDict
+from pathlib import Path
+
+# <source stem>.<key>.jpg
+RENDER_PATTERN = re.compile(r'.+\.[0-9a-f]{20}\.\w+$')
+# variants written by older versions, and renders that were interrupted
+LEGACY_PATTERNS = [re.compile(r'.+\.v\d+(\.\w+)?\.blurred\.jpg$'),
+                   re.compile(r'.+\.tmp$')]
+# seconds a file nothing refers to is left alone, it may be a render in progress
+# or one another process hasn't added to the manifest yet
+STRAY_AGE = 5 * 60
+# the manifest is saved after this many new renders or this many seconds, and on flush
+SAVE_EVERY = 16
+SAVE_INTERVAL = 60
+
+
+class RenderCache:
+    """
+    Keeps renders of source images in a directory.
+
+    Renders are keyed by the full identity of their source (absolute path,
+    size and modification time) and the parameters they were rendered with,
+    so neither files with the same name nor different screen geometries
+    share a render. The directory is kept under `max_size` bytes by evicting
+    the least recently used renders. The manifest is saved every few changes,
+    `flush` saves what's left.
+
+    Other processes can render into the same directory, the manifest picks
+    up their renders whenever it's saved after one of them saved theirs.
+    """
+    MANIFEST = 'renders.json'
+
+    def __init__(self,
+                 cache_dir: str,
+                 max_size: int = 0,
+                 logger=None):
+        if not logger:
+            logger = print
+        self.logger = logger
+        self._dir = Path(cache_dir)
+        self._max_size = max_size
+        self._lock = threading.RLock()
+        # key -> dict(source, size, mtime, bytes), least recently used first
+        self._entries: typing.Dict[str, dict] = OrderedDict()
+        # absolute source path -> keys of its renders
+        self._by_source: typing.Dict[str, typing.Set[str]] = {}
+        self._bytes = 0
+        # removed here, not to be taken back from the manifest of another process
+        self._removed: typing.Set[str] = set()
+        # changes since the manifest was saved, it's only written when there are some
+        self._unsaved = 0
+        self._saved_at = time.monotonic()
+        # (inode, mtime, size) of the manifest as it was last read or written, it's read again once it moves
+        self._stamp: typing.Optional[typing.Tuple[int, int, int]] = None
+        self._load()
+
+    @property
+    def size(self) -> int:
+        return self._bytes
+
+    def __len__(self):
+        return len(self._entries)
+
+    @staticmethod
+    def _identity(source: str) -> typing.Tuple[str, int, int]:
+        stat = os.stat(source)
+        return os.path.abspath(source), stat.st_size, stat.st_mtime_ns
+
+    def key(self, source: str, **params) -> str:
+        path, size, mtime = self._identity(source)
+        identity = json.dumps([path, size, mtime, sorted(params.items())])
+        return hashlib.sha1(identity.encode()).hexdigest()[:20]
+
+    def path_for(self, source: str, key: str, extension: str = '.jpg') -> Path:
+        return self._dir / f'{Path(source).stem}.{key}{extension}'
+
+    def contains(self, source: str, **params) -> bool:
+        key = self.key(source, **params)
+        with self._lock:
+            return key in self._entries
+
+    def get(self, source: str, **params) -> typing.Optional[Path]:
+        key = self.key(source, **params)
+        with self._lock:
+            entry = self._entries.get(key)
+            if not entry:
+                return None
+            path = self._dir / entry['name']
+            if not path.exists():
+                self._forget(key)
+                return None
+            self._entries.move_to_end(key)
+            return path
+
+    def fetch(self,
+              source: str,
+              render: typing.Callable[[Path], typing.Any],
+              extension: str = '.jpg',
+              **params) -> Path:
+        """
+        Returns the cached render of `source`,
+        calling `render(destination)` to create it if there's none.
+        """
+        path = self.get(source, **params)
+        if path:
+            return path
+        key = self.key(source, **params)
+        path = self.path_for(source, key, extension)
+        render(path)
+        self._put(key, source, path)
+        return path
+
+    def add(self, source: str, path: Path, **params):
+        """
+        Takes in a render of `source` made elsewhere, at the path `path_for`
+        gave. It's only saved with the next `flush`, to add many at once.
+        """
+        self._put(self.key(source, **params), source, path, save=False)
+
+    def _put(self, key: str, source: str, path: Path, save: bool = True):
+        source_path, size, mtime = self._identity(source)
+        entry = dict(name=path.name,
+                     source=source_path,
+                     size=size,
+                     mtime=mtime,
+                     bytes=path.stat().st_size)
+        with self._lock:
+            # renders of older versions of the source will never be asked for again
+            for stale_key in list(self._by_source.get(source_path, ())):
+                stale = self._entries[stale_key]
+                if (stale['size'], stale['mtime']) != (size, mtime):
+                    self._remove(stale_key)
+            self._track(key, entry)
+            self._removed.discard(key)
+            self._evict(keep=key)
+            self._unsaved += 1
+            if save and (self._unsaved >= SAVE_EVERY or time.monotonic() - self._saved_at >= SAVE_INTERVAL):
+                self._save()
+
+    def _track(self, key: str, entry: dict):
+        if key in self._entries:
+            self._forget(key)
+        self._entries[key] = entry
+        self._by_source.setdefault(entry['source'], set()).add(key)
+        self._bytes += entry['bytes']
+
+    def _forget(self, key: str) -> dict:
+        """Drops the entry of `key`, leaving its file alone"""
+        entry = self._entries.pop(key)
+        keys = self._by_source[entry['source']]
+        keys.discard(key)
+        if not keys:
+            del self._by_source[entry['source']]
+        self._bytes -= entry['bytes']
+        return entry
+
+    def _remove(self, key: str):
+        entry = self._forget(key)
+        self._removed.add(key)
+        self._unsaved += 1
+        try:
+            (self._dir / entry['name']).unlink()
+        except FileNotFoundError:
+            pass
+
+    def _evict(self, keep: str = None):
+        if self._max_size <= 0:
+            return
+        while self._bytes > self._max_size:
+            # least recently used first, the one just put is last
+            oldest = next((key for key in self._entries if key != keep), None)
+            if oldest is None:
+                return
+            self._remove(oldest)
+            self.logger('EVICTED', oldest)
+
+    def gc(self):
+        """
+        Removes renders whose source no longer exists or has changed,
+        along with files in the cache directory that no entry refers to.
+        """
+        with self._lock:
+            # renders other processes made since this one started aren't strays
+            self._merge()
+            # source -> (key, size, mtime) of each of its renders
+            sources = {source: [(key, self._entries[key]['size'], self._entries[key]['mtime']) for key in keys]
+                       for source, keys in self._by_source.items()}
+        # sources can be on slow shares, they're looked at without holding up renders
+        stale = []
+        for source, renders in sources.items():
+            try:
+                _, size, mtime = self._identity(source)
+            except FileNotFoundError:
+                size = mtime = None
+            except OSError:
+                # can't tell, maybe the share is offline
+                continue
+            stale += [key for key, *identity in renders if identity != [size, mtime]]
+        removed = 0
+        with self._lock:
+            for key in stale:
+                if key in self._entries:
+                    self._remove(key)
+                    removed += 1
+            known = {e['name'] for e in self._entries.values()}
+
+        # files finished since are younger than STRAY_AGE
+        now = time.time()
+        patterns = [RENDER_PATTERN] + LEGACY_PATTERNS
+        for path in self._dir.iterdir():
+            if path.name in known or not any(p.match(path.name) for p in patterns):
+                continue
+            try:
+                if not path.is_file() or now - path.stat().st_mtime < STRAY_AGE:
+                    continue
+                path.unlink()
+            except FileNotFoundError:
+                # finished and renamed while we looked
+                continue
+            removed += 1
+        self.flush()
+        self.logger('CACHE GC', f'removed {removed}, kept {len(self._entries)}')
+
+    def flush(self):
+        with self._lock:
+            if self._unsaved:
+                self._save()
+
+    @staticmethod
+    def _stamp_of(path: Path) -> typing.Optional[typing.Tuple[int, int, int]]:
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            return None
+        # every save replaces the file, so the inode tells saves apart even within a timestamp
+        return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+    def _read(self) -> dict:
+        """The saved manifest, empty if nobody saved it since it was last read or written here"""
+        manifest = self._dir / self.MANIFEST
+        stamp = self._stamp_of(manifest)
+        if stamp is None or stamp == self._stamp:
+            return {}
+        # stamped before reading, a save in between is read again next time
+        self._stamp = stamp
+        try:
+            return json.loads(manifest.read_text())
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def _load(self):
+        for key, entry in self._read().items():
+            self._track(key, entry)
+
+    def _merge(self):
+        """Adds the renders other processes saved since the manifest was read"""
+        for key, entry in self._read().items():
+            if key not in self._entries and key not in self._removed:
+                self._track(key, entry)
+
+    def _save(self):
+        self._merge()
+        manifest = self._dir / self.MANIFEST
+        temp = manifest.with_name(f'{manifest.name}.{os.getpid()}.tmp')
+        # compact, indenting makes json fall back to its slow pure Python encoder
+        temp.write_text(json.dumps(self._entries, separators=(',', ':')))
+        # replacing keeps the file, so this is the stamp the manifest will have
+        stamp = self._stamp_of(temp)
+        os.replace(temp, manifest)
+        self._stamp = stamp
+        self._unsaved = 0
+        self._saved_at = time.monotonic()
@@ -0,0 +1,123 @@
+import threading
+import time
+import typing
+
+from wuzei.utils.scheduler import Job, Scheduler
+
+
+class ChangeSet:
+    """Net effect of a series of file system events"""
+
+    def __init__(self):
+        self.added: typing.Set[str] = set()
+        self.removed: typing.Set[str] = set()
+        # old path -> new path
+        self.renamed: typing.Dict[str, str] = {}
+
+    def add(self, path: str):
+        self.removed.discard(path)
+        self.added.add(path)
+
+    def remove(self, path: str):
+        for old, new in list(self.renamed.items()):
+            if new == path:
+                # renamed, then deleted: the original is what's gone
+                del self.renamed[old]
+                path = old
+        if path in self.added:
+            self.added.discard(path)
+        self.removed.add(path)
+
+    def rename(self, old: str, new: str):
+        self.removed.discard(new)
+        if old in self.added:
+            self.added.discard(old)
+            self.added.add(new)
+            return
+        for first, target in self.renamed.items():
+            if target == old:
+                # a -> old -> new is a single rename of a
+                old = first
+                break
+        if old == new:
+            self.renamed.pop(old, None)
+        else:
+            self.renamed[old] = new
+
+    def __bool__(self):
+        return bool(self.added or self.removed or self.renamed)
+
+    def __repr__(self):
+        return f'ChangeSet(+{len(self.added)} -{len(self.removed)} ~{len(self.renamed)})'
+
+
+class ChangeCollector:
+    """
+    Collects file system events into a `ChangeSet` and hands it to `apply`
+    once no events arrived for `delay` seconds, or `max_delay` seconds after
+    the first one, whichever comes first. Events that arrive while a change
+    set is being applied go into the next one.
+    """
+
+    def __init__(self,
+                 apply: typing.Callable[[ChangeSet], typing.Any],
+                 scheduler: Scheduler,
+                 delay: float,
+                 max_delay: float = None):
+        self._apply = apply
+        self._scheduler = scheduler
+        self._delay = delay
+        self._max_delay = max_delay if max_delay is not None else delay * 5
+        self._lock = threading.Lock()
+        self._changes = ChangeSet()
+        self._first_event: float = None
+        self._job: Job = None
+        self._stopped = False
+
+    def created(self, path: str):
+        with self._lock:
+            if self._stopped:
+                return
+            self._changes.add(path)
+            self._schedule()
+
+    def deleted(self, path: str):
+        with self._lock:
+            if self._stopped:
+                return
+            self._changes.remove(path)
+            self._schedule()
+
+    def renamed(self, old: str, new: str):
+        with self._lock:
+            if self._stopped:
+                return
+            self._changes.rename(old, new)
+            self._schedule()
+
+    def _schedule(self):
+        now = time.monotonic()
+        if self._first_event is None:
+            self._first_event = now
+        delay = max(0.0, min(self._delay, self._first_event + self._max_delay - now))
+        if self._job:
+            self._job.reschedule(delay)
+        else:
+            self._job = self._scheduler.call_later(delay, self.flush)
+
+    def flush(self):
+        with self._lock:
+            changes, self._changes = self._changes, ChangeSet()
+            self._first_event = None
+            if self._job:
+                self._job.cancel()
+        if changes:
+            self._apply(changes)
+
+    def stop(self):
+        """Drops the changes not applied yet and ignores events from now on"""
+        with self._lock:
+            self._stopped = True
+            self._changes = ChangeSet()
+            if self._job:
+                self._job.cancel()
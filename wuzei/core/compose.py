@@ -0,0 +1,98 @@
+import hashlib
+import typing
+from pathlib import Path
+
+from PIL import Image
+
+from .blur import ENGINES
+from .render import Encoding, cover_size, load_scaled, save_image
+
+SPAN = 'span'
+EACH = 'each'
+COMPOSE_MODES = (SPAN, EACH)
+
+
+class Monitor(typing.NamedTuple):
+    """A monitor's rectangle on the virtual desktop, which may start at negative coordinates"""
+    left: int
+    top: int
+    width: int
+    height: int
+
+    @property
+    def right(self) -> int:
+        return self.left + self.width
+
+    @property
+    def bottom(self) -> int:
+        return self.top + self.height
+
+
+def bounds(monitors: typing.Sequence[Monitor]) -> Monitor:
+    """Rectangle of the whole virtual desktop"""
+    left = min(m.left for m in monitors)
+    top = min(m.top for m in monitors)
+    right = max(m.right for m in monitors)
+    bottom = max(m.bottom for m in monitors)
+    return Monitor(left, top, right - left, bottom - top)
+
+
+def layout_hash(monitors: typing.Sequence[Monitor]) -> str:
+    layout = ';'.join(','.join(map(str, m)) for m in sorted(monitors))
+    return hashlib.sha1(layout.encode()).hexdigest()[:12]
+
+
+def _cover(img: Image.Image, size: typing.Tuple[int, int]) -> Image.Image:
+    """Scales `img` to cover `size` and crops it around the center"""
+    width, height = size
+    scaled = load_scaled(img, cover_size(img.size, size))
+    left = (scaled.width - width) // 2
+    top = (scaled.height - height) // 2
+    return scaled.crop((left, top, left + width, top + height))
+
+
+def compose(image_paths: typing.Sequence[str],
+            monitors: typing.Sequence[Monitor],
+            save_path: str,
+            mode: str = SPAN,
+            blur_engine: str = None,
+            encoding: Encoding = None) -> Path:
+    """
+    Renders a canvas covering all `monitors`, positioned so its top left is
+    the top left of the virtual desktop, the way Windows spans wallpapers.
+
+    In `span` mode the first image is stretched across every monitor,
+    in `each` mode every monitor gets the next image in `image_paths`.
+    Each source is decoded once, however many monitors show it.
+    With a `blur_engine`, every monitor is blurred like a single screen would be.
+    """
+    if mode not in COMPOSE_MODES:
+        raise ValueError(f'Unknown compose mode: {mode}')
+    desktop = bounds(monitors)
+    canvas = Image.new('RGB', (desktop.width, desktop.height))
+
+    if mode == SPAN:
+        with Image.open(image_paths[0]) as img:
+            spanned = _cover(img, canvas.size)
+        for m in monitors:
+            box = (m.left - desktop.left, m.top - desktop.top,
+                   m.right - desktop.left, m.bottom - desktop.top)
+            tile = spanned.crop(box)
+            if blur_engine:
+                tile = ENGINES[blur_engine](tile, max(tile.size) // 10, tile.size)
+            canvas.paste(tile, box[:2])
+        return save_image(canvas, save_path, encoding)
+
+    assignments = {m: image_paths[i % len(image_paths)] for i, m in enumerate(monitors)}
+    for image_path in dict.fromkeys(assignments.values()):
+        shown_on = [m for m, p in assignments.items() if p == image_path]
+        with Image.open(image_path) as img:
+            # decode once, big enough for the largest monitor showing it
+            largest = max(shown_on, key=lambda m: m.width * m.height)
+            decoded = load_scaled(img, cover_size(img.size, (largest.width, largest.height)))
+        for m in shown_on:
+            tile = _cover(decoded, (m.width, m.height))
+            if blur_engine:
+                tile = ENGINES[blur_engine](tile, max(tile.size) // 10, tile.size)
+            canvas.paste(tile, (m.left - desktop.left, m.top - desktop.top))
+    return save_image(canvas, save_path, encoding)
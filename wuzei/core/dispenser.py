@@ -1,18 +1,64 @@
+import itertools
+import math
+import typing
+from array import array
+from bisect import bisect_left, bisect_right
 from random import shuffle, randrange
 
+from .paths import PathList
+from .permutation import Permutation
+
+# dead slots a CompactDispenser leaves at least before it compacts its paths
+COMPACT_AFTER = 1024
+
 
 class Dispenser:
+    """
+    Cycles through `things` either in sorted or shuffled order.
+
+    Sorted order is looked up with bisection, shuffled order keeps a
+    thing -> position map, so finding an item never scans the list.
+    Items can be added, removed and renamed in place without disturbing
+    the current item or the order of the others. A filter hides items
+    from stepping without taking them out of the order.
+    """
+
     def __init__(self, things: list, shuffled: bool = False, delta: int = 1):
         self._things = sorted(things)
         self._shuffled = shuffled
         self._delta = delta
-        self._pos, self._max = 0, len(things)
+        self._positions: typing.Dict[typing.Any, int] = {}
+        # things the filter rejected, skipped when moving around
+        self._hidden: typing.Set = set()
+        self._pos = 0
         if shuffled:
             self.shuffle()
 
+    @classmethod
+    def restore(cls, order: list, current=None, shuffled: bool = True) -> 'Dispenser':
+        """Picks a playlist back up in the `order` it was saved in, at `current`"""
+        dispenser = cls([])
+        dispenser._shuffled = shuffled
+        if shuffled:
+            dispenser._things = list(order)
+            dispenser._index_positions()
+        else:
+            dispenser._things = sorted(order)
+        if current is not None:
+            dispenser.seek(current)
+        return dispenser
+
     @property
     def current(self):
-        return self._things[self._pos]
+        return self._at(self._pos)
+
+    def _at(self, pos: int):
+        """The thing at `pos` in playing order"""
+        return self._things[pos]
+
+    @property
+    def shuffled(self) -> bool:
+        return self._shuffled
 
     @property
     def things(self):
@@ -20,42 +66,190 @@ class Dispenser:
 
     @things.setter
     def things(self, items):
-        current = self.current
-        self._things = items
+        current = self.current if self._things else None
+        self._things = list(items)
+        if self._shuffled:
+            shuffle(self._things)
+            self._index_positions()
+        else:
+            self._things.sort()
         try:
-            self._pos = self._things.index(current)
+            self._pos = self._position(current)
             return
         except ValueError:
             pass
 
         if self._shuffled:
-            self._pos = randrange(self._max)
+            self._pos = randrange(len(self._things))
         else:
             self._pos = 0
 
+    def _index_positions(self):
+        self._positions = {thing: i for i, thing in enumerate(self._things)}
+
+    def _position(self, item) -> int:
+        if self._shuffled:
+            try:
+                return self._positions[item]
+            except KeyError:
+                raise ValueError(f'{item} is not in dispenser')
+        i = bisect_left(self._things, item)
+        if i < len(self._things) and self._things[i] == item:
+            return i
+        raise ValueError(f'{item} is not in dispenser')
+
+    def seek(self, item):
+        """Makes `item` the current one, raises ValueError if it isn't here"""
+        self._pos = self._position(item)
+        return item
+
+    def __contains__(self, item):
+        try:
+            self._position(item)
+            return True
+        except ValueError:
+            return False
+
+    def add(self, items: typing.Iterable):
+        for item in items:
+            if item in self:
+                continue
+            if not self._shuffled:
+                i = bisect_left(self._things, item)
+                self._things.insert(i, item)
+                if i <= self._pos and len(self._things) > 1:
+                    self._pos += 1
+                continue
+            # drop it at a random place, swapping out whatever was there
+            self._things.append(item)
+            last = len(self._things) - 1
+            i = randrange(len(self._things))
+            if i == self._pos:
+                i = last
+            self._things[i], self._things[last] = item, self._things[i]
+            self._positions[self._things[last]] = last
+            self._positions[item] = i
+
+    def remove(self, items: typing.Iterable):
+        for item in items:
+            try:
+                i = self._position(item)
+            except ValueError:
+                continue
+            self._hidden.discard(item)
+            if not self._shuffled:
+                del self._things[i]
+                if i < self._pos:
+                    self._pos -= 1
+            else:
+                # fill the hole with the last item instead of shifting everything
+                del self._positions[item]
+                last = self._things.pop()
+                if i < len(self._things):
+                    self._things[i] = last
+                    self._positions[last] = i
+                    if self._pos == len(self._things):
+                        self._pos = i
+            if self._pos >= len(self._things):
+                self._pos = 0
+
+    def rename(self, old, new):
+        try:
+            i = self._position(old)
+        except ValueError:
+            return self.add([new])
+        was_current = i == self._pos
+        if old in self._hidden:
+            self._hidden.discard(old)
+            self._hidden.add(new)
+        if new in self:
+            self.remove([old])
+            if was_current:
+                self._pos = self._position(new)
+            return
+        if self._shuffled:
+            del self._positions[old]
+            self._things[i] = new
+            self._positions[new] = i
+            return
+        self.remove([old])
+        self.add([new])
+        if was_current:
+            self._pos = self._position(new)
+
+    def update(self, items: typing.Iterable):
+        """Replaces the things by applying the difference, keeping the order of the rest"""
+        items = set(items)
+        existing = set(self._things)
+        self.remove(existing - items)
+        self.add(sorted(items - existing))
+
+    def filter(self, predicate: typing.Optional[typing.Callable[[list], typing.Sequence[bool]]]) -> bool:
+        """
+        Hides the things `predicate` rejects, it's called once with all of
+        them and returns whether each passes. None shows everything again.
+        Returns False and shows everything if nothing passes.
+        """
+        if predicate is None:
+            self._hidden = set()
+            return True
+        keep = predicate(self._things)
+        hidden = {thing for thing, passes in zip(self._things, keep) if not passes}
+        if len(hidden) == len(self._things):
+            self._hidden = set()
+            return False
+        self._hidden = hidden
+        return True
+
+    def is_hidden(self, item) -> bool:
+        return item in self._hidden
+
     def random(self):
-        self._pos = randrange(self._max)
-        return self._things[self._pos]
+        if self._hidden:
+            visible = [i for i, thing in enumerate(self._things) if thing not in self._hidden]
+            if visible:
+                self._pos = visible[randrange(len(visible))]
+                return self.current
+        self._pos = randrange(len(self._things))
+        return self.current
 
     def shuffle(self):
-        temp = self._things[self._pos]
+        temp = self.current
         shuffle(self._things)
-        self._pos = self._things.index(temp)
         self._shuffled = True
+        self._index_positions()
+        self._pos = self._positions[temp]
 
     def unshuffle(self):
-        temp = self._things[self._pos]
-        self._things = sorted(self._things)
-        self._pos = self._things.index(temp)
+        temp = self.current
+        self._things.sort()
         self._shuffled = False
+        self._positions = {}
+        self._pos = self._position(temp)
+
+    def _offset(self, pos: int, delta: int) -> int:
+        """Position `delta` visible steps away from `pos`"""
+        count = len(self._things)
+        if not self._hidden:
+            return (pos + delta) % count
+        step = 1 if delta > 0 else -1
+        for _ in range(abs(delta)):
+            for _ in range(count):
+                pos = (pos + step) % count
+                if self._at(pos) not in self._hidden:
+                    break
+        return pos
+
+    def peek(self, delta: int):
+        """Returns the item `delta` steps away from the current one without moving"""
+        return self._at(self._offset(self._pos, delta))
+
+    def after(self, item, delta: int):
+        """Returns the item `delta` steps away from `item`"""
+        return self._at(self._offset(self._position(item), delta))
 
     def _move(self, delta: int):
-        pos = self._pos + delta
-        if pos >= self._max:
-            pos %= self._max
-        elif pos < 0:
-            pos += self._max
-        self._pos = pos
+        self._pos = self._offset(self._pos, delta)
 
     def __add__(self, delta: int):
         self._move(delta)
@@ -69,4 +263,419 @@ class Dispenser:
         return len(self._things)
 
     def __getitem__(self, i):
-        return self._things[i]
+        return self._at(i)
+
+    def __iter__(self):
+        """Things in playing order"""
+        return (self._at(i) for i in range(len(self)))
+
+
+class CompactDispenser(Dispenser):
+    """
+    Dispenser of paths for huge playlists. The paths are kept sorted in a
+    `PathList`, the shuffled order and where each path is in it in two
+    `array('I')`s of the paths' slots, instead of lists and dicts of `str`.
+
+    A path keeps its slot while others come and go, so like the Dispenser
+    a change only touches the order where a path goes or was, and the
+    sorted slots are shifted or rebuilt in a single pass.
+    """
+
+    def __init__(self, things: typing.Iterable[str], shuffled: bool = False):
+        super().__init__([])
+        self._things = PathList(sorted(things))
+        # shuffled position: slot, and back
+        self._order: typing.Optional[array] = None
+        self._positions: typing.Optional[array] = None
+        if shuffled and self._things:
+            self.shuffle()
+            self._pos = randrange(len(self._things))
+
+    @classmethod
+    def restore(cls, order: list, current=None, shuffled: bool = True) -> 'CompactDispenser':
+        """Picks a playlist back up in the `order` it was saved in, at `current`"""
+        dispenser = cls(order)
+        if shuffled:
+            things = dispenser._things
+            dispenser._order = array('I', (things.slot(things.index(thing)) for thing in order))
+            dispenser._shuffled = True
+            dispenser._index_positions()
+        if current is not None:
+            dispenser.seek(current)
+        return dispenser
+
+    @Dispenser.things.setter
+    def things(self, items):
+        current = self.current if self._things else None
+        self._things = PathList(sorted(items))
+        if self._shuffled:
+            self._shuffle_order()
+        self._reposition(current)
+
+    def _at(self, pos: int):
+        if self._shuffled:
+            return self._things.path(self._order[pos])
+        return self._things[pos]
+
+    def _position(self, item) -> int:
+        i = self._things.index(item)
+        if i is None:
+            raise ValueError(f'{item} is not in dispenser')
+        return self._positions[self._things.slot(i)] if self._shuffled else i
+
+    def _index_positions(self):
+        self._positions = array('I', [0]) * self._things.slots
+        for pos, slot in enumerate(self._order):
+            self._positions[slot] = pos
+
+    def _reposition(self, current):
+        """Finds `current` again after a change, staying put if it's gone"""
+        try:
+            if current is None:
+                raise ValueError('Nothing was current')
+            self._pos = self._position(current)
+        except ValueError:
+            self._pos = min(self._pos, max(0, len(self._things) - 1))
+
+    def _reorder(self, added: typing.List[int], dropped: typing.List[int]):
+        """Carries the shuffled order over slots that were added and dropped"""
+        if not self._shuffled:
+            return
+        order, positions = self._order, self._positions
+        for slot in dropped:
+            # fill the hole with the last one instead of shifting everything
+            i = positions[slot]
+            last = order.pop()
+            if i < len(order):
+                order[i] = last
+                positions[last] = i
+        positions.extend(array('I', [0]) * (self._things.slots - len(positions)))
+        for slot in added:
+            # drop it at a random place, swapping out whatever was there
+            order.append(slot)
+            last = len(order) - 1
+            i = randrange(len(order))
+            if i == self._pos:
+                i = last
+            order[i], order[last] = slot, order[i]
+            positions[order[last]] = last
+            positions[slot] = i
+
+    def _compact(self):
+        """Drops dead slots once there are as many as paths, renumbering the order"""
+        if self._things.dead < max(COMPACT_AFTER, len(self._things)):
+            return
+        remap = self._things.compact()
+        if self._order is not None:
+            self._order = array('I', (remap[slot] for slot in self._order))
+            self._index_positions()
+
+    def add(self, items: typing.Iterable):
+        new = sorted({item for item in items if self._things.index(item) is None})
+        if not new:
+            return
+        current = self.current if self._things else None
+        self._reorder(self._things.insert(new), [])
+        self._reposition(current)
+
+    def remove(self, items: typing.Iterable):
+        gone = sorted({i for i in map(self._things.index, items) if i is not None})
+        if not gone:
+            return
+        current = self.current
+        for i in gone:
+            self._hidden.discard(self._things[i])
+        self._reorder([], self._things.remove(gone))
+        self._compact()
+        self._reposition(current)
+
+    def rename(self, old, new):
+        if old == new:
+            return
+        i = self._things.index(old)
+        if i is None:
+            return self.add([new])
+        was_current = self.current == old
+        if old in self._hidden:
+            self._hidden.discard(old)
+            self._hidden.add(new)
+        if self._things.index(new) is not None:
+            self.remove([old])
+            if was_current:
+                self.seek(new)
+            return
+        current = self.current
+        dead = self._things.remove([i])
+        slot, = self._things.insert([new])
+        if self._order is not None:
+            # the new path takes the old one's place in the order
+            pos = self._positions[dead[0]]
+            self._positions.extend(array('I', [0]) * (self._things.slots - len(self._positions)))
+            self._order[pos] = slot
+            self._positions[slot] = pos
+        else:
+            self._reorder([slot], dead)
+        self._compact()
+        self._reposition(new if was_current else current)
+
+    def update(self, items: typing.Iterable, ordered: bool = False):
+        """
+        Replaces the things by applying the difference, walking both in sorted
+        order. `ordered` items are sorted and distinct already, like listings
+        from the index, and aren't copied.
+        """
+        if not ordered:
+            items = sorted(set(items))
+        existing = iter(self._things)
+        removed, added = [], []
+        thing = next(existing, None)
+        for item in items:
+            while thing is not None and thing < item:
+                removed.append(thing)
+                thing = next(existing, None)
+            if thing == item:
+                thing = next(existing, None)
+            else:
+                added.append(item)
+        while thing is not None:
+            removed.append(thing)
+            thing = next(existing, None)
+        self.remove(removed)
+        self.add(added)
+
+    def random(self):
+        self._pos = randrange(len(self._things))
+        if self._hidden and self.current in self._hidden:
+            self._move(1)
+        return self.current
+
+    def _shuffle_order(self):
+        self._order = self._things.sorted_slots()
+        shuffle(self._order)
+        self._index_positions()
+
+    def shuffle(self):
+        current = self.current if self._things else None
+        self._shuffle_order()
+        self._shuffled = True
+        self._reposition(current)
+
+    def unshuffle(self):
+        current = self.current if self._things else None
+        self._shuffled = False
+        self._order = self._positions = None
+        self._reposition(current)
+
+
+class PermutedDispenser(CompactDispenser):
+    """
+    CompactDispenser whose shuffled order is a seeded `Permutation` of the
+    sorted paths instead of an array. It takes no memory beyond the paths,
+    reshuffling is picking a seed and the order is saved as the seed alone.
+
+    Adding or removing things resizes the permutation, which reorders
+    everything but the current thing.
+    """
+
+    def __init__(self, things: typing.Iterable[str], shuffled: bool = False, seed: int = None):
+        super().__init__(things)
+        self._perm = Permutation(len(self._things), seed)
+        self._shuffled = shuffled
+        if shuffled and self._things:
+            self._pos = randrange(len(self._things))
+
+    @classmethod
+    def restore(cls, order: list, current=None, shuffled: bool = True, seed: int = None) -> 'PermutedDispenser':
+        """Picks a playlist back up from its things in any order and its seed, at `current`"""
+        dispenser = cls(order, shuffled=shuffled, seed=seed)
+        if current is not None:
+            dispenser.seek(current)
+        return dispenser
+
+    @property
+    def seed(self) -> int:
+        return self._perm.seed
+
+    def _at(self, pos: int):
+        return self._things[self._perm[pos] if self._shuffled else pos]
+
+    def _position(self, item) -> int:
+        i = self._things.index(item)
+        if i is None:
+            raise ValueError(f'{item} is not in dispenser')
+        return self._perm.index(i) if self._shuffled else i
+
+    def _reorder(self, added: typing.List[int], dropped: typing.List[int]):
+        self._perm = self._perm.resized(len(self._things))
+
+    def _shuffle_order(self):
+        self._perm = Permutation(len(self._things))
+
+    def shuffle(self, seed: int = None):
+        """Picks a new order, in constant time"""
+        current = self.current if self._things else None
+        self._perm = Permutation(len(self._things), seed)
+        self._shuffled = True
+        self._reposition(current)
+
+    def unshuffle(self):
+        current = self.current if self._things else None
+        self._shuffled = False
+        self._perm = self._perm.resized(len(self._things))
+        self._reposition(current)
+
+
+# eager shuffles a copy of the playlist, lazy is a PermutedDispenser
+SHUFFLE_MODES = ('eager', 'lazy')
+# how Interleaved takes turns
+ROUND_ROBIN = 'round_robin'
+WEIGHTED = 'weighted'
+INTERLEAVE_MODES = (ROUND_ROBIN, WEIGHTED)
+# 1 / golden ratio, strides by it spread turns evenly over any size
+_PHI = 0.6180339887498949
+
+
+class Interleaved:
+    """
+    Plays several dispensers as one, taking turns between them
+    round-robin or in proportion to their sizes, without building a
+    combined list. Every member keeps its own order and position, so
+    one changing costs nothing here, turns are worked out from the
+    sizes at the time they're taken.
+    """
+
+    def __init__(self, members: typing.List[Dispenser], mode: str = WEIGHTED):
+        if mode not in INTERLEAVE_MODES:
+            raise ValueError(f'Unknown interleave mode: {mode}')
+        self._mode = mode
+        self._members: typing.List[Dispenser] = []
+        # turns taken so far, the weighted order is a function of it
+        self._step = 0
+        # the member whose current thing is current
+        self._turn = 0
+        self.members = members
+
+    @property
+    def members(self) -> typing.List[Dispenser]:
+        return self._members
+
+    @members.setter
+    def members(self, members: typing.List[Dispenser]):
+        """Replaces the members, staying on the current one if it's still there"""
+        current = self._members[self._turn] if self._members else None
+        self._members = list(members)
+        turns = [i for i, member in enumerate(self._members) if member is current and len(member)]
+        live = [i for i, member in enumerate(self._members) if len(member)]
+        if not live:
+            raise ValueError('Nothing to interleave')
+        self._turn = turns[0] if turns else live[0]
+
+    @property
+    def current(self):
+        return self._members[self._settled()].current
+
+    @property
+    def shuffled(self) -> bool:
+        return all(member.shuffled for member in self._members if len(member))
+
+    def shuffle(self):
+        for member in self._members:
+            if len(member) and not member.shuffled:
+                member.shuffle()
+
+    def unshuffle(self):
+        for member in self._members:
+            if len(member) and member.shuffled:
+                member.unshuffle()
+
+    def _live(self) -> typing.List[int]:
+        """Members with things in them, empty ones sit out until they get some"""
+        live = [i for i, member in enumerate(self._members) if len(member)]
+        if not live:
+            raise IndexError('Nothing to interleave')
+        return live
+
+    def _settled(self) -> int:
+        """The turn, passed on to whose turn the step is if its member ran out of things"""
+        if not len(self._members[self._turn]):
+            self._turn = self._member(self._step)
+        return self._turn
+
+    def _member(self, step: int) -> int:
+        """Whose turn `step` is"""
+        live = self._live()
+        if self._mode == ROUND_ROBIN:
+            return live[step % len(live)]
+        ends = list(itertools.accumulate(len(member) for member in self._members))
+        total = ends[-1]
+        stride = max(1, int(total * _PHI))
+        while math.gcd(stride, total) != 1:
+            stride += 1
+        return bisect_right(ends, step * stride % total)
+
+    def _walk(self, delta: int) -> typing.Tuple[int, int, typing.Dict[int, int]]:
+        """(step, turn) `delta` turns away and how far each member moves to get there"""
+        step, turn = self._step, self._settled()
+        moves: typing.Dict[int, int] = {}
+        for _ in range(abs(delta)):
+            # a member moves on when its turn ends, so each starts where it was left
+            if delta > 0:
+                moves[turn] = moves.get(turn, 0) + 1
+                step += 1
+                turn = self._member(step)
+            else:
+                step -= 1
+                turn = self._member(step)
+                moves[turn] = moves.get(turn, 0) - 1
+        return step, turn, moves
+
+    def peek(self, delta: int):
+        _, turn, moves = self._walk(delta)
+        return self._members[turn].peek(moves.get(turn, 0))
+
+    def after(self, item, delta: int):
+        if item == self.current:
+            return self.peek(delta)
+        return self._owner(item).after(item, delta)
+
+    def _move(self, delta: int):
+        self._step, self._turn, moves = self._walk(delta)
+        for i, moved in moves.items():
+            self._members[i]._move(moved)
+
+    def __add__(self, delta: int):
+        self._move(delta)
+        return self.current
+
+    def __sub__(self, delta: int):
+        self._move(-delta)
+        return self.current
+
+    def random(self):
+        live = self._live()
+        if self._mode == ROUND_ROBIN:
+            self._turn = live[randrange(len(live))]
+        else:
+            ends = list(itertools.accumulate(len(member) for member in self._members))
+            self._turn = bisect_right(ends, randrange(ends[-1]))
+        return self._members[self._turn].random()
+
+    def _owner(self, item) -> Dispenser:
+        for member in self._members:
+            if item in member:
+                return member
+        raise ValueError(f'{item} is not in dispenser')
+
+    def seek(self, item):
+        owner = self._owner(item)
+        self._turn = next(i for i, member in enumerate(self._members) if member is owner)
+        return owner.seek(item)
+
+    def is_hidden(self, item) -> bool:
+        return any(member.is_hidden(item) for member in self._members)
+
+    def __contains__(self, item):
+        return any(item in member for member in self._members)
+
+    def __len__(self):
+        return sum(len(member) for member in self._members)
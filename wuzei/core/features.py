@@ -0,0 +1,115 @@
+import os
+import typing
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from PIL import Image
+
+from .render import flatten
+
+# features are computed from a thumbnail this big, enough for averages
+THUMBNAIL_SIZE = (32, 32)
+# dominant colors are counted in buckets of 2^5 levels per channel
+COLOR_SHIFT = 5
+# rec. 709 luma
+LUMA = np.array([0.2126, 0.7152, 0.0722], dtype=np.float32)
+
+# aspect ratios within this much of 1 are square
+SQUARE_TOLERANCE = 0.05
+LANDSCAPE = 1
+SQUARE = 0
+PORTRAIT = -1
+# dimensions couldn't be read
+UNKNOWN = -128
+
+Features = typing.Tuple[float, int, int, int]
+
+
+def compute_features(image_path: str) -> typing.Optional[Features]:
+    """Mean luminance in [0, 1] and the dominant (r, g, b) color, None if it can't be read"""
+    try:
+        with Image.open(image_path) as img:
+            img.draft('RGB', THUMBNAIL_SIZE)
+            img.thumbnail(THUMBNAIL_SIZE, resample=Image.BILINEAR)
+            pixels = np.asarray(flatten(img), dtype=np.uint8).reshape(-1, 3)
+    except (OSError, ValueError):
+        return None
+    luminance = float((pixels @ LUMA).mean() / 255)
+    buckets = pixels >> COLOR_SHIFT
+    bits = 8 - COLOR_SHIFT
+    buckets = buckets.astype(np.int32)
+    ids = (buckets[:, 0] << (2 * bits)) | (buckets[:, 1] << bits) | buckets[:, 2]
+    dominant = np.bincount(ids).argmax()
+    red, green, blue = pixels[ids == dominant].mean(axis=0).round().astype(int)
+    return luminance, int(red), int(green), int(blue)
+
+
+def compute_many(image_paths: typing.Sequence[str],
+                 workers: int = None) -> typing.List[typing.Optional[Features]]:
+    """Computes features of many images in a pool of processes, in the order given"""
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(image_paths) < 2:
+        return [compute_features(path) for path in image_paths]
+    # big enough chunks that pickling doesn't dominate, small enough to balance
+    chunk = max(1, min(64, len(image_paths) // (4 * workers)))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(compute_features, image_paths, chunksize=chunk))
+
+
+class FeatureTable:
+    """
+    Features of a source's images as parallel arrays, so filtering a
+    playlist is a handful of vectorized comparisons instead of reading files.
+    Missing features are NaN and fail every comparison.
+    """
+
+    def __init__(self, rows: typing.Sequence[tuple]):
+        """`rows` of (path, width, height, luminance, red, green, blue)"""
+        self.paths = [row[0] for row in rows]
+        self._rows = {path: i for i, path in enumerate(self.paths)}
+        values = np.array([[np.nan if v is None else v for v in row[1:]] for row in rows],
+                          dtype=np.float32).reshape(-1, 6)
+        width, height = values[:, 0], values[:, 1]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            self.aspect = width / height
+        self.orientation = np.full(len(rows), UNKNOWN, dtype=np.int8)
+        self.orientation[abs(self.aspect - 1) <= SQUARE_TOLERANCE] = SQUARE
+        self.orientation[self.aspect > 1 + SQUARE_TOLERANCE] = LANDSCAPE
+        self.orientation[self.aspect < 1 - SQUARE_TOLERANCE] = PORTRAIT
+        self.luminance = values[:, 2]
+        self.color = values[:, 3:6]
+
+    def __len__(self):
+        return len(self.paths)
+
+    def mask(self, predicate: typing.Callable[['FeatureTable'], np.ndarray]) -> np.ndarray:
+        """Evaluates `predicate` over every row at once"""
+        return np.asarray(predicate(self), dtype=bool)
+
+    def predicate(self, filters: typing.Sequence[str]) -> typing.Callable[[typing.Sequence], np.ndarray]:
+        """
+        Returns a function that maps a list of paths to whether each passes
+        all `filters`, for `Dispenser.filter`. Unknown paths pass.
+        """
+        keep = np.ones(len(self), dtype=bool)
+        for name in filters:
+            keep &= self.mask(FILTERS[name])
+        rows = self._rows
+
+        def passes(things: typing.Sequence) -> np.ndarray:
+            index = np.fromiter((rows.get(thing, -1) for thing in things), dtype=np.int64, count=len(things))
+            # append a row for the unknown, which index -1 picks
+            return np.append(keep, True)[index]
+
+        return passes
+
+
+FILTERS: typing.Dict[str, typing.Callable[[FeatureTable], np.ndarray]] = {
+    'dark': lambda t: t.luminance < 0.35,
+    'light': lambda t: t.luminance > 0.6,
+    'landscape': lambda t: t.orientation == LANDSCAPE,
+    'portrait': lambda t: t.orientation == PORTRAIT,
+    'square': lambda t: t.orientation == SQUARE,
+    # wide enough to fill a 16:9 screen without cropping much
+    'wide': lambda t: t.aspect >= 1.6,
+}
@@ -0,0 +1,306 @@
+import json
+import os
+import sqlite3
+import threading
+import typing
+from pathlib import Path
+
+from PIL import Image
+
+from wuzei.utils.finder import is_excluded, scan_directory
+from .features import FeatureTable, compute_many
+
+# bump when the tables change, the index is rebuilt from scratch
+SCHEMA_VERSION = 1
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS directories (
+    path TEXT PRIMARY KEY,
+    source TEXT NOT NULL,
+    parent TEXT,
+    -- -1 until the directory is listed
+    mtime INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS directories_parent ON directories (parent);
+CREATE TABLE IF NOT EXISTS images (
+    path TEXT PRIMARY KEY,
+    source TEXT NOT NULL,
+    directory TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime INTEGER NOT NULL,
+    width INTEGER,
+    height INTEGER
+);
+CREATE INDEX IF NOT EXISTS images_source ON images (source, path);
+CREATE TABLE IF NOT EXISTS features (
+    path TEXT PRIMARY KEY,
+    -- of the file the features were computed from
+    size INTEGER NOT NULL,
+    mtime INTEGER NOT NULL,
+    -- NULL if the image couldn't be read
+    luminance REAL,
+    red INTEGER,
+    green INTEGER,
+    blue INTEGER
+);
+CREATE TABLE IF NOT EXISTS settings (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+'''
+
+
+def read_dimensions(image_path: str) -> typing.Tuple[typing.Optional[int], typing.Optional[int]]:
+    # only reads the header, pixels are decoded lazily
+    try:
+        with Image.open(image_path) as img:
+            return img.size
+    except (OSError, ValueError):
+        return None, None
+
+
+class ImageIndex:
+    """
+    Persistent listing of the images in each source.
+
+    A directory is listed again only when its modification time changes,
+    and only the files that are new or have changed are read. Files edited
+    in place leave their directory's time alone, so the ones in unchanged
+    directories are checked too. Rescanning an unchanged source costs a
+    stat per directory and image.
+    """
+
+    def __init__(self,
+                 db_path: str,
+                 extensions: typing.Iterable[str] = None,
+                 recursive: bool = True,
+                 max_depth: int = None,
+                 exclude: typing.Iterable[str] = None,
+                 logger=None):
+        if not logger:
+            logger = print
+        self.logger = logger
+        self._extensions = extensions
+        self._max_depth = max_depth if recursive else 0
+        self._exclude = exclude
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(str(db_path), check_same_thread=False)
+        with self._db:
+            version, = self._db.execute('PRAGMA user_version').fetchone()
+            if version != SCHEMA_VERSION:
+                self._db.executescript('DROP TABLE IF EXISTS directories; DROP TABLE IF EXISTS images;')
+                self._db.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+            self._db.executescript(SCHEMA)
+            self._apply_options()
+
+    def _apply_options(self):
+        """Lists every directory again if the walk options changed since the last run"""
+        options = json.dumps(dict(extensions=sorted(self._extensions or []),
+                                  max_depth=self._max_depth,
+                                  exclude=sorted(self._exclude or [])))
+        row = self._db.execute("SELECT value FROM settings WHERE key = 'options'").fetchone()
+        if row and row[0] == options:
+            return
+        self._db.execute('UPDATE directories SET mtime = -1')
+        self._db.execute("INSERT OR REPLACE INTO settings VALUES ('options', ?)", (options,))
+
+    def images(self, source: str) -> typing.List[str]:
+        with self._lock:
+            rows = self._db.execute('SELECT path FROM images WHERE source = ? ORDER BY path',
+                                    (source,))
+            return [path for path, in rows]
+
+    def dimensions(self, image_path: str) -> typing.Optional[typing.Tuple[int, int]]:
+        with self._lock:
+            row = self._db.execute('SELECT width, height FROM images WHERE path = ?',
+                                   (image_path,)).fetchone()
+        if not row or row[0] is None:
+            return None
+        return row
+
+    def features(self, source: str) -> FeatureTable:
+        """Features of every image in `source`, NaN where they're missing or out of date"""
+        with self._lock:
+            rows = self._db.execute(
+                    'SELECT i.path, i.width, i.height, f.luminance, f.red, f.green, f.blue '
+                    'FROM images i LEFT JOIN features f '
+                    'ON f.path = i.path AND f.size = i.size AND f.mtime = i.mtime '
+                    'WHERE i.source = ? ORDER BY i.path', (source,)).fetchall()
+        return FeatureTable(rows)
+
+    def update_features(self, source: str, workers: int = None) -> int:
+        """Computes features of the images in `source` that have none, returns how many"""
+        with self._lock:
+            missing = self._db.execute(
+                    'SELECT i.path, i.size, i.mtime FROM images i LEFT JOIN features f '
+                    'ON f.path = i.path AND f.size = i.size AND f.mtime = i.mtime '
+                    'WHERE i.source = ? AND f.path IS NULL', (source,)).fetchall()
+        if not missing:
+            return 0
+        features = compute_many([path for path, _, _ in missing], workers=workers)
+        rows = [(path, size, mtime, *(computed or (None,) * 4))
+                for (path, size, mtime), computed in zip(missing, features)]
+        with self._lock, self._db:
+            self._db.executemany('INSERT OR REPLACE INTO features VALUES (?, ?, ?, ?, ?, ?, ?)', rows)
+            self._db.execute('DELETE FROM features WHERE path NOT IN (SELECT path FROM images)')
+        return len(rows)
+
+    def is_indexed(self, source: str) -> bool:
+        with self._lock:
+            row = self._db.execute('SELECT mtime FROM directories WHERE path = ?',
+                                   (str(Path(source)),)).fetchone()
+        return bool(row) and row[0] >= 0
+
+    def scan(self, source: str, directory: str = None) -> typing.List[str]:
+        """
+        Brings the listing of `source` up to date and returns it. With
+        `directory` only that part of `source` is walked, e.g. one moved in.
+        """
+        root, depth = str(Path(source)), 0
+        if directory:
+            root = str(Path(directory))
+            try:
+                parts = Path(os.path.relpath(root, source)).parts
+            except ValueError:
+                # on a different drive
+                return self.images(source)
+            if (parts[0] == os.pardir
+                    or self._max_depth is not None and len(parts) > self._max_depth
+                    or any(is_excluded(part, self._exclude) for part in parts)):
+                return self.images(source)
+            depth = len(parts)
+            with self._lock, self._db:
+                # listed from scratch, and found under its parent in later scans
+                self._db.execute('INSERT OR REPLACE INTO directories VALUES (?, ?, ?, -1)',
+                                 (root, source, os.path.dirname(root)))
+        visited = set()
+        pending = [(root, depth)]
+        while pending:
+            directory, depth = pending.pop()
+            visited.add(directory)
+            try:
+                mtime = os.stat(directory).st_mtime_ns
+            except FileNotFoundError:
+                continue
+            with self._lock:
+                row = self._db.execute('SELECT mtime FROM directories WHERE path = ?',
+                                       (directory,)).fetchone()
+                if row and row[0] == mtime:
+                    subdirectories = [path for path, in self._db.execute(
+                            'SELECT path FROM directories WHERE parent = ?', (directory,))]
+            if not row or row[0] != mtime:
+                subdirectories = self._scan_directory(source, directory, mtime)
+            else:
+                self._check_files(source, directory)
+            if self._max_depth is None or depth < self._max_depth:
+                pending += [(path, depth + 1) for path in subdirectories]
+        self._purge(source, visited, under=root if directory else None)
+        return self.images(source)
+
+    def _scan_directory(self, source: str, directory: str, mtime: int) -> typing.List[str]:
+        with self._lock:
+            known = {path: (size, modified)
+                     for path, size, modified
+                     in self._db.execute('SELECT path, size, mtime FROM images WHERE directory = ?',
+                                         (directory,))}
+
+        changed, subdirectories = [], []
+        try:
+            entries = list(scan_directory(directory, self._extensions, self._exclude))
+        except (FileNotFoundError, PermissionError, NotADirectoryError):
+            entries = []
+        for entry in entries:
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    subdirectories.append(entry.path)
+                    continue
+                # free on Windows, scandir already has it
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            image = (stat.st_size, stat.st_mtime_ns)
+            if known.pop(entry.path, None) == image:
+                continue
+            changed.append((entry.path, source, directory, *image, *read_dimensions(entry.path)))
+
+        with self._lock, self._db:
+            self._db.executemany('INSERT OR REPLACE INTO images VALUES (?, ?, ?, ?, ?, ?, ?)', changed)
+            self._db.executemany('DELETE FROM images WHERE path = ?', [(p,) for p in known])
+            self._db.executemany('INSERT OR IGNORE INTO directories VALUES (?, ?, ?, -1)',
+                                 [(path, source, directory) for path in subdirectories])
+            gone = set(path for path, in self._db.execute('SELECT path FROM directories WHERE parent = ?',
+                                                          (directory,)))
+            gone.difference_update(subdirectories)
+            self._db.executemany('DELETE FROM directories WHERE path = ?', [(p,) for p in gone])
+            self._db.executemany('DELETE FROM images WHERE directory = ?', [(p,) for p in gone])
+            self._db.execute('INSERT OR REPLACE INTO directories VALUES (?, ?, '
+                             '(SELECT parent FROM directories WHERE path = ?), ?)',
+                             (directory, source, directory, mtime))
+        if changed or known:
+            self.logger('INDEXED', directory, f'{len(changed)} changed, {len(known)} removed')
+        return subdirectories
+
+    def _check_files(self, source: str, directory: str):
+        """Reads the images of an unchanged `directory` again whose size or mtime changed"""
+        with self._lock:
+            known = self._db.execute('SELECT path, size, mtime FROM images WHERE directory = ?',
+                                     (directory,)).fetchall()
+        changed, removed = [], []
+        for path, size, modified in known:
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                removed.append((path,))
+                continue
+            if (stat.st_size, stat.st_mtime_ns) != (size, modified):
+                changed.append((path, source, directory, stat.st_size, stat.st_mtime_ns, *read_dimensions(path)))
+        if not changed and not removed:
+            return
+        with self._lock, self._db:
+            self._db.executemany('INSERT OR REPLACE INTO images VALUES (?, ?, ?, ?, ?, ?, ?)', changed)
+            self._db.executemany('DELETE FROM images WHERE path = ?', removed)
+        self.logger('INDEXED', directory, f'{len(changed)} changed, {len(removed)} removed')
+
+    def apply(self,
+              source: str,
+              added: typing.Iterable[str] = (),
+              removed: typing.Iterable[str] = (),
+              renamed: typing.Dict[str, str] = None):
+        """Updates the listing of `source` with known changes, without listing anything"""
+        rows = []
+        for path in added:
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            rows.append((path, source, os.path.dirname(path),
+                         stat.st_size, stat.st_mtime_ns, *read_dimensions(path)))
+        with self._lock, self._db:
+            self._db.executemany('INSERT OR REPLACE INTO images VALUES (?, ?, ?, ?, ?, ?, ?)', rows)
+            self._db.executemany('DELETE FROM images WHERE path = ?', [(p,) for p in removed])
+            self._db.executemany('UPDATE OR REPLACE images SET path = ?, directory = ? WHERE path = ?',
+                                 [(new, os.path.dirname(new), old) for old, new in (renamed or {}).items()])
+            # a renamed file keeps its mtime, so its features stay valid
+            self._db.executemany('UPDATE OR REPLACE features SET path = ? WHERE path = ?',
+                                 [(new, old) for old, new in (renamed or {}).items()])
+
+    def remove_directory(self, directory: str) -> typing.List[str]:
+        """Forgets `directory` and everything under it, returns the images that were in it"""
+        directory = str(Path(directory))
+        # paths under it sort between these two
+        start, end = directory + os.sep, directory + chr(ord(os.sep) + 1)
+        with self._lock, self._db:
+            images = [path for path, in self._db.execute('SELECT path FROM images WHERE path > ? AND path < ?',
+                                                          (start, end))]
+            self._db.execute('DELETE FROM images WHERE path > ? AND path < ?', (start, end))
+            self._db.execute('DELETE FROM directories WHERE path = ? OR path > ? AND path < ?',
+                             (directory, start, end))
+        return images
+
+    def _purge(self, source: str, visited: typing.Set[str], under: str = None):
+        """Forgets directories of `source`, or of its directory `under`, that are gone or no longer walked"""
+        with self._lock, self._db:
+            stale = [(path,) for path, in self._db.execute(
+                    'SELECT path FROM directories WHERE source = ?', (source,))
+                     if path not in visited and (not under or path.startswith(under + os.sep))]
+            self._db.executemany('DELETE FROM directories WHERE path = ?', stale)
+            self._db.executemany('DELETE FROM images WHERE directory = ?', stale)
@@ -1,10 +1,64 @@
+import contextlib
+import os
 import pathlib
+import threading
 import typing
+from concurrent.futures import CancelledError
+from functools import partial
 
-from wuzei.utils import windesktop
-from wuzei.utils.finder import find_images
+from wuzei.backends import Backend, get_backend
+from wuzei.utils.finder import is_image, iter_images
+from wuzei.utils.metrics import span
 from .blur import blur
-from .dispenser import Dispenser
+from .cache import RenderCache
+from .changes import ChangeSet
+from .compose import EACH, Monitor, compose, layout_hash
+from .dispenser import SHUFFLE_MODES, CompactDispenser, Dispenser, Interleaved, PermutedDispenser
+from .features import FILTERS, FeatureTable
+from .index import ImageIndex
+from .pool import RenderPool
+from .prefetch import Prefetcher
+from .render import Encoding, fit
+from .state import PLAYLIST_FILE, SESSION_FILE, Playlist, Session, load, save
+
+BLURRED = 'blurred'
+FITTED = 'fitted'
+# the source that plays every other one at once
+ALL_SOURCES = '*'
+# composed canvases cover the whole virtual desktop
+SPANNED_STYLE = 'span'
+# what a span is undone to when the user's own style isn't known
+FALLBACK_STYLE = 'fill'
+
+
+def blur_params(screen: typing.Tuple[int, int], engine: str, encoding: Encoding) -> dict:
+    """Arguments of `blur` for `screen`, which its render is cached by"""
+    long_side = max(screen)
+    return dict(radius=long_side // 10,
+                size=(long_side, long_side),
+                engine=engine,
+                encoding=encoding)
+
+
+def fit_params(screen: typing.Tuple[int, int], mode: str, encoding: Encoding) -> dict:
+    """Arguments of `fit` for `screen`, which its render is cached by"""
+    return dict(size=tuple(screen),
+                mode=mode,
+                encoding=encoding)
+
+
+def compose_params(monitors: typing.List[Monitor],
+                   mode: str,
+                   neighbors: typing.List[str],
+                   blur_engine: typing.Optional[str],
+                   encoding: Encoding) -> dict:
+    """What a canvas of an image and its `neighbors` on the other monitors is cached by"""
+    # the canvas is cached by layout, so reconnecting a dock reuses it
+    return dict(layout=layout_hash(monitors),
+                mode=mode,
+                images=[(path, os.stat(path).st_mtime_ns) for path in neighbors],
+                blur_engine=blur_engine,
+                encoding=encoding)
 
 
 class WallpaperManager:
@@ -13,6 +67,23 @@ class WallpaperManager:
                  cache_dir: str,
                  blurred: bool = True,
                  shuffled: bool = True,
+                 resume: bool = True,
+                 all_sources: str = None,
+                 shuffle_mode: str = 'eager',
+                 prefetch: int = 2,
+                 blur_engine: str = 'exact',
+                 cache_size: int = 0,
+                 recursive: bool = True,
+                 max_depth: int = None,
+                 exclude: typing.List[str] = None,
+                 fit_mode: str = None,
+                 compose_mode: str = None,
+                 encoding: Encoding = None,
+                 filters: typing.List[str] = None,
+                 feature_workers: int = None,
+                 render_workers: int = 2,
+                 backend: Backend = None,
+                 call: typing.Callable[[typing.Callable, str], typing.Any] = None,
                  logger=None):
         if not logger:
             logger = print
@@ -20,15 +91,74 @@ class WallpaperManager:
             raise ValueError('Specify at least one path')
 
         self.logger = logger
+        # `call(fn, triggered)` runs `fn` on the thread that changes playlists, background
+        # work only hands its results over through it. Runs `fn` right away unless set
+        self._call = call or (lambda fn, triggered: fn())
+        self._backend = backend or get_backend()
         self._cache_dir = cache_dir
         self._blurred = blurred
         self._shuffled = shuffled
         self._wallpaper: str = None
-        self._screen_geometry = windesktop.get_screen_size()
+        self._screen_geometry = self._backend.screen_size()
+        self._blur_engine = blur_engine
+        self._prefetch_depth = prefetch
+        # hand over originals unless set
+        self._fit_mode = fit_mode
+        # only the primary monitor is rendered for unless set
+        self._compose_mode = compose_mode
+        self._encoding = encoding or Encoding()
+        # names in features.FILTERS an image has to pass to be shown
+        self._filters = list(filters or [])
+        # processes computing image features, 0 skips them
+        self._feature_workers = feature_workers
+        self._features: typing.Dict[str, FeatureTable] = {}
+        self._cache = RenderCache(cache_dir,
+                                  max_size=cache_size,
+                                  logger=self.logger)
+        threading.Thread(target=self._cache.gc, daemon=True).start()
+        if shuffle_mode not in SHUFFLE_MODES:
+            raise ValueError(f'Unknown shuffle mode: {shuffle_mode}')
+        self._shuffle_mode = shuffle_mode
+        # how ALL_SOURCES interleaves sources, None leaves it out
+        self._all_sources = all_sources
+        self._walk_options = dict(recursive=recursive,
+                                  max_depth=max_depth,
+                                  exclude=exclude)
+        self._index = ImageIndex(pathlib.Path(cache_dir) / 'index.sqlite3',
+                                 logger=self.logger,
+                                 **self._walk_options)
+        # renders run in other processes, 0 renders on the calling thread
+        self._pool = RenderPool(workers=render_workers, logger=self.logger)
+        self._prefetcher = Prefetcher(render=self._render,
+                                      is_cached=self._is_rendered,
+                                      workers=render_workers,
+                                      logger=self.logger)
+        # bumped on every wallpaper request, a render finishing for an older one isn't applied
+        self._generation = 0
+        self._lock = threading.Lock()
+        # inside `deferred`, the last (image, variant) asked for
+        self._deferring = 0
+        self._deferred: typing.Optional[typing.Tuple[str, str]] = None
+        # whether the desktop spans canvases, None until it's asked, and the style it had before
+        self._spanned: typing.Optional[bool] = None
+        self._unspanned_style: typing.Optional[str] = None
+
+        # one playlist per source, so switching back resumes where it was left
+        self._playlists: typing.Dict[str, Dispenser] = {}
+        # changes to inactive sources, applied when they're switched to
+        self._pending: typing.Dict[str, ChangeSet] = {}
+        # inactive sources that were rescanned and need to be reconciled with the index
+        self._stale: typing.Set[str] = set()
 
+        self._session_path = pathlib.Path(cache_dir) / SESSION_FILE
+        self._playlist_path = pathlib.Path(cache_dir) / PLAYLIST_FILE
+
+        # real sources only, ALL_SOURCES is the step after the last one
         self.sources = Dispenser(paths)
-        self.images: Dispenser = None
-        self.source = self.sources.current
+        self.images: typing.Union[Dispenser, Interleaved] = None
+        self._source: str = None
+        if not (resume and self._resume()):
+            self.source = self.sources.current
 
     @property
     def wallpaper(self):
@@ -37,10 +167,8 @@ class WallpaperManager:
     @wallpaper.setter
     def wallpaper(self, image_path: str):
         self._wallpaper = image_path
-        if self._blurred:
-            self.blur(image_path)
-        else:
-            self._set_wallpaper(image_path)
+        self._show(image_path, BLURRED if self._blurred else FITTED)
+        self._prefetch()
 
     @property
     def source(self):
@@ -48,33 +176,342 @@ class WallpaperManager:
 
     @source.setter
     def source(self, path: str):
-        self._source = path
-        self.images = Dispenser(find_images(path),
-                                shuffled=self._shuffled)
+        # the source only changes once its playlist is there, a source without images leaves it be
+        if path == ALL_SOURCES:
+            images = Interleaved([self._playlist(p) for p in self._real_sources()], mode=self._all_sources)
+        else:
+            images = self._playlist(path)
+        self._source, self.images = path, images
+        if path == ALL_SOURCES and self._shuffled:
+            self.wallpaper = self.images.random()
+        else:
+            self.wallpaper = self.images.current
+
+    def _real_sources(self) -> typing.List[str]:
+        return list(self.sources.things)
+
+    def _is_active(self, path: str) -> bool:
+        """Whether `path` is the source playing, or one of them"""
+        return path == self._source or (self._source == ALL_SOURCES and path in self._playlists)
+
+    def _playlist(self, path: str) -> Dispenser:
+        """
+        The playlist of `path`, caught up, filtered and ordered like the rest.
+        A new one starts on a random or the first visible image, and its
+        source is walked in the background.
+        """
+        images = self._playlists.get(path)
+        if images:
+            self._reconcile(path, images)
+            if self._shuffled and not images.shuffled:
+                images.shuffle()
+            elif images.shuffled and not self._shuffled:
+                images.unshuffle()
+            self._apply_filters(path, images)
+            return images
+
+        with span('index'):
+            if self._index.is_indexed(path):
+                listing = self._index.images(path)
+            else:
+                # show the first image found while the rest of the source is walked
+                first = next(iter_images(path, **self._walk_options), None)
+                if not first:
+                    raise FileNotFoundError(f'No images in {path}')
+                listing = [first]
+        if self._shuffle_mode == 'lazy':
+            images = PermutedDispenser(listing, shuffled=self._shuffled)
+        else:
+            images = CompactDispenser(listing, shuffled=self._shuffled)
+        self._playlists[path] = images
+        self._apply_filters(path, images)
         if self._shuffled:
-            image = self.images.random()
+            images.random()
+        elif images.is_hidden(images.current):
+            images + 1
+        threading.Thread(target=self.sync, args=(path,), daemon=True).start()
+        return images
+
+    def _resume(self) -> bool:
+        """
+        Sets the last session's wallpaper again without scanning, and checks its
+        source in the background. False if there's nothing to resume.
+        """
+        session = load(self._session_path, Session)
+        if not session or session.source not in self.sources or not os.path.exists(session.wallpaper):
+            return False
+        playlist = load(self._playlist_path, Playlist)
+        # the playlist is saved on close, reshuffle and sync, not on every switch
+        if playlist and playlist.source != session.source:
+            playlist = None
+        try:
+            if playlist and playlist.seed is None:
+                images = CompactDispenser.restore(playlist.order, session.wallpaper, shuffled=session.shuffled)
+            elif self._index.is_indexed(session.source):
+                # the seed only makes the same order out of the same listing, without one it's a new order
+                listing = self._index.images(session.source)
+                if self._shuffle_mode == 'lazy':
+                    images = PermutedDispenser.restore(listing, session.wallpaper, shuffled=session.shuffled,
+                                                       seed=playlist.seed if playlist else None)
+                else:
+                    images = CompactDispenser(listing, shuffled=session.shuffled)
+                    images.seek(session.wallpaper)
+            else:
+                return False
+        except ValueError:
+            return False
+        self.sources.seek(session.source)
+        self._source = session.source
+        self._blurred = session.blurred
+        self._shuffled = session.shuffled
+        self.images = self._playlists[session.source] = images
+        self._wallpaper = session.wallpaper
+        job = (session.wallpaper, BLURRED if self._blurred else FITTED)
+        # what was set last may have been rendered for another screen, layout or settings
+        rendered = self._current_render(job)
+        if rendered:
+            with self._lock:
+                self._set_wallpaper(rendered)
         else:
-            image = self.images.current
-        self.wallpaper = image
+            self._show(*job)
+        self.logger('RESUMED', session.source, session.wallpaper)
+        threading.Thread(target=self._revalidate, args=(session.source,), daemon=True).start()
+        return True
+
+    def _revalidate(self, path: str):
+        """Catches a resumed playlist up with its source and warms the cache around it"""
+        self._call(partial(self._apply_filters, path, self.images), 'resume')
+        self._call(self._prefetch, 'resume')
+        self.sync(path)
+
+    def _save_session(self, rendered: str):
+        try:
+            save(self._session_path, Session(self._source, self._wallpaper, rendered, self._blurred, self._shuffled))
+        except OSError as e:
+            self.logger('SESSION NOT SAVED', e)
+
+    def _save_playlist(self):
+        # a merged playlist is only its members' positions, it's started afresh
+        if not self.images or self._source == ALL_SOURCES:
+            return
+        try:
+            if isinstance(self.images, PermutedDispenser):
+                playlist = Playlist(self._source, self.images.shuffled, [], seed=self.images.seed)
+            else:
+                playlist = Playlist(self._source, self.images.shuffled, list(self.images))
+            save(self._playlist_path, playlist)
+        except OSError as e:
+            self.logger('PLAYLIST NOT SAVED', e)
+
+    def _reconcile(self, path: str, images: Dispenser):
+        """Catches up a playlist with what happened while its source was inactive"""
+        if path in self._stale:
+            self._stale.discard(path)
+            self._pending.pop(path, None)
+            images.update(self._index.images(path), ordered=True)
+            return
+        changes = self._pending.pop(path, None)
+        if changes:
+            images.remove(changes.removed)
+            images.add(changes.added)
+            for old, new in changes.renamed.items():
+                images.rename(old, new)
 
     def sync(self, path: str):
-        # prevent unnecessary syncs for inactive sources
-        if self._source != path:
-            return self.logger('WONT SYNC', path)
-        self.images.things = find_images(path)
-        self.logger('SYNCED', self._source)
+        """Rescans `path` on the calling thread, the playlist is caught up through `call`"""
+        listing = self._index.scan(path)
+        self._call(partial(self._synced, path, listing), 'sync')
+        if self._filters:
+            self.update_features(path)
+
+    def _synced(self, path: str, listing: typing.List[str]):
+        if path not in self.sources:
+            # removed while it was scanned
+            return
+        self._features.pop(path, None)
+        if not self._is_active(path):
+            # reconcile lazily, when it's switched to
+            self._stale.add(path)
+            self.logger('SYNCED INACTIVE', path)
+        else:
+            self._playlists[path].update(listing, ordered=True)
+            self._save_playlist()
+            self.logger('SYNCED', path)
+
+    def update_features(self, path: str):
+        """
+        Computes the features filters need for images of `path` that don't have
+        them yet on the calling thread, they're applied through `call`.
+        """
+        if self._feature_workers == 0:
+            return
+        computed = self._index.update_features(path, workers=self._feature_workers)
+        if not computed:
+            return
+        self.logger('FEATURES', path, f'{computed} computed')
+        self._call(partial(self._features_updated, path), 'features')
+
+    def _compute_features(self, paths: typing.List[str]):
+        for path in paths:
+            self.update_features(path)
+
+    def _features_updated(self, path: str):
+        self._features.pop(path, None)
+        if self._is_active(path) and path in self._playlists:
+            self._apply_filters(path, self._playlists[path])
+
+    @property
+    def filters(self) -> typing.List[str]:
+        return self._filters
+
+    @filters.setter
+    def filters(self, filters: typing.List[str]):
+        unknown = [name for name in filters if name not in FILTERS]
+        if unknown:
+            raise ValueError(f'Unknown filters: {", ".join(unknown)}')
+        if list(filters) == self._filters:
+            return
+        if filters and not self._filters:
+            # features are only kept up to date while something filters by them
+            threading.Thread(target=self._compute_features, args=(self._real_sources(),), daemon=True).start()
+        self._filters = list(filters)
+        for path, images in list(self._playlists.items()):
+            if self._is_active(path):
+                self._apply_filters(path, images)
+        self.logger('FILTERS', self._filters)
+
+    def _apply_filters(self, path: str, images: Dispenser):
+        if not self._filters:
+            images.filter(None)
+            return
+        table = self._features.get(path)
+        if table is None:
+            table = self._features[path] = self._index.features(path)
+        if not images.filter(table.predicate(self._filters)):
+            self.logger('FILTERS', 'no image passes', path, self._filters)
+
+    def apply_changes(self, source: str, changes: ChangeSet):
+        """
+        Applies file system changes in `source` to its listing without rescanning it.
+        Changes playlists, so it runs where `call` runs things.
+        """
+        if source not in self.sources:
+            return
+
+        def wanted(path: str) -> bool:
+            return is_image(path, source, **self._walk_options)
+
+        added = [path for path in changes.added if wanted(path)]
+        removed = list(changes.removed)
+        renamed = {}
+        # directories moved in are walked in the background
+        directories = [path for path in changes.added if os.path.isdir(path)]
+        for old, new in changes.renamed.items():
+            if wanted(new) and wanted(old):
+                renamed[old] = new
+            elif wanted(new):
+                added.append(new)
+            else:
+                removed.append(old)
+                if os.path.isdir(new):
+                    directories.append(new)
+        # anything else gone may have been a directory, what was in it goes with it
+        for path in [path for path in removed if not wanted(path)]:
+            removed += self._index.remove_directory(path)
+
+        self._index.apply(source, added, removed, renamed)
+        self._features.pop(source, None)
+        if self._is_active(source):
+            images = self._playlists[source]
+            images.remove(removed)
+            images.add(added)
+            for old, new in renamed.items():
+                images.rename(old, new)
+        elif source in self._playlists:
+            pending = self._pending.setdefault(source, ChangeSet())
+            for path in removed:
+                pending.remove(path)
+            for path in added:
+                pending.add(path)
+            for old, new in renamed.items():
+                pending.rename(old, new)
+        self.logger('SYNCED', source, f'+{len(added)} -{len(removed)} ~{len(renamed)}')
+        if directories:
+            threading.Thread(target=self._scan_directories, args=(source, directories), daemon=True).start()
+        elif added and self._filters:
+            threading.Thread(target=self.update_features, args=(source,), daemon=True).start()
+
+    def _scan_directories(self, source: str, directories: typing.List[str]):
+        """Indexes directories moved into `source` on the calling thread, caught up like `sync`"""
+        for directory in directories:
+            self._index.scan(source, directory)
+        self._call(partial(self._synced, source, self._index.images(source)), 'sync')
+        if self._filters:
+            self.update_features(source)
+
+    def add_source(self, path: str):
+        """Adds a source and indexes it in the background, it's walked no further until switched to"""
+        if path in self.sources:
+            return
+        self.sources.add([path])
+        if self._source == ALL_SOURCES:
+            # joins the merged playlist right away, walked in the background
+            try:
+                self.images.members = self.images.members + [self._playlist(path)]
+            except Exception:
+                self.sources.remove([path])
+                raise
+        else:
+            threading.Thread(target=self.sync, args=(path,), daemon=True).start()
+        self.logger('SOURCE ADDED', path)
+
+    def remove_source(self, path: str):
+        """Drops a source, if it's the active one the next source is switched to first"""
+        if path not in self.sources:
+            return
+        if len(self._real_sources()) == 1:
+            raise ValueError('Cannot remove the only source')
+        if path == self._source:
+            try:
+                self.source = self.sources + 1
+            except FileNotFoundError as e:
+                self.sources.seek(path)
+                raise ValueError(f'Cannot switch away from it: {e}')
+        self.sources.remove([path])
+        images = self._playlists.pop(path, None)
+        if self._source == ALL_SOURCES and images:
+            self.images.members = [member for member in self.images.members if member is not images]
+        self._pending.pop(path, None)
+        self._stale.discard(path)
+        self._features.pop(path, None)
+        self.logger('SOURCE REMOVED', path)
 
     def next_source(self):
-        self.source = self.sources + 1
+        self.switch(1)
 
     def prev_source(self):
-        self.source = self.sources - 1
+        self.switch(-1)
+
+    def switch(self, delta: int):
+        """Moves `delta` sources forward, or back if negative"""
+        if not self._all_sources:
+            self.source = self.sources + delta
+            return
+        # sources are cycled through sorted, with all of them at once after the last
+        things = self.sources.things
+        at = len(things) if self._source == ALL_SOURCES else things.index(self.sources.current)
+        to = (at + delta) % (len(things) + 1)
+        self.source = ALL_SOURCES if to == len(things) else self.sources.seek(things[to])
 
     def next_wallpaper(self):
-        self.wallpaper = self.images + 1
+        self.move(1)
 
     def prev_wallpaper(self):
-        self.wallpaper = self.images - 1
+        self.move(-1)
+
+    def move(self, delta: int):
+        """Moves `delta` wallpapers forward, or back if negative, and renders only the last"""
+        self.wallpaper = self.images + delta
 
     def toggle_shuffle(self):
         if self._shuffled:
@@ -82,22 +519,17 @@ class WallpaperManager:
         else:
             self.images.shuffle()
         self._shuffled = not self._shuffled
+        self._save_playlist()
 
     def blur(self, image_path: str = None):
         if not image_path:
             image_path = self._wallpaper
-        long_side = max(self._screen_geometry)
-        blurred_image = blur(image_path,
-                             radius=long_side // 10,
-                             size=(long_side, long_side),
-                             save_dir=self._cache_dir,
-                             use_cache=True)
-        self._set_wallpaper(str(blurred_image))
         self._blurred = True
+        self._show(image_path, BLURRED)
 
     def unblur(self):
         self._blurred = False
-        self._set_wallpaper(self._wallpaper)
+        self._show(self._wallpaper, FITTED)
 
     def toggle_blur(self):
         if self._blurred:
@@ -105,10 +537,174 @@ class WallpaperManager:
         else:
             self.blur()
 
+    @contextlib.contextmanager
+    def deferred(self):
+        """
+        Holds off rendering until the block ends, then shows only the last
+        wallpaper asked for, so a burst of actions costs a single render.
+        """
+        self._deferring += 1
+        try:
+            yield
+        finally:
+            self._deferring -= 1
+            if not self._deferring and self._deferred:
+                job, self._deferred = self._deferred, None
+                self._show(*job)
+                self._prefetch()
+
+    def _show(self, image_path: str, variant: str):
+        """
+        Renders `image_path` as `variant` and sets it as the wallpaper,
+        unless another one was asked for while it rendered.
+        """
+        if self._deferring:
+            self._deferred = (image_path, variant)
+            return
+        with self._lock:
+            self._generation += 1
+            generation = self._generation
+        job = (image_path, variant)
+        try:
+            if variant == FITTED and not self._renders_unblurred():
+                rendered = image_path
+            else:
+                # it may be waiting behind prefetches
+                self._pool.promote(job)
+                rendered = str(self._prefetcher.fetch(job))
+                self.logger('CACHE', self._prefetcher.stats)
+        except CancelledError:
+            return self.logger('SUPERSEDED', job)
+        with self._lock:
+            if generation != self._generation:
+                return self.logger('SUPERSEDED', job)
+            self._set_wallpaper(rendered)
+
+    def _renders_unblurred(self) -> bool:
+        return bool(self._fit_mode or self._layout())
+
+    def _layout(self) -> typing.List[Monitor]:
+        """Monitors to compose a canvas for, empty if only the primary one is rendered for"""
+        if not self._compose_mode:
+            return []
+        monitors = [Monitor(*m) for m in self._backend.monitors()]
+        if len(monitors) < 2:
+            return []
+        return monitors
+
+    @property
+    def _blur_params(self) -> dict:
+        return blur_params(self._screen_geometry, self._blur_engine, self._encoding)
+
+    @property
+    def _fit_params(self) -> dict:
+        return fit_params(self._screen_geometry, self._fit_mode, self._encoding)
+
+    def _compose_job(self, image_path: str, variant: str, monitors: typing.List[Monitor]):
+        images = [image_path]
+        if self._compose_mode == EACH:
+            try:
+                images += [self.images.after(image_path, i) for i in range(1, len(monitors))]
+            except ValueError:
+                pass
+        blur_engine = self._blur_engine if variant == BLURRED else None
+        return images, compose_params(monitors, self._compose_mode, images[1:], blur_engine, self._encoding)
+
+    def _render(self, job: typing.Tuple[str, str], urgent: bool = True) -> pathlib.Path:
+        image_path, variant = job
+
+        def in_pool(fn: typing.Callable, *args, **kwargs) -> typing.Callable[[pathlib.Path], typing.Any]:
+            """Cache callback that runs `fn(*args, destination, **kwargs)` in the render pool"""
+            return lambda destination: self._pool.submit(fn, *args, destination,
+                                                         tag=job, urgent=urgent, **kwargs).result()
+
+        monitors = self._layout()
+        if monitors:
+            images, params = self._compose_job(image_path, variant, monitors)
+            render = in_pool(compose, images, monitors,
+                             mode=self._compose_mode,
+                             blur_engine=params['blur_engine'],
+                             encoding=self._encoding)
+            return self._cache.fetch(image_path, render, self._encoding.extension, **params)
+        if variant == FITTED:
+            params = self._fit_params
+            return self._cache.fetch(image_path, in_pool(fit, image_path, **params),
+                                     self._encoding.extension, **params)
+        params = self._blur_params
+        return self._cache.fetch(image_path, in_pool(blur, image_path, **params),
+                                 self._encoding.extension, **params)
+
+    def _current_render(self, job: typing.Tuple[str, str]) -> typing.Optional[str]:
+        """What `job` shows with the current screen and settings without rendering, None if it isn't cached"""
+        image_path, variant = job
+        if variant == FITTED and not self._renders_unblurred():
+            return image_path if os.path.exists(image_path) else None
+        try:
+            monitors = self._layout()
+            if monitors:
+                _, params = self._compose_job(image_path, variant, monitors)
+            elif variant == FITTED:
+                params = self._fit_params
+            else:
+                params = self._blur_params
+            rendered = self._cache.get(image_path, **params)
+        except FileNotFoundError:
+            return None
+        return str(rendered) if rendered else None
+
+    def _is_rendered(self, job: typing.Tuple[str, str]) -> bool:
+        image_path, variant = job
+        monitors = self._layout()
+        if monitors:
+            _, params = self._compose_job(image_path, variant, monitors)
+            return self._cache.contains(image_path, **params)
+        if variant == FITTED:
+            return self._cache.contains(image_path, **self._fit_params)
+        return self._cache.contains(image_path, **self._blur_params)
+
+    def _prefetch(self):
+        """
+        Queues the current wallpaper and its neighbors for rendering,
+        so that blurring, locking and moving around hit the cache.
+        """
+        if self._prefetch_depth <= 0 or self._deferring:
+            return
+        renders_unblurred = self._renders_unblurred()
+        upcoming = [(self._wallpaper, BLURRED)]
+        if renders_unblurred:
+            upcoming.append((self._wallpaper, FITTED))
+        variant = BLURRED if self._blurred else FITTED
+        if variant == BLURRED or renders_unblurred:
+            for delta in range(1, self._prefetch_depth + 1):
+                upcoming += [(self.images.peek(delta), variant),
+                             (self.images.peek(-delta), variant)]
+        self._prefetcher.schedule(upcoming)
+        # renders of wallpapers that were skipped past are dropped before they start
+        wanted = set(upcoming)
+        self._pool.discard(keep=lambda job: job in wanted)
+
+    def close(self):
+        self._pool.shutdown()
+        self._cache.flush()
+        self._save_playlist()
+
     def _set_wallpaper(self, image_path: str = ''):
         if not image_path:
             image_path = self.wallpaper
         if not pathlib.Path(image_path).exists():
             raise FileNotFoundError(image_path)
         self.logger('WP', image_path)
-        windesktop.change_wallpaper(image_path, True)
+        # the user's style is left alone unless canvases are shown, and put back after
+        style = None
+        if self._spanned is None:
+            # a run that ended while canvases were shown leaves the desktop spanned
+            self._spanned = self._backend.wallpaper_style() == SPANNED_STYLE
+        if self._layout():
+            if not self._spanned:
+                self._unspanned_style, self._spanned = self._backend.wallpaper_style(), True
+            style = SPANNED_STYLE
+        elif self._spanned:
+            style, self._spanned = self._unspanned_style or FALLBACK_STYLE, False
+        with span('apply'):
+            self._backend.change_wallpaper(image_path, style=style)
+        self._save_session(image_path)
@@ -0,0 +1,144 @@
+import typing
+from array import array
+from bisect import bisect_left
+
+# file names can hold lone surrogates on windows
+ERRORS = 'surrogatepass'
+# changes of up to this many paths shift the sorted array in place, more rebuild it in one pass
+IN_PLACE = 16
+
+
+def _split(path: str) -> typing.Tuple[str, str]:
+    """(directory with its trailing separator, file name)"""
+    cut = max(path.rfind('/'), path.rfind('\\')) + 1
+    return path[:cut], path[cut:]
+
+
+class PathList:
+    """
+    A sorted sequence of paths packed tightly. Each directory is stored
+    once, file names are encoded back to back in one buffer, and every
+    path is a slot holding a directory number and an offset into it, in
+    `array`s. Paths are rebuilt as `str` when they're read.
+
+    A path keeps its slot until it's removed, so others can refer to paths
+    by slot while the list changes. The sorted order is an array of slots,
+    searched with `bisect` like a list. Removed paths leave dead slots
+    behind until `compact` drops them.
+    """
+
+    def __init__(self, paths: typing.Iterable[str] = ()):
+        """`paths` are sorted and distinct, their slots are their indices"""
+        self._dirs: typing.List[str] = []
+        self._dir_ids: typing.Dict[str, int] = {}
+        self._parents = array('I')
+        # the name in slot s is _names[_offsets[s]:_offsets[s + 1]]
+        self._offsets = array('I', [0])
+        self._names = bytearray()
+        self._sorted = array('I')
+        self._dead = 0
+        for path in paths:
+            self._sorted.append(self._store(path))
+
+    def _store(self, path: str) -> int:
+        directory, name = _split(path)
+        parent = self._dir_ids.get(directory)
+        if parent is None:
+            parent = self._dir_ids[directory] = len(self._dirs)
+            self._dirs.append(directory)
+        self._parents.append(parent)
+        self._names += name.encode('utf-8', ERRORS)
+        self._offsets.append(len(self._names))
+        return len(self._parents) - 1
+
+    def __len__(self):
+        return len(self._sorted)
+
+    def __getitem__(self, i: int) -> str:
+        return self.path(self._sorted[i])
+
+    def __iter__(self) -> typing.Iterator[str]:
+        dirs, parents, offsets, names = self._dirs, self._parents, self._offsets, self._names
+        for slot in self._sorted:
+            yield dirs[parents[slot]] + names[offsets[slot]:offsets[slot + 1]].decode('utf-8', ERRORS)
+
+    def path(self, slot: int) -> str:
+        name = self._names[self._offsets[slot]:self._offsets[slot + 1]]
+        return self._dirs[self._parents[slot]] + name.decode('utf-8', ERRORS)
+
+    def slot(self, i: int) -> int:
+        """Slot of the `i`th path"""
+        return self._sorted[i]
+
+    def sorted_slots(self) -> array:
+        """Slots of the paths in sorted order, a copy"""
+        return array('I', self._sorted)
+
+    @property
+    def slots(self) -> int:
+        """Slots taken, dead ones included"""
+        return len(self._parents)
+
+    @property
+    def dead(self) -> int:
+        return self._dead
+
+    def index(self, path: str) -> typing.Optional[int]:
+        """Where `path` is in sorted order, None if it isn't here"""
+        i = bisect_left(self, path)
+        if i < len(self._sorted) and self[i] == path:
+            return i
+        return None
+
+    def insert(self, paths: typing.Sequence[str]) -> typing.List[int]:
+        """Adds sorted `paths` that aren't here yet, returns their slots"""
+        if len(paths) <= IN_PLACE:
+            slots = []
+            for path in paths:
+                i = bisect_left(self, path)
+                slots.append(self._store(path))
+                self._sorted.insert(i, slots[-1])
+            return slots
+        points = [bisect_left(self, path) for path in paths]
+        slots = [self._store(path) for path in paths]
+        merged = array('I')
+        start = 0
+        for point, slot in zip(points, slots):
+            merged += self._sorted[start:point]
+            merged.append(slot)
+            start = point
+        merged += self._sorted[start:]
+        self._sorted = merged
+        return slots
+
+    def remove(self, indices: typing.Sequence[int]) -> typing.List[int]:
+        """Removes the paths at sorted, distinct `indices`, returns the slots they leave dead"""
+        slots = [self._sorted[i] for i in indices]
+        if len(indices) <= IN_PLACE:
+            for i in reversed(indices):
+                del self._sorted[i]
+        else:
+            kept = array('I')
+            start = 0
+            for i in indices:
+                kept += self._sorted[start:i]
+                start = i + 1
+            kept += self._sorted[start:]
+            self._sorted = kept
+        self._dead += len(slots)
+        return slots
+
+    def compact(self) -> array:
+        """
+        Drops the dead slots and directories no path is in anymore,
+        numbering slots in sorted order again. Returns the new slot of
+        every old one, dead ones map to 0.
+        """
+        remap = array('I', [0]) * len(self._parents)
+        for new, slot in enumerate(self._sorted):
+            remap[slot] = new
+        packed = PathList(iter(self))
+        self._dirs, self._dir_ids = packed._dirs, packed._dir_ids
+        self._parents, self._offsets, self._names = packed._parents, packed._offsets, packed._names
+        self._sorted, self._dead = packed._sorted, 0
+        return remap
@@ -0,0 +1,71 @@
+import random
+import typing
+
+ROUNDS = 4
+_MASK64 = (1 << 64) - 1
+
+
+def _mix(x: int) -> int:
+    """splitmix64's finalizer, scrambles every bit of `x` into every other"""
+    x = (x ^ (x >> 30)) * 0xbf58476d1ce4e5b9 & _MASK64
+    x = (x ^ (x >> 27)) * 0x94d049bb133111eb & _MASK64
+    return x ^ (x >> 31)
+
+
+class Permutation:
+    """
+    A pseudo-random order of range(`size`) that's computed instead of
+    stored: a Feistel network over the fewest even number of bits that fit
+    `size`, applied again until it lands inside the range (cycle walking).
+    It's a bijection, so both directions take constant expected time
+    and the whole order is just `size` and `seed`.
+    """
+
+    def __init__(self, size: int, seed: int = None):
+        self.size = size
+        self.seed = random.getrandbits(63) if seed is None else seed
+        bits = max(2, (size - 1).bit_length())
+        self._half = (bits + 1) // 2
+        self._mask = (1 << self._half) - 1
+        self._keys = [_mix(self.seed * ROUNDS + r) for r in range(ROUNDS)]
+
+    def _encrypt(self, x: int) -> int:
+        left, right = x >> self._half, x & self._mask
+        for key in self._keys:
+            left, right = right, left ^ (_mix(key ^ right) & self._mask)
+        return (left << self._half) | right
+
+    def _decrypt(self, x: int) -> int:
+        left, right = x >> self._half, x & self._mask
+        for key in reversed(self._keys):
+            left, right = right ^ (_mix(key ^ left) & self._mask), left
+        return (left << self._half) | right
+
+    def __getitem__(self, i: int) -> int:
+        """What's `i`th in this order"""
+        if not 0 <= i < self.size:
+            raise IndexError(i)
+        x = self._encrypt(i)
+        # the domain is at most 4 times the size, so this takes few rounds
+        while x >= self.size:
+            x = self._encrypt(x)
+        return x
+
+    def index(self, value: int) -> int:
+        """Where `value` is in this order"""
+        if not 0 <= value < self.size:
+            raise ValueError(f'{value} is not in permutation')
+        x = self._decrypt(value)
+        while x >= self.size:
+            x = self._decrypt(x)
+        return x
+
+    def resized(self, size: int) -> 'Permutation':
+        """The same seed over another size, a different order altogether"""
+        return Permutation(size, self.seed)
+
+    def __len__(self):
+        return self.size
+
+    def __iter__(self) -> typing.Iterator[int]:
+        return (self[i] for i in range(self.size))
@@ -0,0 +1,148 @@
+import collections
+import threading
+import typing
+from concurrent.futures import Future, ProcessPoolExecutor
+
+from wuzei.utils.metrics import metrics, trigger, triggered_by
+
+
+def _run_task(fn: typing.Callable, args: tuple, kwargs: dict, triggered: str):
+    """Runs in a worker, sends the spans it recorded back with the result"""
+    metrics.take()
+    with triggered_by(triggered):
+        result = fn(*args, **kwargs)
+    return result, metrics.take()
+
+
+class _Task(typing.NamedTuple):
+    future: Future
+    fn: typing.Callable
+    args: tuple
+    kwargs: dict
+    tag: typing.Hashable
+    urgent: bool
+    triggered: str
+
+
+class RenderPool:
+    """
+    Runs renders in worker processes, so decoding and blurring neither hold
+    the GIL nor stall the threads that handle input.
+
+    Only as many tasks as there are workers are handed to the processes,
+    the rest wait here, where urgent ones jump the queue and the ones that
+    are no longer wanted can still be cancelled. At most `max_pending`
+    tasks wait, beyond that the oldest background ones are dropped.
+    With 0 workers, tasks run right away in the calling thread.
+    """
+
+    def __init__(self, workers: int = 2, max_pending: int = 16, logger=None):
+        if not logger:
+            logger = print
+        self.logger = logger
+        self.workers = workers
+        self._max_pending = max_pending
+        self._executor: ProcessPoolExecutor = None
+        self._pending: typing.Deque[_Task] = collections.deque()
+        self._running = 0
+        # done callbacks can run right away, inside _dispatch
+        self._lock = threading.RLock()
+
+    def submit(self,
+               fn: typing.Callable,
+               *args,
+               tag: typing.Hashable = None,
+               urgent: bool = False,
+               **kwargs) -> Future:
+        """Queues `fn(*args, **kwargs)`, `tag` is what `discard` decides on"""
+        future = Future()
+        task = _Task(future, fn, args, kwargs, tag, urgent, trigger.get())
+        if self.workers <= 0:
+            self._run_inline(task)
+            return future
+        with self._lock:
+            if urgent:
+                self._pending.appendleft(task)
+            else:
+                self._pending.append(task)
+            self._trim()
+        self._dispatch()
+        return future
+
+    def run(self, fn: typing.Callable, *args, tag: typing.Hashable = None, **kwargs):
+        """Runs `fn` ahead of everything queued and waits for it"""
+        return self.submit(fn, *args, tag=tag, urgent=True, **kwargs).result()
+
+    def promote(self, tag: typing.Hashable):
+        """Moves queued tasks tagged `tag` to the front, someone is waiting for them now"""
+        with self._lock:
+            promoted = [t for t in self._pending if t.tag == tag]
+            for task in promoted:
+                self._pending.remove(task)
+            self._pending.extendleft(reversed([t._replace(urgent=True) for t in promoted]))
+
+    def discard(self, keep: typing.Callable[[typing.Hashable], bool]):
+        """Cancels queued tasks whose tag `keep` rejects, their callers get CancelledError"""
+        with self._lock:
+            wanted = collections.deque()
+            for task in self._pending:
+                if keep(task.tag):
+                    wanted.append(task)
+                else:
+                    task.future.cancel()
+            self._pending = wanted
+
+    def shutdown(self):
+        with self._lock:
+            for task in self._pending:
+                task.future.cancel()
+            self._pending.clear()
+            executor, self._executor = self._executor, None
+        if executor:
+            executor.shutdown(wait=False)
+
+    def _trim(self):
+        while len(self._pending) > self._max_pending:
+            background = next((t for t in self._pending if not t.urgent), None)
+            if not background:
+                return
+            self._pending.remove(background)
+            background.future.cancel()
+
+    def _dispatch(self):
+        with self._lock:
+            while self._pending and self._running < self.workers:
+                task = self._pending.popleft()
+                if not task.future.set_running_or_notify_cancel():
+                    continue
+                if not self._executor:
+                    self._executor = ProcessPoolExecutor(max_workers=self.workers)
+                try:
+                    submitted = self._executor.submit(_run_task, task.fn, task.args, task.kwargs, task.triggered)
+                except RuntimeError as e:
+                    # a worker died and took the pool with it, start a new one next time
+                    self._executor = None
+                    task.future.set_exception(e)
+                    continue
+                self._running += 1
+                submitted.add_done_callback(lambda done, task=task: self._finish(task, done))
+
+    def _finish(self, task: _Task, done: Future):
+        with self._lock:
+            self._running -= 1
+        try:
+            result, recorded = done.result()
+        except Exception as e:
+            task.future.set_exception(e)
+        else:
+            metrics.merge(recorded)
+            task.future.set_result(result)
+        self._dispatch()
+
+    @staticmethod
+    def _run_inline(task: _Task):
+        task.future.set_running_or_notify_cancel()
+        try:
+            task.future.set_result(task.fn(*task.args, **task.kwargs))
+        except Exception as e:
+            task.future.set_exception(e)
@@ -0,0 +1,101 @@
+import threading
+import typing
+from concurrent.futures import CancelledError
+from pathlib import Path
+
+from wuzei.utils.metrics import metrics, span, trigger
+
+
+class Prefetcher:
+    """
+    Renders images in background threads, so that by the time they're needed
+    they're already in the cache. Jobs are whatever `render` accepts,
+    as long as they're hashable. `render` is told whether someone is waiting
+    for the job, and with as many `workers` as render processes, every one
+    of them is kept busy.
+    """
+
+    def __init__(self,
+                 render: typing.Callable[[typing.Hashable, bool], Path],
+                 is_cached: typing.Callable[[typing.Hashable], bool],
+                 workers: int = 1,
+                 logger=None):
+        if not logger:
+            logger = print
+        self.logger = logger
+        self._render = render
+        self._is_cached = is_cached
+
+        self.hits = 0
+        self.misses = 0
+
+        self._pending: typing.List[typing.Hashable] = []
+        # jobs that are being rendered right now, by either side
+        self._busy: typing.Set[typing.Hashable] = set()
+        self._condition = threading.Condition()
+
+        self._threads = [threading.Thread(target=self._work, name=f'prefetch-{i}', daemon=True)
+                         for i in range(max(1, workers))]
+        for thread in self._threads:
+            thread.start()
+
+    def schedule(self, jobs: typing.Iterable[typing.Hashable]):
+        """Replaces the pending queue, earlier jobs are rendered first"""
+        with self._condition:
+            self._pending = list(dict.fromkeys(jobs))
+            self._condition.notify_all()
+
+    def fetch(self, job: typing.Hashable) -> Path:
+        """Returns the render for `job`, rendering it now if it's not cached yet"""
+        with self._condition:
+            # wait for the background render instead of doing the same work twice
+            while job in self._busy:
+                self._condition.wait()
+            cached = self._is_cached(job)
+            if cached:
+                self.hits += 1
+            else:
+                self.misses += 1
+            self._busy.add(job)
+        result = 'hit' if cached else 'miss'
+        metrics.increment('render_cache', result=result)
+        try:
+            with span(f'cache_{result}'):
+                return self._render(job, True)
+        finally:
+            self._release(job)
+
+    @property
+    def stats(self) -> dict:
+        return dict(hits=self.hits, misses=self.misses)
+
+    def _release(self, job: typing.Hashable):
+        with self._condition:
+            self._busy.discard(job)
+            self._condition.notify_all()
+
+    def _next_pending(self) -> typing.Hashable:
+        with self._condition:
+            while True:
+                while self._pending:
+                    job = self._pending.pop(0)
+                    if job in self._busy:
+                        continue
+                    self._busy.add(job)
+                    return job
+                self._condition.wait()
+
+    def _work(self):
+        trigger.set('prefetch')
+        while True:
+            job = self._next_pending()
+            try:
+                if not self._is_cached(job):
+                    self._render(job, False)
+                    self.logger('PREFETCHED', job)
+            except CancelledError:
+                self.logger('PREFETCH CANCELLED', job)
+            except Exception as e:
+                self.logger('PREFETCH FAILED', job, e)
+            finally:
+                self._release(job)
@@ -0,0 +1,127 @@
+import math
+import os
+import typing
+from pathlib import Path
+
+from PIL import Image
+
+from wuzei.utils.metrics import span
+
+FIT_MODES = ('cover', 'contain')
+# formats the desktop accepts as a wallpaper
+OUTPUT_FORMATS = ('jpeg', 'png', 'bmp')
+SUBSAMPLING = ('4:4:4', '4:2:2', '4:2:0')
+EXTENSIONS = dict(jpeg='.jpg', png='.png', bmp='.bmp')
+
+
+class Encoding(typing.NamedTuple):
+    """How renders are written, quality, subsampling and progressive only apply to JPEGs"""
+    format: str = 'jpeg'
+    quality: int = 85
+    subsampling: str = '4:2:0'
+    optimize: bool = True
+    progressive: bool = False
+
+    @property
+    def extension(self) -> str:
+        return EXTENSIONS[self.format]
+
+    def options(self) -> dict:
+        if self.format == 'jpeg':
+            return dict(quality=self.quality,
+                        subsampling=self.subsampling,
+                        optimize=self.optimize,
+                        progressive=self.progressive)
+        if self.format == 'png':
+            return dict(optimize=self.optimize)
+        return {}
+
+
+def fit_within(size: typing.Tuple[int, int],
+               box: typing.Tuple[int, int]) -> typing.Tuple[int, int]:
+    """Largest size with the aspect ratio of `size` that fits into `box`"""
+    width, height = size
+    ratio = min(1, box[0] / width, box[1] / height)
+    return max(1, round(width * ratio)), max(1, round(height * ratio))
+
+
+def cover_size(size: typing.Tuple[int, int],
+               box: typing.Tuple[int, int]) -> typing.Tuple[int, int]:
+    """Smallest size with the aspect ratio of `size` that covers `box`"""
+    width, height = size
+    ratio = max(box[0] / width, box[1] / height)
+    return max(box[0], math.ceil(width * ratio)), max(box[1], math.ceil(height * ratio))
+
+
+def load_scaled(img: Image.Image, size: typing.Tuple[int, int]) -> Image.Image:
+    """
+    Loads `img` resized to `size`, letting the decoder skip the detail
+    that the resize would throw away anyway. JPEGs are decoded at a reduced
+    DCT scale, so memory and decode time follow `size` instead of the source.
+    """
+    with span('decode'):
+        img.draft(img.mode, size)
+        img.load()
+        if img.mode not in ('RGB', 'L'):
+            img = flatten(img)
+    with span('resize'):
+        factor = min(img.width // size[0], img.height // size[1])
+        if factor > 1:
+            img = img.reduce(factor)
+        if img.size != size:
+            img = img.resize(size, resample=Image.BILINEAR)
+    return img
+
+
+def flatten(img: Image.Image, background: typing.Tuple[int, int, int] = (0, 0, 0)) -> Image.Image:
+    """
+    Converts `img` to RGB, compositing transparent images over `background`
+    instead of letting the conversion expose whatever is under the alpha.
+    """
+    if img.mode == 'RGB':
+        return img
+    if img.mode in ('RGBA', 'LA', 'PA', 'P') or 'transparency' in img.info:
+        img = img.convert('RGBA')
+        flat = Image.new('RGB', img.size, background)
+        flat.paste(img, mask=img.getchannel('A'))
+        return flat
+    return img.convert('RGB')
+
+
+def save_image(img: Image.Image, save_path: str, encoding: Encoding = None) -> Path:
+    if not encoding:
+        encoding = Encoding()
+    save_path = Path(save_path)
+    # write into a temporary file first, so a reader never sees a half-written image
+    temp_path = save_path.with_name(f'{save_path.name}.{os.getpid()}.tmp')
+    if img.mode not in ('RGB', 'L'):
+        img = flatten(img)
+    with span('encode'):
+        img.save(temp_path, encoding.format.upper(), **encoding.options())
+    os.replace(temp_path, save_path)
+    return save_path
+
+
+def fit(image_path: str,
+        save_path: str,
+        size: typing.Tuple[int, int],
+        mode: str = 'cover',
+        encoding: Encoding = None) -> Path:
+    """
+    Renders `image_path` at exactly `size`, either scaled to cover it and
+    cropped around the center, or scaled to be contained and letterboxed.
+    """
+    if mode not in FIT_MODES:
+        raise ValueError(f'Unknown fit mode: {mode}')
+    width, height = size
+    with Image.open(image_path) as img:
+        if mode == 'cover':
+            scaled = load_scaled(img, cover_size(img.size, size))
+            left = (scaled.width - width) // 2
+            top = (scaled.height - height) // 2
+            fitted = scaled.crop((left, top, left + width, top + height))
+        else:
+            scaled = load_scaled(img, fit_within(img.size, (width, height)))
+            fitted = Image.new('RGB', size)
+            fitted.paste(scaled, ((width - scaled.width) // 2, (height - scaled.height) // 2))
+        return save_image(fitted, save_path, encoding)
@@ -0,0 +1,45 @@
+import json
+import os
+import threading
+import typing
+from pathlib import Path
+
+# in the cache dir, next to the index
+SESSION_FILE = 'session.json'
+PLAYLIST_FILE = 'playlist.json'
+
+
+class Session(typing.NamedTuple):
+    """What was on screen when wuzei last changed the wallpaper"""
+    source: str
+    wallpaper: str
+    # the file that was set, a render of `wallpaper` or the original
+    rendered: str
+    blurred: bool
+    shuffled: bool
+
+
+class Playlist(typing.NamedTuple):
+    """Order the images of `source` are played in"""
+    source: str
+    shuffled: bool
+    order: typing.List[str]
+    # a permuted playlist saves its seed instead of its order
+    seed: typing.Optional[int] = None
+
+
+def save(path: Path, state: typing.NamedTuple):
+    """Rewrites `path` atomically, a crash leaves either the old or the new state"""
+    # threads saving the same state at once each write their own
+    temp = path.with_name(f'{path.name}.{os.getpid()}.{threading.get_ident()}.tmp')
+    temp.write_text(json.dumps(state._asdict()), encoding='utf-8')
+    os.replace(temp, path)
+
+
+def load(path: Path, kind: typing.Type[typing.NamedTuple]) -> typing.Optional[typing.NamedTuple]:
+    """Reads a state saved with `save`, None if there's none or it can't be read"""
+    try:
+        fields = json.loads(path.read_text(encoding='utf-8'))
+        return kind(**{name: fields[name] for name in kind._fields if name in fields})
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
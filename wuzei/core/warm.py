@@ -0,0 +1,220 @@
+import datetime
+import os
+import pathlib
+import signal
+import time
+import typing
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+
+from wuzei.backends import Backend, get_backend
+from .blur import blur
+from .cache import RenderCache
+from .compose import EACH, Monitor, compose
+from .index import ImageIndex
+from .manager import BLURRED, FITTED, blur_params, compose_params, fit_params
+from .render import Encoding, fit
+
+# seconds between saving the manifest, an interrupted run loses at most this much
+FLUSH_INTERVAL = 10
+# seconds between progress reports
+REPORT_INTERVAL = 1
+
+
+class Progress(typing.NamedTuple):
+    done: int
+    failed: int
+    total: int
+    elapsed: float
+
+    @property
+    def rate(self) -> float:
+        """Renders per second"""
+        return (self.done + self.failed) / self.elapsed if self.elapsed > 0 else 0.0
+
+    @property
+    def eta(self) -> typing.Optional[float]:
+        """Seconds until every render is done, None until there's a rate to tell"""
+        if not self.rate:
+            return None
+        return (self.total - self.done - self.failed) / self.rate
+
+    def __str__(self):
+        finished = self.done + self.failed
+        percent = 100 * finished / self.total if self.total else 100
+        eta = '?' if self.eta is None else datetime.timedelta(seconds=round(self.eta))
+        failed = f', {self.failed} failed' if self.failed else ''
+        return f'{finished}/{self.total} ({percent:.1f}%) {self.rate:.1f}/s, ETA {eta}{failed}'
+
+
+class _Job(typing.NamedTuple):
+    image: str
+    variant: str
+    # what the render is cached by
+    params: dict
+    destination: pathlib.Path
+
+
+def _ignore_interrupts():
+    """Ctrl+C reaches the workers too, only the main process should handle it"""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+class CacheWarmer:
+    """
+    Renders what wuzei would show of every image in `paths` for the current
+    screen geometry ahead of time, in a pool of `jobs` processes.
+
+    Only renders that aren't cached are made, and finished ones are added
+    to the cache manifest as they come in, so a run can be stopped any time
+    and the next one picks up where it left off. It can run next to wuzei,
+    which sees the renders once it saves its own manifest.
+    """
+
+    def __init__(self,
+                 paths: typing.List[str],
+                 cache_dir: str,
+                 blur_engine: str = 'exact',
+                 fit_mode: str = None,
+                 compose_mode: str = None,
+                 encoding: Encoding = None,
+                 cache_size: int = 0,
+                 recursive: bool = True,
+                 max_depth: int = None,
+                 exclude: typing.List[str] = None,
+                 jobs: int = None,
+                 backend: Backend = None,
+                 logger=None):
+        if not logger:
+            logger = print
+        if not paths or not cache_dir:
+            raise ValueError('Specify at least one path')
+        self.logger = logger
+        self._paths = paths
+        self._blur_engine = blur_engine
+        self._fit_mode = fit_mode
+        self._compose_mode = compose_mode
+        self._encoding = encoding or Encoding()
+        self._cache_size = cache_size
+        self.jobs = jobs or os.cpu_count() or 1
+        backend = backend or get_backend()
+        self._screen_geometry = backend.screen_size()
+        monitors = [Monitor(*m) for m in backend.monitors()] if compose_mode else []
+        # like the manager, a single monitor isn't composed for
+        self._monitors = monitors if len(monitors) > 1 else []
+        self._cache = RenderCache(cache_dir, max_size=cache_size, logger=self.logger)
+        self._index = ImageIndex(pathlib.Path(cache_dir) / 'index.sqlite3',
+                                 recursive=recursive,
+                                 max_depth=max_depth,
+                                 exclude=exclude,
+                                 logger=self.logger)
+
+    def _variants(self) -> typing.List[str]:
+        # the manager only renders unblurred wallpapers when they're fitted or composed
+        if self._fit_mode or self._monitors:
+            return [BLURRED, FITTED]
+        return [BLURRED]
+
+    def _params(self, image_path: str, variant: str) -> dict:
+        if self._monitors:
+            blur_engine = self._blur_engine if variant == BLURRED else None
+            return compose_params(self._monitors, self._compose_mode, [], blur_engine, self._encoding)
+        if variant == FITTED:
+            return fit_params(self._screen_geometry, self._fit_mode, self._encoding)
+        return blur_params(self._screen_geometry, self._blur_engine, self._encoding)
+
+    def missing(self) -> typing.List[_Job]:
+        """Renders that aren't cached, after bringing the index of every source up to date"""
+        jobs = []
+        variants = self._variants()
+        for source in self._paths:
+            images = self._index.scan(source)
+            self.logger('SCANNED', source, f'{len(images)} images')
+            for image_path in images:
+                for variant in variants:
+                    try:
+                        params = self._params(image_path, variant)
+                        if self._cache.contains(image_path, **params):
+                            continue
+                        key = self._cache.key(image_path, **params)
+                    except FileNotFoundError:
+                        # deleted since the scan
+                        break
+                    destination = self._cache.path_for(image_path, key, self._encoding.extension)
+                    jobs.append(_Job(image_path, variant, params, destination))
+        return jobs
+
+    def _submit(self, executor: ProcessPoolExecutor, job: _Job) -> Future:
+        if self._monitors:
+            return executor.submit(compose, [job.image], self._monitors, job.destination,
+                                   mode=self._compose_mode,
+                                   blur_engine=job.params['blur_engine'],
+                                   encoding=self._encoding)
+        render = fit if job.variant == FITTED else blur
+        return executor.submit(render, job.image, job.destination, **job.params)
+
+    def _is_full(self) -> bool:
+        # more renders would only evict the ones just made
+        return self._cache_size > 0 and self._cache.size >= self._cache_size
+
+    def run(self, report: typing.Callable[[Progress], typing.Any] = None) -> Progress:
+        """Makes every missing render, calling `report` with the progress every so often"""
+        if self._compose_mode == EACH and self._monitors:
+            # each monitor shows the next image in the playlist, which changes with the order
+            self.logger('WARM', 'canvases of the each monitor mode depend on the playlist order, nothing to render')
+            return Progress(0, 0, 0, 0)
+        if self._is_full():
+            self.logger('WARM', 'the cache is full, raise cache_size to render more')
+            return Progress(0, 0, 0, 0)
+        jobs = self.missing()
+        self.logger('WARM', f'{len(jobs)} renders missing, rendering with {self.jobs} processes')
+        start = time.monotonic()
+        done = failed = 0
+        last_flush = last_report = start
+        pending: typing.Dict[Future, _Job] = {}
+        queued = iter(jobs)
+        executor = ProcessPoolExecutor(max_workers=self.jobs, initializer=_ignore_interrupts)
+        try:
+            while True:
+                # only a few renders are handed over at a time, so stopping doesn't wait for all of them
+                while len(pending) < 2 * self.jobs:
+                    job = next(queued, None)
+                    if job is None:
+                        break
+                    if job.destination.exists():
+                        # rendered by a run that was stopped before it was added
+                        future = Future()
+                        future.set_result(job.destination)
+                    else:
+                        future = self._submit(executor, job)
+                    pending[future] = job
+                if not pending:
+                    break
+                finished, _ = wait(pending, timeout=REPORT_INTERVAL, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    job = pending.pop(future)
+                    try:
+                        future.result()
+                        self._cache.add(job.image, job.destination, **job.params)
+                        done += 1
+                    except Exception as e:
+                        failed += 1
+                        self.logger('FAILED', job.image, job.variant, repr(e))
+                now = time.monotonic()
+                if now - last_flush >= FLUSH_INTERVAL:
+                    self._cache.flush()
+                    last_flush = now
+                    if self._is_full():
+                        self.logger('WARM', 'the cache is full, raise cache_size to render more')
+                        break
+                if report and now - last_report >= REPORT_INTERVAL:
+                    report(Progress(done, failed, len(jobs), now - start))
+                    last_report = now
+        finally:
+            for future in pending:
+                future.cancel()
+            executor.shutdown(wait=False)
+            self._cache.flush()
+        progress = Progress(done, failed, len(jobs), time.monotonic() - start)
+        if report:
+            report(progress)
+        return progress
@@ -1,12 +1,99 @@
-import pathlib
+import fnmatch
+import os
 import typing
 
+IMAGE_EXTENSIONS = frozenset({'.jpg', '.jpeg', '.png'})
 
-def find_images(directory: str,
-                extensions: list = None) -> typing.List[str]:
+
+def _normalize_extensions(extensions: typing.Iterable[str] = None) -> typing.FrozenSet[str]:
     if not extensions:
-        extensions = ['.jpg', '.jpeg', '.png']
-    source_dir = pathlib.Path(directory)
-    return list(str(im)
-                for im in source_dir.iterdir()
-                if any(im.suffix == ext for ext in extensions))
+        return IMAGE_EXTENSIONS
+    return frozenset(ext.lower() for ext in extensions)
+
+
+def is_excluded(name: str, exclude: typing.Iterable[str] = None) -> bool:
+    return any(fnmatch.fnmatch(name, pattern) for pattern in exclude or ())
+
+
+def scan_directory(directory: str,
+                   extensions: typing.Iterable[str] = None,
+                   exclude: typing.Iterable[str] = None) -> typing.Iterator[os.DirEntry]:
+    """
+    Yields the images and subdirectories directly under `directory`.
+    Extensions are matched case-insensitively, `exclude` globs are
+    matched against file and directory names.
+    """
+    extensions = _normalize_extensions(extensions)
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            if is_excluded(entry.name, exclude):
+                continue
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    yield entry
+                elif os.path.splitext(entry.name)[1].lower() in extensions:
+                    yield entry
+            except OSError:
+                continue
+
+
+def iter_images(directory: str,
+                extensions: typing.Iterable[str] = None,
+                recursive: bool = True,
+                max_depth: int = None,
+                exclude: typing.Iterable[str] = None) -> typing.Iterator[str]:
+    """
+    Yields paths of images under `directory` as they're found.
+    `max_depth` limits how many levels of subdirectories are visited,
+    0 only looks at `directory` itself.
+    """
+    extensions = _normalize_extensions(extensions)
+    if not recursive:
+        max_depth = 0
+    pending = [(directory, 0)]
+    while pending:
+        current, depth = pending.pop()
+        try:
+            for entry in scan_directory(current, extensions, exclude):
+                if not entry.is_dir(follow_symlinks=False):
+                    yield entry.path
+                elif max_depth is None or depth < max_depth:
+                    pending.append((entry.path, depth + 1))
+        except (FileNotFoundError, PermissionError, NotADirectoryError):
+            continue
+
+
+def find_images(directory: str,
+                extensions: typing.Iterable[str] = None,
+                recursive: bool = True,
+                max_depth: int = None,
+                exclude: typing.Iterable[str] = None) -> typing.List[str]:
+    return list(iter_images(directory,
+                            extensions=extensions,
+                            recursive=recursive,
+                            max_depth=max_depth,
+                            exclude=exclude))
+
+
+def is_image(path: str,
+             root: str,
+             extensions: typing.Iterable[str] = None,
+             recursive: bool = True,
+             max_depth: int = None,
+             exclude: typing.Iterable[str] = None) -> bool:
+    """Whether walking `root` with the same options would yield `path`"""
+    extensions = _normalize_extensions(extensions)
+    if not recursive:
+        max_depth = 0
+    try:
+        parts = os.path.normpath(os.path.relpath(path, root)).split(os.sep)
+    except ValueError:
+        # on a different drive
+        return False
+    if parts[0] == os.pardir:
+        return False
+    if max_depth is not None and len(parts) - 1 > max_depth:
+        return False
+    if any(is_excluded(part, exclude) for part in parts):
+        return False
+    return os.path.splitext(path)[1].lower() in extensions
@@ -0,0 +1,34 @@
+import queue
+import threading
+import typing
+
+
+class QueueLogger:
+    """
+    Logger that hands messages to a background thread to write,
+    so callers like the keyboard hook never block on a slow console.
+    """
+
+    def __init__(self, write: typing.Callable = print):
+        self._write = write
+        self._queue: queue.SimpleQueue = queue.SimpleQueue()
+        self._thread = threading.Thread(target=self._drain, name='logger', daemon=True)
+        self._thread.start()
+
+    def __call__(self, *args):
+        self._queue.put(args)
+
+    def close(self, timeout: float = 1.0):
+        """Writes what's queued and stops the thread"""
+        self._queue.put(None)
+        self._thread.join(timeout)
+
+    def _drain(self):
+        while True:
+            args = self._queue.get()
+            if args is None:
+                return
+            try:
+                self._write(*args)
+            except Exception:
+                pass
@@ -0,0 +1,180 @@
+import bisect
+import contextlib
+import contextvars
+import os
+import threading
+import time
+import typing
+from pathlib import Path
+
+# what caused the work being timed, an Action name, 'timer', 'lock' and so on
+trigger: contextvars.ContextVar = contextvars.ContextVar('trigger', default='unknown')
+
+# upper bounds in seconds, from a cached lookup to a cold 8K render
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+Labels = typing.Tuple[typing.Tuple[str, str], ...]
+
+
+class Histogram:
+    def __init__(self, buckets: typing.Sequence[float] = BUCKETS):
+        self.buckets = tuple(buckets)
+        # the last one counts what's above the largest bucket
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def merge(self, other: 'Histogram'):
+        self.counts = [a + b for a, b in zip(self.counts, other.counts)]
+        self.count += other.count
+        self.sum += other.sum
+        self.max = max(self.max, other.max)
+
+    def quantile(self, q: float) -> float:
+        """Upper bound of the bucket the `q` quantile falls into"""
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return self.max
+
+
+class Metrics:
+    """
+    Thread-safe histograms of stage durations and counters,
+    exported in the Prometheus text exposition format.
+    """
+
+    def __init__(self, prefix: str = 'wuzei'):
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self._histograms: typing.Dict[typing.Tuple[str, Labels], Histogram] = {}
+        self._counters: typing.Dict[typing.Tuple[str, Labels], float] = {}
+
+    def observe(self, name: str, value: float, buckets: typing.Sequence[float] = BUCKETS, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if not histogram:
+                histogram = self._histograms[key] = Histogram(buckets)
+            histogram.observe(value)
+
+    def increment(self, name: str, amount: float = 1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def take(self) -> typing.Tuple[dict, dict]:
+        """Returns everything recorded so far and starts over, to ship it to another process"""
+        with self._lock:
+            taken = self._histograms, self._counters
+            self._histograms, self._counters = {}, {}
+            return taken
+
+    def merge(self, taken: typing.Tuple[dict, dict]):
+        """Adds what `take` returned, in this or another process"""
+        histograms, counters = taken
+        with self._lock:
+            for key, other in histograms.items():
+                histogram = self._histograms.get(key)
+                if not histogram:
+                    histogram = self._histograms[key] = Histogram(other.buckets)
+                histogram.merge(other)
+            for key, value in counters.items():
+                self._counters[key] = self._counters.get(key, 0) + value
+
+    @contextlib.contextmanager
+    def span(self, stage: str):
+        """Times the block as `stage` of whatever the current trigger is"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe('stage_seconds', time.perf_counter() - start,
+                         stage=stage, trigger=trigger.get())
+
+    def summary(self) -> typing.List[str]:
+        """One line per stage and trigger, for the log"""
+        with self._lock:
+            lines = []
+            for (name, labels), h in sorted(self._histograms.items()):
+                label_text = ' '.join(v for _, v in labels)
+                if name != 'stage_seconds':
+                    label_text = f'{name} {label_text}'
+                if name.endswith('_seconds'):
+                    lines.append(f'{label_text}: n={h.count} '
+                                 f'mean={h.sum / h.count * 1000:.1f}ms '
+                                 f'p50<={h.quantile(0.5) * 1000:.1f}ms '
+                                 f'p99<={h.quantile(0.99) * 1000:.1f}ms '
+                                 f'max={h.max * 1000:.1f}ms')
+                else:
+                    lines.append(f'{label_text}: n={h.count} '
+                                 f'mean={h.sum / h.count:.1f} '
+                                 f'p50<={h.quantile(0.5):g} '
+                                 f'p99<={h.quantile(0.99):g} '
+                                 f'max={h.max:g}')
+            for (name, labels), value in sorted(self._counters.items()):
+                label_text = ' '.join(v for _, v in labels)
+                lines.append(f'{name} {label_text}: {value:g}')
+            return lines
+
+    def exposition(self) -> str:
+        with self._lock:
+            out = []
+            for name in sorted({name for name, _ in self._histograms}):
+                out.append(f'# TYPE {self.prefix}_{name} histogram')
+                for (h_name, labels), h in sorted(self._histograms.items()):
+                    if h_name != name:
+                        continue
+                    cumulative = 0
+                    for bound, count in zip(list(h.buckets) + [None], h.counts):
+                        cumulative += count
+                        le = '+Inf' if bound is None else repr(bound)
+                        out.append(f'{self.prefix}_{name}_bucket{_labels(labels, le=le)} {cumulative}')
+                    out.append(f'{self.prefix}_{name}_sum{_labels(labels)} {h.sum!r}')
+                    out.append(f'{self.prefix}_{name}_count{_labels(labels)} {h.count}')
+            for name in sorted({name for name, _ in self._counters}):
+                out.append(f'# TYPE {self.prefix}_{name}_total counter')
+                for (c_name, labels), value in sorted(self._counters.items()):
+                    if c_name == name:
+                        out.append(f'{self.prefix}_{name}_total{_labels(labels)} {value:g}')
+            return '\n'.join(out) + '\n'
+
+    def write(self, path: str):
+        """Rewrites `path` atomically, for the node exporter's textfile collector"""
+        path = Path(path)
+        temp = path.with_name(f'{path.name}.{os.getpid()}.tmp')
+        temp.write_text(self.exposition())
+        os.replace(temp, path)
+
+
+def _labels(labels: Labels, **extra) -> str:
+    pairs = list(labels) + list(extra.items())
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"') for _, value in pairs)
+    return '{' + ','.join(f'{key}="{value}"' for (key, _), value in zip(pairs, escaped)) + '}'
+
+
+@contextlib.contextmanager
+def triggered_by(name: str):
+    """Attributes spans in the block to `name`"""
+    token = trigger.set(name)
+    try:
+        yield
+    finally:
+        trigger.reset(token)
+
+
+# shared by everything in the process
+metrics = Metrics()
+span = metrics.span
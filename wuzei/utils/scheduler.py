@@ -0,0 +1,132 @@
+import heapq
+import itertools
+import threading
+import time
+import typing
+
+
+class Job:
+    def __init__(self,
+                 scheduler: 'Scheduler',
+                 fn: typing.Callable,
+                 args: tuple = (),
+                 kwargs: dict = None,
+                 interval: float = None):
+        self._scheduler = scheduler
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs or {}
+        self.interval = interval
+        self.deadline: float = None
+        # bumped on every (re)schedule, heap entries of older versions are skipped
+        self.version = 0
+        self.cancelled = False
+
+    @property
+    def pending(self) -> bool:
+        return not self.cancelled and self.deadline is not None
+
+    def cancel(self):
+        self._scheduler._cancel(self)
+
+    def reschedule(self, delay: float = None):
+        """Moves the job `delay` seconds from now, one interval by default"""
+        if delay is None:
+            delay = self.interval or 0
+        self._scheduler._schedule(self, time.monotonic() + delay)
+
+    def __call__(self):
+        return self.fn(*self.args, **self.kwargs)
+
+    def __repr__(self):
+        return f'Job({getattr(self.fn, "__name__", self.fn)}, interval={self.interval})'
+
+
+class Scheduler:
+    """
+    Runs jobs at monotonic deadlines on a single thread,
+    which sleeps until the earliest one is due.
+    Jobs run one at a time, so they should be short.
+    """
+
+    def __init__(self, logger=None):
+        if not logger:
+            logger = print
+        self.logger = logger
+        self._queue: typing.List[typing.Tuple[float, int, int, Job]] = []
+        self._counter = itertools.count()
+        self._condition = threading.Condition()
+        self._running = False
+        self._thread: threading.Thread = None
+
+    def start(self):
+        with self._condition:
+            if self._running:
+                return
+            self._running = True
+        self._thread = threading.Thread(target=self._run, name='scheduler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        with self._condition:
+            self._running = False
+            self._condition.notify()
+
+    def call_later(self, delay: float, fn: typing.Callable, *args, **kwargs) -> Job:
+        job = Job(self, fn, args, kwargs)
+        job.reschedule(delay)
+        return job
+
+    def call_every(self, interval: float, fn: typing.Callable, *args,
+                   delay: float = None, **kwargs) -> Job:
+        """Runs `fn` every `interval` seconds, starting after `delay` (one interval by default)"""
+        job = Job(self, fn, args, kwargs, interval=interval)
+        job.reschedule(delay)
+        return job
+
+    def _schedule(self, job: Job, deadline: float):
+        with self._condition:
+            job.cancelled = False
+            job.deadline = deadline
+            job.version += 1
+            heapq.heappush(self._queue, (deadline, next(self._counter), job.version, job))
+            self._condition.notify()
+
+    def _cancel(self, job: Job):
+        with self._condition:
+            job.cancelled = True
+            job.deadline = None
+            job.version += 1
+
+    def _next_due(self) -> typing.Optional[Job]:
+        with self._condition:
+            while self._running:
+                # drop entries of cancelled or rescheduled jobs
+                while self._queue and self._queue[0][2] != self._queue[0][3].version:
+                    heapq.heappop(self._queue)
+                if not self._queue:
+                    self._condition.wait()
+                    continue
+                deadline, _, version, job = self._queue[0]
+                timeout = deadline - time.monotonic()
+                if timeout > 0:
+                    self._condition.wait(timeout)
+                    continue
+                heapq.heappop(self._queue)
+                job.deadline = None
+                return job
+            return None
+
+    def _run(self):
+        while True:
+            job = self._next_due()
+            if not job:
+                return
+            version = job.version
+            try:
+                job()
+            except Exception as e:
+                self.logger('JOB FAILED', job, repr(e))
+            # periodic jobs run again, unless the job itself rescheduled or cancelled them
+            if job.interval and job.version == version and not job.cancelled:
+                job.reschedule()
@@ -1,5 +1,7 @@
 import ctypes
+import typing
 import win32api
+import winreg
 import win32gui
 import win32process
 from itertools import chain
@@ -164,6 +166,32 @@ def get_screen_size():
             ctypes.windll.user32.GetSystemMetrics(1))
 
 
+def get_monitors() -> list:
+    """(left, top, width, height) of every monitor on the virtual desktop"""
+    ctypes.windll.user32.SetProcessDPIAware()
+    monitors = []
+    for h_monitor, _, _ in win32api.EnumDisplayMonitors():
+        left, top, right, bottom = win32api.GetMonitorInfo(h_monitor)['Monitor']
+        monitors.append((left, top, right - left, bottom - top))
+    return monitors
+
+
+# WPSTYLE_* values of IActiveDesktop::SetWallpaperOptions
+WALLPAPER_STYLES = dict(center=0,
+                        tile=1,
+                        stretch=2,
+                        fit=3,
+                        fill=4,
+                        span=5)
+# (WallpaperStyle, TileWallpaper) in the registry: name of the style
+REGISTRY_STYLES = {('0', '0'): 'center',
+                   ('0', '1'): 'tile',
+                   ('2', '0'): 'stretch',
+                   ('6', '0'): 'fit',
+                   ('10', '0'): 'fill',
+                   ('22', '0'): 'span'}
+
+
 def force_refresh():
     # RUNDLL32.EXE USER32.DLL,UpdatePerUserSystemParameters 1, True
     ctypes.windll.user32.UpdatePerUserSystemParameters(1)
@@ -189,7 +217,9 @@ def enable_active_desktop():
     ctypes.windll.User32.SendMessageTimeoutW(progman.h_window, *cryptic_params)
 
 
-def change_wallpaper(abs_path_to_image: str, activate_active_desktop: bool = False):
+def change_wallpaper(abs_path_to_image: str,
+                     activate_active_desktop: bool = False,
+                     style: str = None):
     if activate_active_desktop:
         enable_active_desktop()
     pythoncom.CoInitialize()
@@ -197,6 +227,8 @@ def change_wallpaper(abs_path_to_image: str, activate_active_desktop: bool = Fal
                                      None,
                                      pythoncom.CLSCTX_INPROC_SERVER,
                                      shell.IID_IActiveDesktop)
+    if style:
+        iad.SetWallpaperOptions(WALLPAPER_STYLES[style], 0)
     iad.SetWallpaper(str(abs_path_to_image), 0)
     opts = (shellcon.AD_APPLY_ALL
             # | shellcon.AD_APPLY_FORCE
@@ -205,3 +237,14 @@ def change_wallpaper(abs_path_to_image: str, activate_active_desktop: bool = Fal
             )
     iad.ApplyChanges(opts)
     force_refresh()
+
+
+def get_wallpaper_style() -> typing.Optional[str]:
+    """Name of the style the wallpaper is shown with, None if it can't be told"""
+    try:
+        with winreg.OpenKey(winreg.HKEY_CURRENT_USER, r'Control Panel\Desktop') as key:
+            style, _ = winreg.QueryValueEx(key, 'WallpaperStyle')
+            tile, _ = winreg.QueryValueEx(key, 'TileWallpaper')
+    except OSError:
+        return None
+    return REGISTRY_STYLES.get((str(style), str(tile)))
@@ -9,9 +9,11 @@ class DirectoryWatcher:
                  on_created: callable = None,
                  on_deleted: callable = None,
                  on_renamed: callable = None,
-                 filter: str = '*.*'):
+                 filter: str = '*.*',
+                 include_subdirectories: bool = False):
         self._path = path
         self._filter = filter
+        self._include_subdirectories = include_subdirectories
 
         if not any([on_created, on_deleted, on_renamed]):
             raise ValueError('Specify at least one listener')
@@ -25,7 +27,9 @@ class DirectoryWatcher:
 
     def _make_watcher(self):
         watcher = FileSystemWatcher(self._path, filter=self._filter)
-        watcher.NotifyFilter = NotifyFilters.FileName
+        # directories too, moving one doesn't raise events for what's in it
+        watcher.NotifyFilter = NotifyFilters.FileName | NotifyFilters.DirectoryName
+        watcher.IncludeSubdirectories = self._include_subdirectories
         if self._created_callback:
             watcher.Created += self._on_created
         if self._renamed_callback:
@@ -34,6 +38,10 @@ class DirectoryWatcher:
             watcher.Deleted += self._on_deleted
         return watcher
 
+    def stop(self):
+        self._watcher.EnableRaisingEvents = False
+        self._watcher.Dispose()
+
     def _on_renamed(self, update: RenamedEventArgs):
         self._renamed_callback(update.OldFullPath, update.FullPath)
 